@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+SecurityInfo 的编译结果
+
+首次使用时由已导入的 SecurityInfo 中的嵌套字典编译为扁平的表，不写入任何文件。每个 (品种, 投机/套保/套利)
+对应一个 FutureInfo 记录，投机类型的查询为一次字典查找；交易时间表按时段编号去重，同一时间表的品种共用同一个
+list of TimeRange。
+"""
+import threading
+
+from utils.Constants import HedgeType
+
+
+# 编译后每个品种每个类型一行，字段顺序与 FutureInfo.__slots__ 相同
+FUTURE_INFO_FIELDS = ('underlying_symbol', 'hedge_type', 'commission_type', 'margin_type', 'open_commission_ratio',
+                      'close_commission_ratio', 'close_commission_today_ratio', 'long_margin_ratio',
+                      'short_margin_ratio', 'session_id')
+
+
+class FutureInfo(object):
+    """
+    单个品种单个投机/套保/套利类型的手续费和保证金
+
+    支持 info['open_commission_ratio'] 形式的访问，可直接替代原 CN_FUTURE_INFO 中的字典
+    """
+    __slots__ = FUTURE_INFO_FIELDS
+
+    def __init__(self, row: tuple):
+        (self.underlying_symbol, self.hedge_type, self.commission_type, self.margin_type, self.open_commission_ratio,
+         self.close_commission_ratio, self.close_commission_today_ratio, self.long_margin_ratio,
+         self.short_margin_ratio, self.session_id) = row
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__, ', '.join('{}={}'.format(k, repr(getattr(self, k))) for k in self.__slots__))
+
+
+def compile_security_info():
+    """
+    由 SecurityInfo 编译扁平的表
+
+    :return: dict 'periods' -> dict 品种代码 -> list of TimeRange，'futures' -> list of FutureInfo，
+        'funds' -> dict 基金类型 -> (申购费率, 赎回费率)
+    """
+    from SecurityInfo import CN_FUTURE_INFO, PUBLIC_FUND_COMMISSION, TRADING_PERIOD_DICT
+
+    sessions = dict()           # 时间表 -> (编号, list of TimeRange)，相同的时间表只保留一份
+    periods, session_ids = dict(), dict()
+    for underlying_symbol, item in TRADING_PERIOD_DICT.items():
+        key = tuple(item)
+        if key not in sessions:
+            sessions[key] = (len(sessions), list(key))
+        session_ids[underlying_symbol], periods[underlying_symbol] = sessions[key]
+
+    hedge_types = {hedge_type.value: hedge_type for hedge_type in HedgeType}
+    futures = [
+        FutureInfo((
+            underlying_symbol, hedge_types[hedge_type], info['commission_type'], info['margin_type'],
+            float(info['open_commission_ratio']), float(info['close_commission_ratio']),
+            float(info['close_commission_today_ratio']), float(info['long_margin_ratio']),
+            float(info['short_margin_ratio']), session_ids.get(underlying_symbol, -1),
+        ))
+        for underlying_symbol, by_hedge in CN_FUTURE_INFO.items()
+        for hedge_type, info in by_hedge.items()
+    ]
+
+    return {
+        'periods': periods,
+        'futures': futures,
+        'funds': {fund_type: (float(item['Buy']), float(item['Sell']))
+                  for fund_type, item in PUBLIC_FUND_COMMISSION.items()},
+    }
+
+
+class SecurityTable(object):
+    """
+    编译后的期货品种信息、交易时间表和公募基金费率
+
+    :param tables: dict compile_security_info 的结果
+    """
+    __instance__ = None
+    __instance_lock__ = threading.Lock()
+
+    def __init__(self, tables: dict):
+        self.__periods__ = tables['periods']
+        self.__futures__ = {hedge_type.value: dict() for hedge_type in HedgeType}     # 类型的值 -> 品种 -> FutureInfo
+        for info in tables['futures']:
+            self.__futures__[info.hedge_type.value][info.underlying_symbol] = info
+        self.__speculation__ = self.__futures__[HedgeType.SPECULATION.value]
+        self.__funds__ = tables['funds']
+
+    @classmethod
+    def get_instance(cls):
+        """进程内共用的表，首次调用时由 SecurityInfo 编译 -> SecurityTable"""
+        if cls.__instance__ is None:
+            with cls.__instance_lock__:
+                if cls.__instance__ is None:
+                    cls.__instance__ = cls(compile_security_info())
+        return cls.__instance__
+
+    @property
+    def periods(self):
+        """
+        [dict] 品种代码 -> list of TimeRange 交易时间表
+        """
+        return self.__periods__
+
+    def future_info(self, underlying_symbol: str, hedge_type: str='speculation'):
+        """
+        :param hedge_type: str/HedgeType
+        :return: FutureInfo
+        """
+        if isinstance(hedge_type, HedgeType):
+            hedge_type = hedge_type.value
+        return self.__futures__[hedge_type][underlying_symbol]
+
+    @property
+    def speculation(self):
+        """
+        [dict] 品种代码 -> 投机类型的 FutureInfo，热点路径直接持有该字典
+        """
+        return self.__speculation__
+
+    def fund_commission(self, fund_type: str, buy: bool):
+        """-> float 公募基金申购/赎回费率"""
+        return self.__funds__[fund_type][0 if buy else 1]
+
+
+if __name__ == '__main__':
+    import os
+    import subprocess
+    import sys
+    import timeit
+
+    ROOT_PATH = os.path.abspath(os.path.dirname(__file__))
+
+    def cold_import(statement: str, repeat: int=7):
+        """新进程中的导入耗时，不含运行时已经导入的 utils.Constants、threading -> 秒"""
+        code = ('import sys, time; sys.path.insert(0, {!r}); import threading, utils.Constants; '
+                'start = time.perf_counter(); '
+                '{}; print(time.perf_counter() - start)').format(ROOT_PATH, statement)
+        return min(float(subprocess.check_output([sys.executable, '-c', code], cwd=ROOT_PATH)) for i in range(repeat))
+
+    print('cold import SecurityInfo:          {:.3f} ms'.format(cold_import('import SecurityInfo') * 1000))
+    print('cold build SecurityTable:          {:.3f} ms'.format(
+        cold_import('import SecurityTable; SecurityTable.SecurityTable.get_instance()') * 1000))
+
+    def nested_lookup(underlying_symbol: str):
+        # 原 DataProxy.get_commission_info 的查找方式
+        from SecurityInfo import CN_FUTURE_INFO
+        return CN_FUTURE_INFO[underlying_symbol]['speculation']
+
+    speculation = SecurityTable.get_instance().speculation
+    number = 1000000
+    nested = timeit.timeit(lambda: nested_lookup('IF')['open_commission_ratio'], number=number)
+    flat = timeit.timeit(lambda: speculation['IF'].open_commission_ratio, number=number)
+    print('lookup SecurityInfo nested dict:   {:.3f} us'.format(nested / number * 1e6))
+    print('lookup SecurityTable.speculation:  {:.3f} us'.format(flat / number * 1e6))
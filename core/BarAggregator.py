@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import datetime
+import heapq
+import re
+
+import numpy as np
+
+from core.structure.Bar import BAR_DTYPE, BarObject
+from core.structure.Tick import TickObject
+from utils.Constants import TimeRange, UNDERLYING_SYMBOL_PATTERN
+
+
+# 股票、股指期货: 09:30~11:30, 13:00~15:00
+STOCK_TRADING_PERIOD = [
+    TimeRange(start=datetime.time(hour=9, minute=30), end=datetime.time(hour=11, minute=30)),
+    TimeRange(start=datetime.time(hour=13), end=datetime.time(hour=15)),
+]
+
+TRADING_DAY_OFFSET = 18 * 3600      # 交易日从前一自然日 18:00 开始，夜盘与日盘的交易秒数连续递增
+CLOSE_GRACE = 60                    # 时段收盘后该秒数内的 tick 视为收盘快照，不计入下一个时段
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+
+def parse_interval(interval: str):
+    """k线周期字符串，如 1m/5m/30s/1h -> 秒数 int"""
+    try:
+        seconds = int(interval[:-1]) * INTERVAL_UNITS[interval[-1]]
+    except (KeyError, ValueError, IndexError, TypeError):
+        seconds = 0
+    if seconds <= 0:
+        from utils.Exceptions import ParamOutOfRangeError
+        raise ParamOutOfRangeError('interval', 'such as 30s/1m/5m/1h', interval)
+    return seconds
+
+
+def compile_sessions(periods: list):
+    """
+    交易时间表 -> 按交易秒数排列的 [(开盘, 收盘)]
+
+    交易时间表中的开始时间是第一根分钟线的结束时间（如 09:01），按 5 分钟向下取整得到实际开盘时间；
+    相邻不超过 1 分钟的时段（如 21:01~23:59 与 00:00~01:00）合并为一个时段。
+    """
+    sessions = list()
+    for period in periods:
+        start = period.start.hour * 3600 + period.start.minute // 5 * 300
+        end = period.end.hour * 3600 + period.end.minute * 60 + period.end.second
+        start, end = (start - TRADING_DAY_OFFSET) % 86400, (end - TRADING_DAY_OFFSET) % 86400
+        if end < start:
+            end += 86400
+        sessions.append((start, end))
+    sessions.sort()
+    merged = list()
+    for start, end in sessions:
+        if len(merged) > 0 and start - merged[-1][1] <= 60:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+class _BarState(object):
+    """单个合约单个周期正在合成的k线，预先分配，每条 tick 只修改属性"""
+    __slots__ = ('anchor', 'start', 'end', 'open', 'high', 'low', 'close', 'volume', 'turnover',
+                 'base_volume', 'base_turnover', 'open_interest', 'limit_up', 'limit_down', 'prev_close', 'active')
+
+    def __init__(self):
+        self.anchor = None          # 所属交易日的起点（绝对秒数）
+        self.start = 0.0            # 当前k线的起止时间（绝对秒数）
+        self.end = 0.0
+        self.open = self.high = self.low = self.close = np.nan
+        self.volume = self.turnover = 0.0               # 最新 tick 的当日累计成交量/成交额
+        self.base_volume = self.base_turnover = 0.0     # 当前k线开始前的当日累计成交量/成交额
+        self.open_interest = self.limit_up = self.limit_down = self.prev_close = np.nan
+        self.active = False
+
+
+class TickBarAggregator(object):
+    """
+    由 tick 流增量合成k线
+
+    每个合约、每个周期预先分配一个 _BarState，tick 落在当前k线时间范围内时只更新 OHLC 和累计量，为 O(1)；
+    k线按交易时段对齐（首根k线从开盘开始，最后一根在收盘截止），标签为k线结束时间。
+    tick 的成交量、成交额为当日累计值，k线成交量为区间差值；持仓量取区间内最后一条 tick。
+    开盘前和两个时段之间的 tick 计入下一个时段的第一根k线；收盘后 CLOSE_GRACE 秒内的收盘快照和最后一个时段
+    收盘后的 tick 不再生成k线。
+
+    :param intervals: list of str k线周期，如 ['1m', '5m']
+    :param periods: dict 品种代码 -> 交易时间表，默认使用 SecurityTable.periods，未列出的品种按股票时间
+    """
+    def __init__(self, intervals: list, periods: dict=None):
+        from utils.Logger import get_logger
+        self.__logger__ = get_logger(self.__class__.__name__, 'logBarAggregator')
+        if periods is None:
+            from SecurityTable import SecurityTable
+            periods = SecurityTable.get_instance().periods
+        self.__periods__ = periods
+        self.__intervals__ = tuple((interval, parse_interval(interval)) for interval in intervals)
+        self.__pattern__ = re.compile(UNDERLYING_SYMBOL_PATTERN)
+        self.__stock_sessions__ = compile_sessions(STOCK_TRADING_PERIOD)
+        self.__sessions__ = dict()      # order_book_id -> sessions
+        self.__states__ = dict()        # order_book_id -> tuple of _BarState，与 intervals 一一对应
+        self.__pending__ = list()       # 堆 (k线结束时间, 序号, order_book_id, 周期序号)，用于按时间收尾其他合约的k线
+        self.__pending_id__ = 0
+        self.__date_cache__ = (None, 0)
+
+    @property
+    def intervals(self):
+        """
+        [list] k线周期
+        """
+        return [interval for interval, seconds in self.__intervals__]
+
+    def subscribe(self, order_book_id: str):
+        """为合约预先分配合成状态"""
+        if order_book_id in self.__states__:
+            return
+        matched = self.__pattern__.match(order_book_id)
+        periods = self.__periods__.get(matched.group(1).upper(), None) if matched is not None else None
+        self.__sessions__[order_book_id] = \
+            self.__stock_sessions__ if periods is None else compile_sessions(periods)
+        self.__states__[order_book_id] = tuple(_BarState() for i in range(len(self.__intervals__)))
+
+    def __abs_seconds__(self, tick: dict):
+        """tick 时间 -> 绝对秒数 (以 0001-01-01 为起点)"""
+        date = str(tick['date'])
+        cached_date, day_seconds = self.__date_cache__
+        if date != cached_date:
+            day_seconds = datetime.datetime.strptime(date, '%Y%m%d').toordinal() * 86400
+            self.__date_cache__ = (date, day_seconds)
+        head, dot, tail = str(tick['time']).partition('.')
+        head = head.zfill(6)
+        seconds = int(head[0:2]) * 3600 + int(head[2:4]) * 60 + int(head[4:6])
+        if tail:
+            seconds += float('0.' + tail)
+        return day_seconds + seconds, seconds
+
+    @staticmethod
+    def __locate__(sessions: tuple, seconds: float, interval: int):
+        """交易秒数 -> 所在k线的 (开始, 结束) 交易秒数，收盘快照和最后一个时段收盘后返回 None"""
+        last_end = None
+        for start, end in sessions:
+            if seconds < start:
+                if last_end is not None and seconds < last_end + CLOSE_GRACE:
+                    return None
+                # 开盘前 / 两个时段之间，计入下一个时段的第一根k线
+                return start, min(start + interval, end)
+            if seconds < end:
+                bar_start = start + int((seconds - start) // interval) * interval
+                return bar_start, min(bar_start + interval, end)
+            last_end = end
+        return None
+
+    def __create_bar__(self, order_book_id: str, state: _BarState):
+        row = np.zeros(1, dtype=BAR_DTYPE)[0]
+        label = datetime.datetime.fromordinal(int(state.end // 86400)) + datetime.timedelta(seconds=state.end % 86400)
+        row['datetime'] = (label.year * 10000 + label.month * 100 + label.day) * 1000000 \
+            + label.hour * 10000 + label.minute * 100 + label.second
+        row['open'], row['high'], row['low'], row['close'] = state.open, state.high, state.low, state.close
+        row['volume'] = state.volume - state.base_volume
+        row['total_turnover'] = state.turnover - state.base_turnover
+        row['open_interest'] = state.open_interest
+        row['limit_up'], row['limit_down'], row['prev_close'] = state.limit_up, state.limit_down, state.prev_close
+        row['settlement'] = row['prev_settlement'] = np.nan
+        state.active = False
+        state.base_volume, state.base_turnover = state.volume, state.turnover
+        return BarObject(row, order_book_id=order_book_id, dt=label)
+
+    def update(self, tick: TickObject):
+        """
+        输入一条 tick，返回因此完成的k线
+
+        :return: list of (str 周期, BarObject)
+        """
+        order_book_id = tick.order_book_id
+        states = self.__states__.get(order_book_id, None)
+        if states is None:
+            self.subscribe(order_book_id)
+            states = self.__states__[order_book_id]
+        data = tick._tick
+        now, seconds = self.__abs_seconds__(data)
+        finished = self.advance(now)
+
+        last = data.get('last', np.nan)
+        volume, turnover = data.get('volume', 0.0), data.get('total_turnover', 0.0)
+        for index, (interval, interval_seconds) in enumerate(self.__intervals__):
+            state = states[index]
+            if state.active is False or now >= state.end:
+                if state.active is True:
+                    finished.append((interval, self.__create_bar__(order_book_id, state)))
+                anchor = now - (seconds - TRADING_DAY_OFFSET) % 86400
+                if anchor != state.anchor:
+                    # 新交易日，累计量从 0 开始
+                    state.anchor = anchor
+                    state.base_volume = state.base_turnover = 0.0
+                located = self.__locate__(self.__sessions__[order_book_id], now - anchor, interval_seconds)
+                if located is None:
+                    # 不生成k线，累计量计入基数，避免算入下一根k线
+                    state.base_volume, state.base_turnover = volume, turnover
+                    continue
+                state.start, state.end = anchor + located[0], anchor + located[1]
+                state.open = state.high = state.low = last
+                state.active = True
+                heapq.heappush(self.__pending__, (state.end, self.__pending_id__, order_book_id, index))
+                self.__pending_id__ += 1
+            else:
+                if last > state.high:
+                    state.high = last
+                if last < state.low:
+                    state.low = last
+            state.close = last
+            if volume < state.base_volume:
+                state.base_volume = state.base_turnover = 0.0
+            state.volume, state.turnover = volume, turnover
+            state.open_interest = data.get('open_interest', np.nan)
+            state.limit_up, state.limit_down = data.get('limit_up', np.nan), data.get('limit_down', np.nan)
+            state.prev_close = data.get('prev_close', np.nan)
+        return finished
+
+    def advance(self, now: float):
+        """
+        收尾结束时间不晚于 now（绝对秒数）的k线，行情按时间顺序到达时，其他合约的k线也能及时完成
+
+        :return: list of (str 周期, BarObject)
+        """
+        finished = list()
+        pending = self.__pending__
+        while len(pending) > 0 and pending[0][0] <= now:
+            end, pending_id, order_book_id, index = heapq.heappop(pending)
+            state = self.__states__[order_book_id][index]
+            if state.active is True and state.end == end:
+                finished.append((self.__intervals__[index][0], self.__create_bar__(order_book_id, state)))
+        return finished
+
+    def flush(self):
+        """收尾全部未完成的k线，回放结束时调用 -> list of (str 周期, BarObject)"""
+        finished = list()
+        for order_book_id, states in self.__states__.items():
+            for index, state in enumerate(states):
+                if state.active is True:
+                    finished.append((self.__intervals__[index][0], self.__create_bar__(order_book_id, state)))
+        self.__pending__.clear()
+        return finished
@@ -4,10 +4,13 @@ import threading
 
 from queue import Queue
 
+import numpy as np
+
 from Interface import Persistable, Recordable
 from core.structure import *
+from core.structure.Bar import datetime_to_int
 from core.EventBus import EventObject
-from utils import id_generator
+from utils import id_generator, lazy_format
 from utils.Constants import *
 
 
@@ -24,11 +27,13 @@ class MockBroker(Persistable, Recordable):
         self.__logger__ = get_logger(self.__class__.__name__, 'logMockBroker')
         self.market_source = env.universe
         self.event_bus = env.event_bus
+        market_config = env.config.get('Market', dict()) or dict()
+        matching_config = env.config.get('Matching', dict()) or dict()
 
         # public
         self.id = next(self.id_gen)
         if run_info.market_info_type is None:
-            self.market_info_type = MarketInfoType(env.config.get('Market', dict()).get('type', 'TICK'))
+            self.market_info_type = MarketInfoType(market_config.get('type', 'TICK'))
         else:
             self.market_info_type = run_info.market_info_type
         self.universe = run_info.universe
@@ -37,12 +42,28 @@ class MockBroker(Persistable, Recordable):
         self.end_date = run_info.end_time.date()
         self.end_date_time = run_info.end_time.time()
         self.open_order_list = list()
+        if run_info.bar_frequency is None:
+            self.bar_frequency = market_config.get('bar_frequency', '1m')
+        else:
+            self.bar_frequency = run_info.bar_frequency
+        if run_info.aggregate_intervals is None:
+            aggregate_intervals = market_config.get('aggregate_intervals', None) or list()
+        else:
+            aggregate_intervals = run_info.aggregate_intervals
+        if run_info.matching_type is None:
+            self.matching_type = MatchingType(matching_config.get('bar_matching_type', 'CURRENT_BAR_CLOSE'))
+        else:
+            self.matching_type = run_info.matching_type
 
         # private
         self.__active__ = False                         # 是否在运行
         self.__market_info_queue_dict__ = dict()        # 数据载入线程暂存队列
         self.__market_info_map__ = dict()               # 最近数据字典
         self.__loading_market_thread_dict__ = dict()
+        self.__bars__ = None                            # 全部合约按时间归并后的k线数组
+        self.__bar_symbols__ = None                     # 与 __bars__ 逐行对应的合约代码
+        self.__bar_cursor__ = 0                         # 下一根待发出k线的位置
+        self.__aggregator__ = None                      # tick 合成k线
 
         # init
         for symbol in self.universe:
@@ -50,6 +71,11 @@ class MockBroker(Persistable, Recordable):
 
         # prepare market info
         if self.market_info_type == MarketInfoType.TICK:
+            if len(aggregate_intervals) > 0:
+                from core.BarAggregator import TickBarAggregator
+                self.__aggregator__ = TickBarAggregator(aggregate_intervals)
+                for symbol in self.universe:
+                    self.__aggregator__.subscribe(symbol)
             for symbol in self.universe:
                 new_thread = threading.Thread(
                     target=self.__load_tick__, args=(symbol, ),
@@ -57,6 +83,14 @@ class MockBroker(Persistable, Recordable):
                 )
                 new_thread.start()
                 self.__loading_market_thread_dict__[symbol] = new_thread
+        elif self.market_info_type == MarketInfoType.BAR:
+            if self.matching_type not in (MatchingType.CURRENT_BAR_CLOSE, MatchingType.NEXT_BAR_OPEN):
+                from utils.Exceptions import ParamOutOfRangeError
+                raise ParamOutOfRangeError('matching_type', 'CURRENT_BAR_CLOSE/NEXT_BAR_OPEN', self.matching_type)
+            self.__loading_bar_thread__ = threading.Thread(
+                target=self.__load_bars__, name='broker {} loading bars'.format(self.id),
+            )
+            self.__loading_bar_thread__.start()
         else:
             raise NotImplementedError
 
@@ -83,10 +117,39 @@ class MockBroker(Persistable, Recordable):
                 self.__market_info_queue_dict__[symbol].put(new_tick, block=True, timeout=None)
             date += datetime.timedelta(days=1)
 
+    def __load_bars__(self):
+        """
+        一次载入每个合约在回放区间内的全部k线，按 (时间, 合约) 归并为一个数组，回放时只移动游标
+        """
+        start = datetime_to_int(datetime.datetime.combine(self.start_date, self.start_date_time))
+        end = datetime_to_int(datetime.datetime.combine(self.end_date, self.end_date_time))
+        symbols = sorted(self.universe)
+        bar_list = list()
+        for symbol in symbols:
+            bars = self.market_source[symbol].bars(self.bar_frequency)
+            left = np.searchsorted(bars['datetime'], start, side='left')
+            right = np.searchsorted(bars['datetime'], end, side='right')
+            bar_list.append(bars[left:right])
+        if len(bar_list) == 0:
+            from core.structure.Bar import BAR_DTYPE
+            self.__bars__ = np.empty(0, dtype=BAR_DTYPE)
+            self.__bar_symbols__ = list()
+            return
+        bars = np.concatenate(bar_list)
+        symbol_index = np.repeat(np.arange(len(symbols)), [len(item) for item in bar_list])
+        order = np.lexsort((symbol_index, bars['datetime']))
+        self.__bars__ = bars[order]
+        self.__bar_symbols__ = [symbols[i] for i in symbol_index[order]]
+        self.__logger__.debug('broker {} loaded {} bars of {} symbols'.format(
+            self.id, len(self.__bars__), len(symbols)))
+
     def check_market(self, event):
         assert isinstance(event, EventObject)
         if self.__active__ is False:
             return
+        if self.market_info_type == MarketInfoType.BAR:
+            self.__check_bar__()
+            return
         this_dt, this_symbol, this_market = self.back_datetime, None, None
         for symbol in self.__market_info_map__:
             if self.__market_info_map__[symbol].datetime < this_dt:
@@ -97,13 +160,43 @@ class MockBroker(Persistable, Recordable):
         self.event_bus.put(EventObject(
             event_type=EVENT.MARKET_SEND, broker_id=self.id,
             market=this_market))
+        if self.__aggregator__ is not None:
+            self.__send_bars__(self.__aggregator__.update(this_market))
         if self.__loading_market_thread_dict__[this_symbol].is_alive() \
                 or self.__market_info_queue_dict__[this_symbol].full():
             self.__market_info_map__[this_symbol] = self.__market_info_queue_dict__[this_symbol].get(block=True)
         else:
             self.__market_info_map__.pop(this_symbol)
+            if len(self.__market_info_map__) == 0 and self.__aggregator__ is not None:
+                # 行情回放结束，发出未完成的k线
+                self.__send_bars__(self.__aggregator__.flush())
+
+    def __send_bars__(self, bars: list):
+        for frequency, bar in bars:
+            self.event_bus.put(EventObject(
+                event_type=EVENT.MARKET_BAR_SEND, broker_id=self.id, frequency=frequency,
+                market=bar))
+
+    def __check_bar__(self):
+        """发出同一时间的全部k线，BarObject 直接引用数组中的行，不复制数据"""
+        bars, begin = self.__bars__, self.__bar_cursor__
+        if begin >= len(bars):
+            return
+        bar_dt = bars['datetime']
+        end = int(np.searchsorted(bar_dt, bar_dt[begin], side='right'))
+        for index in range(begin, end):
+            self.event_bus.put(EventObject(
+                event_type=EVENT.MARKET_SEND, broker_id=self.id,
+                market=BarObject(bars[index], order_book_id=self.__bar_symbols__[index])))
+        self.__bar_cursor__ = end
 
     def start(self):
+        if self.market_info_type == MarketInfoType.BAR:
+            self.__loading_bar_thread__.join()
+            self.__bar_cursor__ = 0
+            self.__active__ = True
+            return
+
         # init market info
         for symbol in self.universe:
             if self.__loading_market_thread_dict__[symbol].is_alive() or self.__market_info_queue_dict__[symbol].full():
@@ -113,6 +206,8 @@ class MockBroker(Persistable, Recordable):
 
     def stop(self):
         self.__active__ = False
+        if self.market_info_type == MarketInfoType.BAR:
+            self.__loading_bar_thread__.join()
 
         for symbol in self.__loading_market_thread_dict__:
             self.__loading_market_thread_dict__[symbol].join()
@@ -159,11 +254,51 @@ class MockBroker(Persistable, Recordable):
         if isinstance(market, TickObject):
             raise NotImplementedError
         elif isinstance(market, BarObject):
-            raise NotImplementedError
+            self.__match_bar__(market)
         else:
             from utils.Exceptions import ParamTypeError
             raise ParamTypeError('event.market', 'TickObject/BarObject', market)
 
+    def __match_bar__(self, bar: BarObject):
+        """
+        k线撮合
+
+        CURRENT_BAR_CLOSE 以当前k线收盘价成交，NEXT_BAR_OPEN 以开盘价成交（挂单均在该k线发出前提交，即下一根k线开盘）；
+        限价单价格不优于成交价时继续挂单，成交量不超过k线成交量，市价单未成交部分撤销。停牌（成交量为 0）时不撮合。
+        """
+        if bar.isnan or not bar.volume > 0:
+            return
+        order_book_id = bar.order_book_id
+        deal_price = float(bar.close if self.matching_type == MatchingType.CURRENT_BAR_CLOSE else bar.open)
+        volume_left = int(bar.volume)
+        for account, order in self.open_order_list:
+            if order.order_book_id != order_book_id or order.is_final():
+                continue
+            if order.type == OrderType.LIMIT:
+                if order.side == OrderSide.BUY and order.price < deal_price:
+                    continue
+                if order.side == OrderSide.SELL and order.price > deal_price:
+                    continue
+            fill = min(order.unfilled_quantity, volume_left)
+            if fill > 0:
+                trade = TradeObject(
+                    order.order_id, order_book_id, bar.datetime, bar.datetime, deal_price, fill, order.side,
+                    order.position_effect, frozen_price=order.frozen_price,
+                )
+                order.fill(trade)
+                volume_left -= fill
+                self.event_bus.put(EventObject(EVENT.TRADE, account=account, trade=trade, order=order))
+            if order.type == OrderType.MARKET and order.unfilled_quantity > 0:
+                order.mark_cancelled(lazy_format(
+                    'Order Cancelled: market order {order_book_id} volume {order_volume} is larger than '
+                    'bar volume, fill {filled_volume} actually',
+                    order_book_id=order_book_id, order_volume=order.quantity, filled_volume=order.filled_quantity,
+                ))
+            if order.status == OrderStatus.REJECTED or order.status == OrderStatus.CANCELLED:
+                # 与成交事件一样放入队列，保证账户先处理成交再解冻未成交部分
+                self.event_bus.put(EventObject(EVENT.ORDER_UNSOLICITED_UPDATE, account=account, order=order))
+        self.open_order_list = [(a, o) for a, o in self.open_order_list if not o.is_final()]
+
     def _match(self, order_book_id=None):
         if order_book_id is not None:
             open_orders = [(a, o) for (a, o) in self.open_order_list if o.order_book_id == order_book_id]
@@ -5,18 +5,87 @@ import os
 import numpy as np
 import pandas as pd
 
-from utils import lru_cache
+from Interface import AbstractDataProxy
+from SecurityTable import SecurityTable
+from core.structure.Bar import BarObject
+from core.structure.CorporateActions import CorporateActionIndex
+from core.structure.DayFlags import DayFlags
+from core.structure.Instrument import Instrument, InstrumentRegistry
+from core.structure.TradingCalendar import TradingCalendar
+from utils import id_generator, lru_cache
+from utils.Cache import date_key
+
+
+TICK_CHUNK_SIZE = 4096          # get_merge_ticks 每个合约每次读入的 tick 条数
 
 
 class DataProxy(AbstractDataProxy):
+    cache_token_gen = id_generator()
+
     def __init__(self):
         from core.Environment import Environment
+        # 缓存键中的实例标识，id(self) 在实例被回收后可能被新实例复用，读到旧实例的缓存
+        self._cache_token = next(self.cache_token_gen)
+        # 按交易日的合约标记，位图以 mmap 方式在首次查询时载入
+        self._suspend_days = DayFlags('suspended')
+        self._st_stock_days = DayFlags('st')
+        self._non_subscribable_days = DayFlags('non_subscribable')
+        self._non_redeemable_days = DayFlags('non_redeemable')
+        # 交易日历在进程内共用
+        self._trading_calendar = TradingCalendar.get_instance()
+        # 合约注册表在进程内共用
+        self._instruments = InstrumentRegistry.get_instance()
+        # 按日期索引的分红、拆分事件
+        self._corporate_actions = CorporateActionIndex(self)
 
     def __getattr__(self, item):
         return getattr(self._data_source, item)
 
+    def instruments(self, id_or_symbols):
+        """
+        :param id_or_symbols: str/Instrument/list order_book_id 或其列表
+        :return: Instrument/list of Instrument，不存在的合约为 None
+        """
+        if isinstance(id_or_symbols, Instrument):
+            return id_or_symbols
+        if isinstance(id_or_symbols, str):
+            return self._instruments.get(id_or_symbols)
+        return [self._instruments.get(order_book_id) for order_book_id in id_or_symbols]
+
+    def get_listed_mask(self, order_book_id_list, date):
+        """多个合约在 date 当日是否在上市期间 -> numpy.ndarray of bool"""
+        return self._instruments.listed_mask(date, self._instruments.ids_of(order_book_id_list))
+
+    @staticmethod
+    def __to_timestamp__(value):
+        """%Y%m%d 整数 -> pandas.Timestamp，None 保持不变"""
+        if value is None:
+            return None
+        return pd.Timestamp(year=value // 10000, month=value // 100 % 100, day=value % 100)
+
     def get_trading_calendar(self):
-        return self._trading_dates.get_trading_calendar()
+        return pd.DatetimeIndex(self._trading_calendar.datetimes)
+
+    def get_trading_dates(self, start_date, end_date):
+        """[start_date, end_date] 内的交易日 -> pandas.DatetimeIndex"""
+        calendar = self._trading_calendar
+        return pd.DatetimeIndex(calendar.datetimes[calendar.range_slice(start_date, end_date)])
+
+    def get_previous_trading_date(self, date, n=1):
+        """date 之前的第 n 个交易日，超出日历范围时为 None -> pandas.Timestamp"""
+        return self.__to_timestamp__(self._trading_calendar.previous(date, n))
+
+    def get_next_trading_date(self, date, n=1):
+        """date 之后的第 n 个交易日，超出日历范围时为 None -> pandas.Timestamp"""
+        return self.__to_timestamp__(self._trading_calendar.next(date, n))
+
+    def get_n_trading_dates_until(self, dt, n):
+        """截止到 dt（含）的最近 n 个交易日 -> pandas.DatetimeIndex"""
+        calendar = self._trading_calendar
+        return pd.DatetimeIndex(calendar.datetimes[calendar.until_slice(dt, n)])
+
+    def is_trading_date(self, date):
+        return self._trading_calendar.is_trading_date(date)
 
     def get_trading_minutes_for(self, order_book_id: str, dt: datetime.datetime):
         instrument = self.instruments(order_book_id)
@@ -39,17 +108,23 @@ class DataProxy(AbstractDataProxy):
 
     def is_suspended(self, order_book_id: str, dt, count=1):
         if count == 1:
-            return self._suspend_days.contains(order_book_id, [dt])[0]
+            return self._suspend_days.is_set(order_book_id, dt)
         else:
-            dates = self.get_n_trading_dates_until(dt, count)
-            return self._suspend_days.contains(order_book_id, dates)
+            return self._suspend_days.until(order_book_id, dt, count)
+
+    def get_suspended(self, order_book_id_list, dt):
+        """多个合约在 dt 当日是否停牌 -> numpy.ndarray of bool"""
+        return self._suspend_days.on(order_book_id_list, dt)
 
     def is_st_stock(self, order_book_id: str, dt, count=1):
         if count == 1:
-            return self._st_stock_days.contains(order_book_id, [dt])[0]
+            return self._st_stock_days.is_set(order_book_id, dt)
         else:
-            dates = self.get_n_trading_dates_until(dt, count)
-            return self._st_stock_days.contains(order_book_id, dates)
+            return self._st_stock_days.until(order_book_id, dt, count)
+
+    def get_st_stock(self, order_book_id_list, dt):
+        """多个合约在 dt 当日是否为 ST -> numpy.ndarray of bool"""
+        return self._st_stock_days.on(order_book_id_list, dt)
 
     def get_ex_cum_factor(self, order_book_id: str):
         return self._ex_cum_factor.get_factors(order_book_id)
@@ -72,14 +147,12 @@ class DataProxy(AbstractDataProxy):
         }
 
     def get_commission_info(self, id_or_ins):
-        from SecurityInfo import CN_FUTURE_INFO
-
         if isinstance(id_or_ins, str):
             instrument = self.instruments(id_or_ins)
         else:
             instrument = id_or_ins
 
-        return CN_FUTURE_INFO[instrument.underlying_symbol]['speculation']
+        return SecurityTable.get_instance().speculation[instrument.underlying_symbol]
 
     def get_dividend(self, order_book_id: str):
         return self._dividends.get_dividend(order_book_id)
@@ -99,6 +172,14 @@ class DataProxy(AbstractDataProxy):
 
         return table[pos]
 
+    def get_dividends_by_book_date(self, order_book_ids, date):
+        """order_book_ids 中股权登记日为 date 的分红 -> dict order_book_id -> 分红记录"""
+        return self._corporate_actions.dividends_on(date, order_book_ids)
+
+    def get_splits_by_ex_date(self, order_book_ids, date):
+        """order_book_ids 中除权日为 date 的拆分 -> dict order_book_id -> 拆分比例"""
+        return self._corporate_actions.splits_on(date, order_book_ids)
+
     def get_split_by_ex_date(self, order_book_id, date):
         from utils.Functions import convert_datetime_date_to_int
         df = self.get_split(order_book_id)
@@ -112,7 +193,7 @@ class DataProxy(AbstractDataProxy):
 
         return df['split_factor'][pos]
 
-    @lru_cache(10240)
+    @lru_cache(10240, key=lambda self, order_book_id, dt: (self._cache_token, order_book_id, date_key(dt)))
     def _get_prev_close(self, order_book_id, dt):
         instrument = self.instruments(order_book_id)
         prev_trading_date = self.get_previous_trading_date(dt)
@@ -125,7 +206,7 @@ class DataProxy(AbstractDataProxy):
     def get_prev_close(self, order_book_id: str, dt: datetime.datetime):
         return self._get_prev_close(order_book_id, dt.replace(hour=0, minute=0, second=0))
 
-    @lru_cache(10240)
+    @lru_cache(10240, key=lambda self, instrument, dt: (self._cache_token, instrument.order_book_id, date_key(dt)))
     def _get_prev_settlement(self, instrument, dt):
         prev_trading_date = self.get_previous_trading_date(dt)
         bar = self._data_source.history_bars(instrument, 1, '1d', 'settlement', prev_trading_date,
@@ -151,44 +232,115 @@ class DataProxy(AbstractDataProxy):
         instrument = self.instruments(order_book_id)
         if frequency == '1d':
             day_bar = self._data_source.get_bar(instrument, dt, '1d')
-            if day_bar:
-                return BarObject(instrument, day_bar)
+            if day_bar is not None:
+                return BarObject(day_bar, order_book_id=order_book_id, instrument=instrument)
         elif frequency == '1m':
             day_bar, minute_bar = self._data_source.get_bar(instrument, dt, '1m')
-            if day_bar:
-                return BarObject(instrument, day_bar, m_data=minute_bar)
+            if day_bar is not None:
+                return BarObject(day_bar, m_data=minute_bar, order_book_id=order_book_id, instrument=instrument)
         else:
             raise ValueError("unknown frequency {}".format(frequency))
 
+    def history_bars(self, order_book_id: str, bar_count: int, frequency: str, fields, dt,
+                     skip_suspended=True, include_now=False, adjust_type='pre', adjust_orig=None):
+        instrument = self.instruments(order_book_id)
+        return self._data_source.history_bars(instrument, bar_count, frequency, fields, dt,
+                                              skip_suspended=skip_suspended, include_now=include_now,
+                                              adjust_type=adjust_type, adjust_orig=adjust_orig)
+
     def available_data_range(self, frequency):
         return self._data_source.available_data_range(frequency)
 
+    @staticmethod
+    def __tick_keys__(frame: pd.DataFrame):
+        """tick 的 date、time 列 -> %Y%m%d%H%M%S%f(毫秒) 格式的 int64 数组，用于排序和定位"""
+        dates = pd.to_numeric(frame['date']).values.astype(np.int64)
+        times = np.round(pd.to_numeric(frame['time']).values * 1000).astype(np.int64)
+        return dates * 1000000000 + times
+
+    @staticmethod
+    def __dt_key__(dt: datetime.datetime):
+        return ((dt.year * 10000 + dt.month * 100 + dt.day) * 1000000000
+                + (dt.hour * 10000 + dt.minute * 100 + dt.second) * 1000 + dt.microsecond // 1000)
+
+    def __tick_chunks__(self, universe, order_book_id: str, trading_date, last_key: int=None):
+        """
+        按块读入单个合约一个交易日的 tick，跳过时间不晚于 last_key 的部分
+
+        :return: generator of (int64 数组 时间键, dict 列名 -> numpy 数组)
+        """
+        file_name = trading_date.strftime('%Y-%m-%d')
+        if order_book_id not in universe:
+            return
+        unit = universe[order_book_id]
+        if file_name not in unit:
+            return
+        for frame in unit.read_chunks(file_name, TICK_CHUNK_SIZE, dtype={'date': str, 'time': str}):
+            if len(frame) == 0:
+                continue
+            keys = self.__tick_keys__(frame)
+            start = 0
+            if last_key is not None:
+                if keys[-1] <= last_key:
+                    continue
+                start = int(np.searchsorted(keys, last_key, side='right'))
+                last_key = None
+            yield keys[start:], {column: frame[column].values[start:] for column in frame.columns}
+
     def get_merge_ticks(self, order_book_id_list, trading_date, last_dt=None):
-        raise NotImplementedError
+        """
+        多个合约一个交易日的 tick 按时间归并 -> generator of TickObject
+
+        每个合约按 TICK_CHUNK_SIZE 条分块读入，内存中每个合约只保留一块；用堆按 (时间, 合约) 归并，
+        时间相同时按合约代码排序。last_dt 不为空时从晚于 last_dt 的第一条 tick 开始，块内用二分查找定位。
+        """
+        import heapq
+        from core.Environment import Environment
+        from core.structure.Tick import TickObject
+        universe = Environment.get_instance().universe
+        last_key = None if last_dt is None else self.__dt_key__(last_dt)
+
+        order_book_ids = sorted(set(order_book_id_list))
+        readers, chunks, heap = list(), list(), list()
+        for index, order_book_id in enumerate(order_book_ids):
+            reader = self.__tick_chunks__(universe, order_book_id, trading_date, last_key)
+            readers.append(reader)
+            chunks.append(next(reader, None))
+            if chunks[index] is not None:
+                heap.append((int(chunks[index][0][0]), index, 0))
+        heapq.heapify(heap)
+
+        while len(heap) > 0:
+            key, index, position = heap[0]
+            keys, columns = chunks[index]
+            tick = {column: values[position] for column, values in columns.items()}
+            tick['order_book_id'] = order_book_ids[index]
+            yield TickObject(tick)
+            position += 1
+            if position == len(keys):
+                chunks[index] = next(readers[index], None)
+                if chunks[index] is None:
+                    heapq.heappop(heap)
+                    continue
+                keys, position = chunks[index][0], 0
+            heapq.heapreplace(heap, (int(keys[position]), index, position))
 
     def non_subscribable(self, order_book_id: str, dt, count=1):
         if count == 1:
-            return self._non_subscribable_days.contains(order_book_id, [dt])[0]
+            return self._non_subscribable_days.is_set(order_book_id, dt)
         else:
-            dates = self.get_n_trading_dates_until(dt, count)
-            return self._non_subscribable_days.contains(order_book_id, dates)
+            return self._non_subscribable_days.until(order_book_id, dt, count)
 
     def non_redeemable(self, order_book_id: str, dt, count=1):
         if count == 1:
-            return self._non_redeemable_days.contains(order_book_id, [dt])[0]
+            return self._non_redeemable_days.is_set(order_book_id, dt)
         else:
-            dates = self.get_n_trading_dates_until(dt, count)
-            return self._non_redeemable_days.contains(order_book_id, dates)
+            return self._non_redeemable_days.until(order_book_id, dt, count)
 
     def public_fund_commission(self, id_or_ins, buy: bool):
-        from SecurityInfo import PUBLIC_FUND_COMMISSION
-
         if isinstance(id_or_ins, str):
             this_ins = self.instruments(id_or_ins)
         else:
             this_ins = id_or_ins
 
-        if buy:
-            return PUBLIC_FUND_COMMISSION[this_ins.fund_type]['Buy']
-        else:
-            return PUBLIC_FUND_COMMISSION[this_ins.fund_type]['Sell']
+        return SecurityTable.get_instance().fund_commission(this_ins.fund_type, buy)
@@ -24,7 +24,11 @@ class Environment(object):
         self.config = load_yaml(os.path.join(ROOT_PATH, 'Config.yaml'))
         self.event_bus = EventBus()         # 事件驱动中心
         self.universe = Universe()          # 可用合约池（以 data - source 文件夹内内容为准）
-        self.market_dict = MarketDict()     # 行情字典，用于快速获取当前行情以及快照
+        market_config = self.config.get('Market', dict())
+        self.market_dict = MarketDict(      # 行情字典，用于快速获取当前行情以及快照
+            history_depth=market_config.get('history_depth', 1000),
+            spill=market_config.get('history_spill', False),
+        )
 
         # private
         self.__data_proxy__ = None          # 数据接口
@@ -32,12 +36,38 @@ class Environment(object):
         self.__event_source__ = None        # 事件来源
         self.__store_provider__ = None      # 实时数据持久化方案
         self.__deal_decider__ = None        # 确定成交量和成交价的原则
+        self.__cache_stats__ = dict()       # 最近一次会话结束时的缓存统计
+
+        # register
+        from utils.Constants import EVENT
+        self.event_bus.add_listener(EVENT.SYS_STOP, self._on_sys_stop)
 
         # initiation
         timer_market_microseconds = self.config.get('Market', dict()).get('microseconds', 100)
         timer_sys_microseconds = self.config.get('Timer', dict()).get('microseconds', 1000)
         self.event_bus.start(timer_sys=timer_sys_microseconds, timer_market=timer_market_microseconds)
 
+    def _on_sys_stop(self, event):
+        """会话结束时保存缓存统计并清空缓存，避免常驻进程中缓存无限增长"""
+        from utils.Cache import cache_stats, clear_all
+        self.__cache_stats__ = cache_stats()
+        for name, item in self.__cache_stats__.items():
+            self.__logger__.debug('cache {}: {}'.format(name, item))
+        clear_all()
+
+    def stop(self):
+        """
+        会话结束，停止事件引擎，停止前发出 SYS_STOP 事件
+
+        :return: dict 清空前的缓存统计 name -> dict
+        """
+        self.event_bus.stop()
+        return self.get_cache_stats()
+
+    def get_cache_stats(self):
+        """最近一次会话结束时（清空前）的缓存统计 -> dict name -> dict"""
+        return dict(self.__cache_stats__)
+
     @classmethod
     def get_instance(cls):
         """
@@ -108,3 +138,7 @@ class Environment(object):
         from Interface import AbstractDataProxy
         assert isinstance(data_proxy, AbstractDataProxy)
         self.__data_proxy__ = data_proxy
+
+    def get_instrument(self, order_book_id: str):
+        """order_book_id -> Instrument，由数据接口的合约注册表 O(1) 查找"""
+        return self.__data_proxy__.instruments(order_book_id)
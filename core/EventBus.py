@@ -27,7 +27,7 @@ class EventBus(object):
     def __init__(self):
         from collections import defaultdict
         from queue import Queue
-        from threading import Thread
+        from threading import Event, Thread
         from utils.Logger import get_logger
 
         self.__queue__ = Queue()        # 事件队列
@@ -35,6 +35,7 @@ class EventBus(object):
         # 事件处理线程
         self.__thread__ = Thread(target=self.__run__, name='{} event process thread.'.format(self.__class__.__name__))
         self.__handlers__ = defaultdict(list)   # 处理预案队列
+        self.__sys_stopped__ = Event()          # SYS_STOP 事件已处理
 
         # 计时器，用于触发计时器事件
         self.__timer_sys_thread__ = Thread(
@@ -57,13 +58,18 @@ class EventBus(object):
             try:
                 event = self.__queue__.get(block=True, timeout=1)
                 assert isinstance(event, EventObject)
-                for func in self.__handlers__[event.event_type]:
-                    # 如果返回 True ，那么消息不再传递下去
-                    if func(event) is True:
-                        return
+                self.__dispatch__(event)
             except Empty:
                 pass
 
+    def __dispatch__(self, event: EventObject):
+        for func in self.__handlers__[event.event_type]:
+            # 如果返回 True ，那么消息不再传递下去
+            if func(event) is True:
+                break
+        if event.event_type == EVENT.SYS_STOP:
+            self.__sys_stopped__.set()
+
     def __timer_sys__(self):
         while self.__active_status__ is True:
             self.put(EventObject(event_type=EVENT.SYS_TIMER))
@@ -94,25 +100,39 @@ class EventBus(object):
 
         # 启动计时器，计时器事件间隔默认设定为1秒
         assert timer_sys > 0
-        self.__timer_sys_sleep__ = timer_sys * 1000
+        self.__timer_sys_sleep__ = timer_sys / 1000
         self.__timer_sys_thread__.start()
 
         # 启动行情发送
         assert timer_market > 0
-        self.__timer_market_sleep__ = timer_market * 1000
+        self.__timer_market_sleep__ = timer_market / 1000
         self.__timer_market_thread__.start()
 
-    def stop(self):
-        """停止引擎"""
+    def stop(self, timeout: float=None):
+        """
+        停止引擎
+
+        先发出 SYS_STOP 事件，等待事件处理线程处理完该事件之前的全部事件和 SYS_STOP（会话结束时的清理，
+        如清空缓存、发送缓存的消息），再停止各线程
+        """
+        import threading
+        if self.__sys_stopped__.is_set() is False:
+            if self.__thread__.is_alive() and threading.current_thread() is not self.__thread__:
+                self.put(EventObject(event_type=EVENT.SYS_STOP))
+                self.__sys_stopped__.wait(timeout)
+            else:
+                # 引擎未启动或在事件处理线程中调用，直接处理
+                self.__dispatch__(EventObject(event_type=EVENT.SYS_STOP))
+
         # 将引擎设为停止
         self.__active_status__ = False
+        if threading.current_thread() is self.__thread__:
+            return
 
         # 停止
-        self.__timer_sys_thread__.join()
-        self.__timer_market_thread__.join()
-
-        # 等待事件处理线程退出
-        self.__thread__.join()
+        for thread in (self.__timer_sys_thread__, self.__timer_market_thread__, self.__thread__):
+            if thread.is_alive():
+                thread.join()
 
     def put(self, event: EventObject):
         self.__queue__.put(event)
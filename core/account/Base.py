@@ -8,7 +8,14 @@ class BaseAccount(object):
     AGGRESSIVE_UPDATE_LAST_PRICE = False
 
     def __init__(self, total_cash, positions, backward_trade_set=set(), register_event=True):
+        from core.position.Columnar import ColumnarPositionStore
         self._positions = positions
+        self._store = ColumnarPositionStore()     # 列式持仓，用于向量化估值
+        self._version = 0                           # 现金、冻结资金等账户状态的版本号
+        self._dirty_positions = set()               # 上次检查点之后发生变化的持仓
+        self._positions_reset = False               # 上次检查点之后持仓是否被整体清空
+        for position in positions.values():
+            self._store.update(position)
         self._frozen_cash = 0
         self._total_cash = total_cash
         self._backward_trade_set = backward_trade_set
@@ -30,6 +37,93 @@ class BaseAccount(object):
         """
         raise NotImplementedError
 
+    def update_last_prices(self, order_book_ids, prices):
+        """
+        按行情批次更新持仓最新价
+
+        :param order_book_ids: list of str 合约代码
+        :param prices: list/numpy.ndarray 最新价
+        """
+        self._store.scatter_last_prices(order_book_ids, prices)
+
+    @property
+    def version(self):
+        """
+        [int] 账户状态版本号，成交、行情、结算等事件改变账户状态后递增
+        """
+        return self._version + self._store.version
+
+    def _bump_version(self):
+        self._version += 1
+
+    def _sync_position(self, position):
+        """持仓变化后同步至列式存储"""
+        self._store.update(position)
+        self._dirty_positions.add(position.order_book_id)
+
+    def _sync_all_positions(self):
+        self._store.clear()
+        for position in self._positions.values():
+            self._store.update(position)
+        self._dirty_positions.update(self._positions.keys())
+
+    def _remove_position(self, order_book_id):
+        self._positions.pop(order_book_id, None)
+        self._store.remove(order_book_id)
+        self._dirty_positions.add(order_book_id)
+
+    def _clear_positions(self):
+        self._positions.clear()
+        self._store.clear()
+        self._dirty_positions.clear()
+        self._positions_reset = True
+
+    def _get_cash_state(self):
+        """持仓以外的账户状态 -> dict"""
+        raise NotImplementedError
+
+    def _set_cash_state(self, state):
+        raise NotImplementedError
+
+    def get_state(self):
+        state = self._get_cash_state()
+        state['positions'] = {
+            order_book_id: position.get_state() for order_book_id, position in self._positions.items()
+        }
+        return state
+
+    def get_delta_state(self):
+        """
+        上次检查点之后的增量状态，包含变化的持仓（已删除的持仓为 None）和全部现金状态，调用后重置检查点
+        """
+        state = self._get_cash_state()
+        state['reset'] = self._positions_reset
+        positions = dict()
+        for order_book_id in self._dirty_positions:
+            position = self._positions.get(order_book_id, None)
+            positions[order_book_id] = None if position is None else position.get_state()
+        state['positions'] = positions
+        self.clear_delta()
+        return state
+
+    def clear_delta(self):
+        """设置检查点，已完整保存账户状态后调用"""
+        self._dirty_positions.clear()
+        self._positions_reset = False
+
+    def apply_delta_state(self, state):
+        """在已恢复的状态上重放 get_delta_state 的结果"""
+        self._set_cash_state(state)
+        if state['reset'] is True:
+            self._positions.clear()
+        for order_book_id, value in state['positions'].items():
+            if value is None:
+                self._positions.pop(order_book_id, None)
+            else:
+                self._positions.get_or_create(order_book_id).set_state(value)
+        self._sync_all_positions()
+        self._bump_version()
+
     @property
     def type(self):
         """
@@ -44,9 +138,6 @@ class BaseAccount(object):
         """
         raise NotImplementedError
 
-    def get_state(self):
-        raise NotImplementedError
-
     def set_state(self, state):
         raise NotImplementedError
 
@@ -76,7 +167,7 @@ class BaseAccount(object):
         """
         [float] 市值
         """
-        return sum(position.market_value for position in self.positions.values())
+        return self._store.market_value
 
     @property
     def transaction_cost(self):
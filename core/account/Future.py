@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from collections import defaultdict
+
 import six
 
 from model.BaseAccount import BaseAccount
@@ -22,6 +24,10 @@ def margin_of(order_book_id, quantity, price):
 
 class FutureAccount(BaseAccount):
 
+    def __init__(self, total_cash, positions, backward_trade_set=set(), register_event=True):
+        self._margin_adjustments = dict()       # order_book_id -> 恢复状态时按当前保证金率调整的资金
+        super(FutureAccount, self).__init__(total_cash, positions, backward_trade_set, register_event)
+
     def register_event(self):
         event_bus = Environment.get_instance().event_bus
         event_bus.add_listener(EVENT.SETTLEMENT, self._settlement)
@@ -42,6 +48,17 @@ class FutureAccount(BaseAccount):
             self._apply_trade(trade)
         # 计算 Frozen Cash
         self._frozen_cash = sum(self._frozen_cash_of_order(order) for order in orders if order.is_active())
+        # 计算挂单量
+        open_orders = defaultdict(list)
+        for order in orders:
+            if order.is_active():
+                open_orders[order.order_book_id].append(order)
+        # 没有持仓的合约也可能有挂单，需要创建持仓以记录挂单量
+        for order_book_id in set(self._positions.keys()) | set(open_orders.keys()):
+            position = self._positions.get_or_create(order_book_id)
+            position.reset_open_orders(open_orders.get(order_book_id, []))
+            self._sync_position(position)
+        self._bump_version()
 
     def order(self, order_book_id, quantity, style, target=False):
         position = self.positions[order_book_id]
@@ -119,33 +136,62 @@ class FutureAccount(BaseAccount):
             ))
             return orders
 
-    def get_state(self):
+    def _get_cash_state(self):
         return {
-            'positions': {
-                order_book_id: position.get_state()
-                for order_book_id, position in six.iteritems(self._positions)
-            },
             'frozen_cash': self._frozen_cash,
             'total_cash': self._total_cash,
             'backward_trade_set': list(self._backward_trade_set),
             'transaction_cost': self._transaction_cost,
         }
 
+    def _set_cash_state(self, state):
+        self._frozen_cash = state['frozen_cash']
+        self._total_cash = state['total_cash']
+        self._backward_trade_set = set(state['backward_trade_set'])
+        self._transaction_cost = state['transaction_cost']
+
+    @staticmethod
+    def _margin_changed(position, state):
+        """保存时的保证金率与当前不同时，按当前保证金率调整的资金 -> float"""
+        if 'margin_rate' in state and abs(state['margin_rate'] - position.margin_rate) > 1e-6:
+            return position.margin * (state['margin_rate'] - position.margin_rate) / position.margin_rate
+        return 0
+
     def set_state(self, state):
         self._frozen_cash = state['frozen_cash']
         self._backward_trade_set = set(state['backward_trade_set'])
         self._transaction_cost = state['transaction_cost']
 
-        margin_changed = 0
+        self._margin_adjustments.clear()
         self._positions.clear()
         for order_book_id, v in six.iteritems(state['positions']):
             position = self._positions.get_or_create(order_book_id)
             position.set_state(v)
-            if 'margin_rate' in v and abs(v['margin_rate'] - position.margin_rate) > 1e-6:
-                margin_changed += position.margin * (v['margin_rate'] - position.margin_rate) / position.margin_rate
+            self._margin_adjustments[order_book_id] = self._margin_changed(position, v)
 
-        self._total_cash = state['total_cash'] + margin_changed
+        self._total_cash = state['total_cash'] + sum(self._margin_adjustments.values())
+        self._sync_all_positions()
+        self._bump_version()
 
+    def apply_delta_state(self, state):
+        """与 set_state 相同，恢复的资金按当前保证金率调整，增量中未出现的持仓沿用恢复快照时的调整"""
+        adjustments = self._margin_adjustments
+        if state['reset'] is True:
+            self._positions.clear()
+            adjustments.clear()
+        for order_book_id, v in six.iteritems(state['positions']):
+            if v is None:
+                self._positions.pop(order_book_id, None)
+                adjustments.pop(order_book_id, None)
+            else:
+                position = self._positions.get_or_create(order_book_id)
+                position.set_state(v)
+                adjustments[order_book_id] = self._margin_changed(position, v)
+
+        self._set_cash_state(state)
+        self._total_cash += sum(adjustments.values())
+        self._sync_all_positions()
+        self._bump_version()
 
     @property
     def type(self):
@@ -175,21 +221,21 @@ class FutureAccount(BaseAccount):
         """
         [float] 总保证金
         """
-        return sum(position.margin for position in six.itervalues(self._positions))
+        return self._store.margin
 
     @property
     def buy_margin(self):
         """
         [float] 买方向保证金
         """
-        return sum(position.buy_margin for position in six.itervalues(self._positions))
+        return self._store.buy_margin
 
     @property
     def sell_margin(self):
         """
         [float] 卖方向保证金
         """
-        return sum(position.sell_margin for position in six.itervalues(self._positions))
+        return self._store.sell_margin
 
     # -- PNL 相关
     @property
@@ -204,14 +250,14 @@ class FutureAccount(BaseAccount):
         """
         [float] 浮动盈亏
         """
-        return sum(position.holding_pnl for position in six.itervalues(self._positions))
+        return self._store.holding_pnl
 
     @property
     def realized_pnl(self):
         """
         [float] 平仓盈亏
         """
-        return sum(position.realized_pnl for position in six.itervalues(self._positions))
+        return self._store.realized_pnl
 
     def _settlement(self, event):
         total_value = self.total_value
@@ -221,42 +267,58 @@ class FutureAccount(BaseAccount):
             if position.is_de_listed() and position.buy_quantity + position.sell_quantity != 0:
                 user_system_log.warn(
                     "{order_book_id} is expired, close all positions by system".format(order_book_id=order_book_id))
-                del self._positions[order_book_id]
+                self._remove_position(order_book_id)
             elif position.buy_quantity == 0 and position.sell_quantity == 0:
-                del self._positions[order_book_id]
+                self._remove_position(order_book_id)
             else:
                 position.apply_settlement()
+                self._sync_position(position)
         self._total_cash = total_value - self.margin - self.holding_pnl
 
         # 如果 total_value <= 0 则认为已爆仓，清空仓位，资金归0
         if total_value <= 0:
-            self._positions.clear()
+            self._clear_positions()
             self._total_cash = 0
 
         self._backward_trade_set.clear()
+        self._bump_version()
 
     def _on_bar(self, event):
         for position in self._positions.values():
             position.update_last_price()
+            self._store.set_last_price(position.order_book_id, position.last_price)
 
     def _on_tick(self, event):
-        for position in self._positions.values():
-            position.update_last_price()
+        tick = event.tick
+        position = self._positions.get(tick.order_book_id, None)
+        if position is None:
+            return
+        position.update_last_price()
+        self._store.set_last_price(tick.order_book_id, position.last_price)
 
     def _on_order_pending_new(self, event):
         if self != event.account:
             return
-        self._frozen_cash += self._frozen_cash_of_order(event.order)
+        order = event.order
+        self._positions.get_or_create(order.order_book_id).on_order_pending_new_(order)
+        self._frozen_cash += self._frozen_cash_of_order(order)
+        self._bump_version()
 
     def _on_order_creation_reject(self, event):
         if self != event.account:
             return
-        self._frozen_cash -= self._frozen_cash_of_order(event.order)
+        order = event.order
+        self._positions.get_or_create(order.order_book_id).on_order_creation_reject_(order)
+        self._frozen_cash -= self._frozen_cash_of_order(order)
+        self._bump_version()
 
     def _on_order_unsolicited_update(self, event):
         if self != event.account:
             return
-        self._frozen_cash -= self._frozen_cash_of_order(event.order)
+        order = event.order
+        self._positions.get_or_create(order.order_book_id).on_order_cancel_(order)
+        self._frozen_cash -= self._frozen_cash_of_order(order)
+        self._bump_version()
 
     def _on_trade(self, event):
         if self != event.account:
@@ -269,9 +331,11 @@ class FutureAccount(BaseAccount):
         order_book_id = trade.order_book_id
         position = self._positions.get_or_create(order_book_id)
         delta_cash = position.apply_trade(trade)
+        self._sync_position(position)
 
         self._transaction_cost += trade.transaction_cost
         self._total_cash -= trade.transaction_cost
         self._total_cash += delta_cash
         self._frozen_cash -= self._frozen_cash_of_trade(trade)
         self._backward_trade_set.add(trade.exec_id)
+        self._bump_version()
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import functools
+
 import jsonpickle
 
 from utils.Constants import DaysCount, DefaultAccountType
@@ -7,15 +9,43 @@ from utils import property_repr
 from utils.Constants import EVENT
 
 
+def versioned_property(func):
+    """
+    组合派生指标的缓存属性，仅当组合或任一账户的版本号发生变化时重新计算
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self):
+        version = self._get_version()
+        cached = self._cache.get(name, None)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        value = func(self)
+        self._cache[name] = (version, value)
+        return value
+
+    return property(wrapper)
+
+
 class Portfolio(object):
     __repr__ = property_repr
 
-    def __init__(self, start_date, static_unit_net_value, units, accounts, register_event=True):
+    def __init__(self, start_date, static_unit_net_value, units, accounts, register_event=True,
+                 codec: str=None, compress: bool=None):
+        """
+        :param codec: str 状态的序列化方案 pickle/binary，None 时使用 Config.yaml 中 Persist 的设置
+        :param compress: bool 是否使用 zlib 压缩，None 时使用 Config.yaml 中 Persist 的设置
+        """
+        from utils.Codec import codec_from_config
+        self._codec = codec_from_config(codec, compress)
         self._start_date = start_date
         self._static_unit_net_value = static_unit_net_value
         self._units = units
         self._accounts = accounts
         self._mixed_positions = None
+        self._version = 0
+        self._cache = dict()
         if register_event:
             self.register_event()
 
@@ -23,6 +53,7 @@ class Portfolio(object):
         from core.Environment import Environment
         event_bus = Environment.get_instance().event_bus
         event_bus.prepend_listener(EVENT.PRE_BEFORE_TRADING, self._pre_before_trading)
+        event_bus.add_listener(EVENT.MARKET_SEND, self._on_market)
 
     def order(self, order_book_id, quantity, style, target=False):
         from core.Environment import Environment
@@ -30,26 +61,92 @@ class Portfolio(object):
         return self.accounts[account_type].order(order_book_id, quantity, style, target)
 
     def get_state(self):
-        return jsonpickle.encode({
+        return self.encode_state(self.snapshot_state())
+
+    def snapshot_state(self):
+        """组合状态的独立副本，不做序列化，供后台持久化线程调用 encode_state"""
+        return {
             'start_date': self._start_date,
             'static_unit_net_value': self._static_unit_net_value,
             'units': self._units,
             'account': {
                 name: account.get_state() for name, account in self._accounts.items()
             }
-        }).encode('utf-8')
+        }
+
+    def encode_state(self, snapshot: dict):
+        return self._codec.dumps(snapshot)
+
+    def decode_state(self, state: bytes):
+        """按序列化方案解码，兼容 jsonpickle 保存的历史数据 -> dict"""
+        if state[:1] == b'{':
+            return jsonpickle.decode(state.decode('utf-8'))
+        return self._codec.loads(state)
+
+    def get_delta_state(self):
+        """各账户自上次检查点以来的增量状态，调用后重置检查点"""
+        return {
+            'start_date': self._start_date,
+            'static_unit_net_value': self._static_unit_net_value,
+            'units': self._units,
+            'account': {
+                name: account.get_delta_state() for name, account in self._accounts.items()
+            }
+        }
+
+    def clear_delta(self):
+        for account in self._accounts.values():
+            account.clear_delta()
+
+    def apply_delta_state(self, state: bytes):
+        value = self.decode_state(state)
+        self._start_date = value['start_date']
+        self._static_unit_net_value = value['static_unit_net_value']
+        self._units = value['units']
+        for k, v in value['account'].items():
+            self._accounts[k].apply_delta_state(v)
+        self._version += 1
 
     def set_state(self, state: bytes):
-        state = state.decode('utf-8')
-        value = jsonpickle.decode(state)
+        value = self.decode_state(state)
         self._start_date = value['start_date']
         self._static_unit_net_value = value['static_unit_net_value']
         self._units = value['units']
         for k, v in value['account'].items():
             self._accounts[k].set_state(v)
+        self._version += 1
+
+    def _get_version(self):
+        return (self._version, ) + tuple(account.version for account in self._accounts.values())
+
+    @property
+    def version(self):
+        """
+        [tuple] 组合及各账户的版本号，任一变化说明组合状态可能发生了变化
+        """
+        return self._get_version()
 
     def _pre_before_trading(self, event):
         self._static_unit_net_value = self.unit_net_value
+        self._version += 1
+
+    def _on_market(self, event):
+        """行情（tick 或k线）发出时更新持仓最新价，市值、浮动盈亏、总权益随之变化"""
+        market = getattr(event, 'market', None)
+        if market is None:
+            return
+        self.update_last_prices([market.order_book_id], [market.last])
+
+    def update_last_prices(self, order_book_ids, prices):
+        """
+        将一批行情的最新价散列写入各账户的列式持仓
+
+        :param order_book_ids: list of str 合约代码
+        :param prices: list/numpy.ndarray 与 order_book_ids 一一对应的最新价
+        """
+        for account in self._accounts.values():
+            account.update_last_prices(order_book_ids, prices)
+        self._version += 1
 
     @property
     def accounts(self):
@@ -86,7 +183,7 @@ class Portfolio(object):
         """
         return self._units
 
-    @property
+    @versioned_property
     def unit_net_value(self):
         """
         [float] 实时净值
@@ -97,14 +194,14 @@ class Portfolio(object):
     def static_unit_net_value(self):
         return self._static_unit_net_value
 
-    @property
+    @versioned_property
     def daily_pnl(self):
         """
         [float] 当日盈亏
         """
         return self.total_value - self._static_unit_net_value * self.units
 
-    @property
+    @versioned_property
     def daily_returns(self):
         """
         [float] 当前最新一天的日收益
@@ -125,14 +222,20 @@ class Portfolio(object):
         """
         from core.Environment import Environment
         current_date = Environment.get_instance().trading_dt.date()
-        return self.unit_net_value ** (DaysCount.DAYS_A_YEAR / float((current_date - self.start_date).days + 1)) - 1
-
-    @property
+        version = (self._get_version(), current_date)
+        cached = self._cache.get('annualized_returns', None)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        value = self.unit_net_value ** (DaysCount.DAYS_A_YEAR / float((current_date - self.start_date).days + 1)) - 1
+        self._cache['annualized_returns'] = (version, value)
+        return value
+
+    @versioned_property
     def total_value(self):
         """
         [float]总权益
         """
-        return sum(account.total_value for account in self._accounts.items())
+        return sum(account.total_value for account in self._accounts.values())
 
     @property
     def portfolio_value(self):
@@ -150,28 +253,35 @@ class Portfolio(object):
             self._mixed_positions = MixedPositions(self._accounts)
         return self._mixed_positions
 
-    @property
+    @versioned_property
     def cash(self):
         """
         [float] 可用资金
         """
         return sum(account.cash for account in self._accounts.values())
 
-    @property
+    @versioned_property
     def dividend_receivable(self):
         return sum(getattr(account, 'dividend_receivable', 0) for account in self._accounts.values())
 
-    @property
+    @versioned_property
     def transaction_cost(self):
         return sum(account.transaction_cost for account in self._accounts.values())
 
-    @property
+    @versioned_property
     def market_value(self):
         """
         [float] 市值
         """
         return sum(account.market_value for account in self._accounts.values())
 
+    @versioned_property
+    def margin(self):
+        """
+        [float] 总保证金
+        """
+        return sum(getattr(account, 'margin', 0) for account in self._accounts.values())
+
     @property
     def pnl(self):
         return (self.unit_net_value - 1) * self.units
@@ -180,7 +290,7 @@ class Portfolio(object):
     def starting_cash(self):
         return self.units
 
-    @property
+    @versioned_property
     def frozen_cash(self):
         return sum(account.frozen_cash for account in self._accounts.values())
 
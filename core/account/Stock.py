@@ -39,29 +39,30 @@ class StockAccount(BaseAccount):
             quantity = quantity - position.quantity
         return order_shares(order_book_id, quantity, style=style)
 
-    def get_state(self):
+    def _get_cash_state(self):
         return {
-            'positions': {
-                order_book_id: position.get_state()
-                for order_book_id, position in self._positions.items()
-            },
             'frozen_cash': self._frozen_cash,
             'total_cash': self._total_cash,
             'backward_trade_set': list(self._backward_trade_set),
-            'dividend_receivable': self._dividend_receivable,
+            'dividend_receivable': dict(self._dividend_receivable),
             'transaction_cost': self._transaction_cost,
         }
 
-    def set_state(self, state):
+    def _set_cash_state(self, state):
         self._frozen_cash = state['frozen_cash']
         self._total_cash = state['total_cash']
         self._backward_trade_set = set(state['backward_trade_set'])
         self._dividend_receivable = state['dividend_receivable']
         self._transaction_cost = state['transaction_cost']
+
+    def set_state(self, state):
+        self._set_cash_state(state)
         self._positions.clear()
         for order_book_id, v in state['positions'].items():
             position = self._positions.get_or_create(order_book_id)
             position.set_state(v)
+        self._sync_all_positions()
+        self._bump_version()
 
     def fast_forward(self, orders, trades=list()):
         # 计算 Positions
@@ -81,6 +82,8 @@ class StockAccount(BaseAccount):
                 frozen_quantity[o.order_book_id] += o.unfilled_quantity
         for order_book_id, position in self._positions.items():
             position.reset_frozen(frozen_quantity[order_book_id])
+        self._dirty_positions.update(self._positions.keys())
+        self._bump_version()
 
     def _on_trade(self, event):
         if event.account != self:
@@ -93,6 +96,7 @@ class StockAccount(BaseAccount):
 
         position = self._positions.get_or_create(trade.order_book_id)
         position.apply_trade(trade)
+        self._sync_position(position)
         self._transaction_cost += trade.transaction_cost
         self._total_cash -= trade.transaction_cost
         if trade.side == OrderSide.BUY:
@@ -101,6 +105,7 @@ class StockAccount(BaseAccount):
         else:
             self._total_cash += trade.last_price * trade.last_quantity
         self._backward_trade_set.add(trade.exec_id)
+        self._bump_version()
 
     def _on_order_pending_new(self, event):
         if event.account != self:
@@ -109,9 +114,11 @@ class StockAccount(BaseAccount):
         position = self._positions.get(order.order_book_id, None)
         if position is not None:
             position.on_order_pending_new_(order)
+            self._dirty_positions.add(order.order_book_id)
         if order.side == OrderSide.BUY:
             order_value = order.frozen_price * order.quantity
             self._frozen_cash += order_value
+        self._bump_version()
 
     def _on_order_unsolicited_update(self, event):
         if event.account != self:
@@ -120,9 +127,11 @@ class StockAccount(BaseAccount):
         order = event.order
         position = self._positions.get_or_create(order.order_book_id)
         position.on_order_cancel_(order)
+        self._dirty_positions.add(order.order_book_id)
         if order.side == OrderSide.BUY:
             unfilled_value = order.unfilled_quantity * order.frozen_price
             self._frozen_cash -= unfilled_value
+        self._bump_version()
 
     def _before_trading(self, event):
         trading_date = Environment.get_instance().trading_dt.date()
@@ -130,6 +139,7 @@ class StockAccount(BaseAccount):
         self._handle_dividend_book_closure(last_date)
         self._handle_dividend_payable(trading_date)
         self._handle_split(trading_date)
+        self._bump_version()
 
     def _on_settlement(self, event):
         env = Environment.get_instance()
@@ -141,18 +151,27 @@ class StockAccount(BaseAccount):
                 user_system_log.warn(
                     "{order_book_id} is expired, close all positions by system".format(order_book_id=order_book_id)
                 )
-                self._positions.pop(order_book_id, None)
+                self._remove_position(order_book_id)
             elif position.quantity == 0:
-                self._positions.pop(order_book_id, None)
+                self._remove_position(order_book_id)
             else:
                 position.apply_settlement()
+                self._sync_position(position)
 
         self._transaction_cost = 0
         self._backward_trade_set.clear()
+        self._bump_version()
 
     def _update_last_price(self, event):
-        for position in self._positions.values():
+        tick = getattr(event, 'tick', None)
+        if tick is not None:
+            position = self._positions.get(tick.order_book_id, None)
+            positions = [] if position is None else [position]
+        else:
+            positions = self._positions.values()
+        for position in positions:
             position.update_last_price()
+            self._store.set_last_price(position.order_book_id, position.last_price)
 
     @property
     def type(self):
@@ -174,22 +193,23 @@ class StockAccount(BaseAccount):
         return datetime.date(year=y, month=m, day=d)
 
     def _handle_dividend_book_closure(self, trading_date):
-        for order_book_id, position in self._positions.items():
+        data_proxy = Environment.get_instance().data_proxy
+        dividends = data_proxy.get_dividends_by_book_date(self._positions.keys(), trading_date)
+        for order_book_id, dividend in dividends.items():
+            position = self._positions[order_book_id]
             if position.quantity == 0:
                 continue
 
-            dividend = Environment.get_instance().data_proxy.get_dividend_by_book_date(order_book_id, trading_date)
-            if dividend is None:
-                continue
-
             dividend_per_share = dividend['dividend_cash_before_tax'] / dividend['round_lot']
             position.dividend_(dividend_per_share)
+            self._sync_position(position)
 
             config = Environment.get_instance().config
             if config.extra.dividend_reinvestment:
                 last_price = Environment.get_instance().data_proxy.get_bar(order_book_id, trading_date).close
                 shares = position.quantity * dividend_per_share / last_price
                 position._quantity += shares
+                self._sync_position(position)
             else:
                 self._dividend_receivable[order_book_id] = {
                     'quantity': position.quantity,
@@ -199,11 +219,10 @@ class StockAccount(BaseAccount):
 
     def _handle_split(self, trading_date):
         data_proxy = Environment.get_instance().data_proxy
-        for order_book_id, position in self._positions.items():
-            ratio = data_proxy.get_split_by_ex_date(order_book_id, trading_date)
-            if ratio is None:
-                continue
+        for order_book_id, ratio in data_proxy.get_splits_by_ex_date(self._positions.keys(), trading_date).items():
+            position = self._positions[order_book_id]
             position.split_(ratio)
+            self._sync_position(position)
 
     @property
     def total_value(self):
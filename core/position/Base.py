@@ -64,3 +64,11 @@ class BasePosition(AbstractPosition):
 
     def apply_trade(self, trade):
         raise NotImplementedError
+
+    def columns(self):
+        """
+        返回列式存储所需的字段，用于 :class:`~ColumnarPositionStore`
+
+        :return: (净持仓, 持仓均价, 合约乘数, 买方向持仓成本, 卖方向持仓成本, 保证金率, 平仓盈亏)
+        """
+        raise NotImplementedError
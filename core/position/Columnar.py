@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+class ColumnarPositionStore(object):
+    """
+    列式持仓存储，用于账户估值
+
+    每个合约占用一个固定的 slot，持仓数量、均价、最新价、合约乘数等字段分别保存在 numpy 数组中，
+    账户的市值、保证金、浮动盈亏等汇总值通过向量运算得到，行情更新时只需按 slot 散列写入最新价。
+    """
+    DEFAULT_CAPACITY = 256
+
+    def __init__(self, capacity: int=DEFAULT_CAPACITY):
+        self._slots = dict()            # order_book_id -> slot
+        self._size = 0
+        self._version = 0               # 每次数据变化后递增，供上层判断缓存是否失效
+        self._capacity = max(int(capacity), 1)
+
+        self._quantity = np.zeros(self._capacity, dtype=np.float64)           # 净持仓（期货为买方向减卖方向）
+        self._avg_price = np.zeros(self._capacity, dtype=np.float64)          # 持仓均价
+        self._last_price = np.zeros(self._capacity, dtype=np.float64)         # 最新价
+        self._multiplier = np.ones(self._capacity, dtype=np.float64)          # 合约乘数
+        self._buy_holding_cost = np.zeros(self._capacity, dtype=np.float64)   # 买方向持仓成本（含合约乘数）
+        self._sell_holding_cost = np.zeros(self._capacity, dtype=np.float64)  # 卖方向持仓成本（含合约乘数）
+        self._margin_rate = np.zeros(self._capacity, dtype=np.float64)        # 保证金率
+        self._realized_pnl = np.zeros(self._capacity, dtype=np.float64)       # 当日平仓盈亏
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, order_book_id: str):
+        return order_book_id in self._slots
+
+    @property
+    def version(self):
+        """
+        [int] 数据版本号
+        """
+        return self._version
+
+    def __grow__(self):
+        new_capacity = self._capacity * 2
+        for name in ('_quantity', '_avg_price', '_last_price', '_buy_holding_cost', '_sell_holding_cost',
+                     '_margin_rate', '_realized_pnl'):
+            new_array = np.zeros(new_capacity, dtype=np.float64)
+            new_array[:self._capacity] = getattr(self, name)
+            setattr(self, name, new_array)
+        new_multiplier = np.ones(new_capacity, dtype=np.float64)
+        new_multiplier[:self._capacity] = self._multiplier
+        self._multiplier = new_multiplier
+        self._capacity = new_capacity
+
+    def slot_of(self, order_book_id: str):
+        """返回合约对应的 slot，不存在时分配新的 slot -> int"""
+        try:
+            return self._slots[order_book_id]
+        except KeyError:
+            if self._size == self._capacity:
+                self.__grow__()
+            slot = self._size
+            self._slots[order_book_id] = slot
+            self._size += 1
+            return slot
+
+    def update(self, position):
+        """根据持仓对象同步对应 slot 的数据，持仓发生变化（成交、结算、拆分等）后调用"""
+        slot = self.slot_of(position.order_book_id)
+        (quantity, avg_price, multiplier, buy_holding_cost, sell_holding_cost, margin_rate,
+         realized_pnl) = position.columns()
+        self._quantity[slot] = quantity
+        self._avg_price[slot] = avg_price
+        self._multiplier[slot] = multiplier
+        self._buy_holding_cost[slot] = buy_holding_cost
+        self._sell_holding_cost[slot] = sell_holding_cost
+        self._margin_rate[slot] = margin_rate
+        self._realized_pnl[slot] = realized_pnl
+        last_price = position.last_price
+        if last_price == last_price:
+            # 过滤掉 nan
+            self._last_price[slot] = last_price
+        self._version += 1
+
+    def remove(self, order_book_id: str):
+        """清空合约持仓，slot 保留以便复用"""
+        slot = self._slots.get(order_book_id, None)
+        if slot is None:
+            return
+        self._quantity[slot] = 0
+        self._buy_holding_cost[slot] = 0
+        self._sell_holding_cost[slot] = 0
+        self._realized_pnl[slot] = 0
+        self._version += 1
+
+    def clear(self):
+        self._quantity[:] = 0
+        self._buy_holding_cost[:] = 0
+        self._sell_holding_cost[:] = 0
+        self._realized_pnl[:] = 0
+        self._version += 1
+
+    def set_last_price(self, order_book_id: str, price: float):
+        slot = self._slots.get(order_book_id, None)
+        if slot is not None and price == price and self._last_price[slot] != price:
+            self._last_price[slot] = price
+            self._version += 1
+
+    def scatter_last_prices(self, order_book_ids, prices):
+        """
+        批量更新最新价
+
+        :param order_book_ids: list of str 合约代码，不在持仓中的合约会被忽略
+        :param prices: list/numpy.ndarray 与 order_book_ids 一一对应的最新价，nan 会被忽略
+        """
+        slots, values = list(), list()
+        for order_book_id, price in zip(order_book_ids, prices):
+            slot = self._slots.get(order_book_id, None)
+            if slot is None or price != price:
+                continue
+            slots.append(slot)
+            values.append(price)
+        if len(slots) > 0:
+            self._last_price[slots] = values
+            self._version += 1
+
+    # -- 向量汇总
+    @property
+    def market_value(self):
+        """
+        [float] 市值
+        """
+        n = self._size
+        return float(np.sum(self._quantity[:n] * self._last_price[:n] * self._multiplier[:n]))
+
+    @property
+    def buy_margin(self):
+        """
+        [float] 买方向保证金
+        """
+        n = self._size
+        return float(np.dot(self._buy_holding_cost[:n], self._margin_rate[:n]))
+
+    @property
+    def sell_margin(self):
+        """
+        [float] 卖方向保证金
+        """
+        n = self._size
+        return float(np.dot(self._sell_holding_cost[:n], self._margin_rate[:n]))
+
+    @property
+    def margin(self):
+        """
+        [float] 总保证金
+        """
+        n = self._size
+        return float(np.dot(self._buy_holding_cost[:n] + self._sell_holding_cost[:n], self._margin_rate[:n]))
+
+    @property
+    def holding_pnl(self):
+        """
+        [float] 浮动盈亏，即 (最新价 - 买方向均价) * 买方向持仓 + (卖方向均价 - 最新价) * 卖方向持仓
+        """
+        n = self._size
+        return self.market_value - float(np.sum(self._buy_holding_cost[:n]) - np.sum(self._sell_holding_cost[:n]))
+
+    @property
+    def realized_pnl(self):
+        """
+        [float] 当日平仓盈亏
+        """
+        return float(np.sum(self._realized_pnl[:self._size]))
+
+    @property
+    def pnl(self):
+        """
+        [float] 按持仓均价计算的累计盈亏
+        """
+        n = self._size
+        return float(np.sum(self._quantity[:n] * (self._last_price[:n] - self._avg_price[:n]) * self._multiplier[:n]))
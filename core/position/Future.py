@@ -22,16 +22,30 @@ class FuturePosition(BasePosition):
         self._buy_avg_open_price = 0.
         self._sell_avg_open_price = 0.
 
+        # 聚合值，随成交和订单事件增量维护，避免每次读取属性时重新求和
+        self._buy_old_quantity = 0
+        self._sell_old_quantity = 0
+        self._buy_today_quantity = 0
+        self._sell_today_quantity = 0
+        self._buy_holding_value = 0.        # sum(price * amount)，不含合约乘数
+        self._sell_holding_value = 0.
+        self._buy_open_order_quantity = 0
+        self._sell_open_order_quantity = 0
+        self._buy_close_order_quantity = 0
+        self._sell_close_order_quantity = 0
+        self._contract_multiplier = None
+        self._margin_rate = None            # 保证金率（含保证金倍数），结算时刷新
+
     def __repr__(self):
         return 'FuturePosition({})'.format(self.__dict__)
 
     def get_state(self):
         return {
             'order_book_id': self._order_book_id,
-            'buy_old_holding_list': self._buy_old_holding_list,
-            'sell_old_holding_list': self._sell_old_holding_list,
-            'buy_today_holding_list': self._buy_today_holding_list,
-            'sell_today_holding_list': self._sell_today_holding_list,
+            'buy_old_holding_list': list(self._buy_old_holding_list),
+            'sell_old_holding_list': list(self._sell_old_holding_list),
+            'buy_today_holding_list': list(self._buy_today_holding_list),
+            'sell_today_holding_list': list(self._sell_today_holding_list),
             'buy_transaction_cost': self._buy_transaction_cost,
             'sell_transaction_cost': self._sell_transaction_cost,
             'buy_realized_pnl': self._buy_realized_pnl,
@@ -52,6 +66,8 @@ class FuturePosition(BasePosition):
         self._sell_transaction_cost = state['sell_transaction_cost']
         self._buy_avg_open_price = state['buy_avg_open_price']
         self._sell_avg_open_price = state['sell_avg_open_price']
+        self._margin_rate = None
+        self._reset_holding_aggregates()
 
     @property
     def type(self):
@@ -59,10 +75,11 @@ class FuturePosition(BasePosition):
 
     @property
     def margin_rate(self):
-        env = Environment.get_instance()
-        margin_info = env.data_proxy.get_margin_info(self.order_book_id)
-        margin_multiplier = env.config.base.margin_multiplier
-        return margin_info['long_margin_ratio'] * margin_multiplier
+        if self._margin_rate is None:
+            env = Environment.get_instance()
+            margin_info = env.data_proxy.get_margin_info(self.order_book_id)
+            self._margin_rate = margin_info['long_margin_ratio'] * env.config.base.margin_multiplier
+        return self._margin_rate
 
     @property
     def market_value(self):
@@ -79,7 +96,10 @@ class FuturePosition(BasePosition):
     # -- PNL 相关
     @property
     def contract_multiplier(self):
-        return Environment.get_instance().get_instrument(self.order_book_id).contract_multiplier
+        if self._contract_multiplier is None:
+            self._contract_multiplier = Environment.get_instance().get_instrument(
+                self.order_book_id).contract_multiplier
+        return self._contract_multiplier
 
     @property
     def open_orders(self):
@@ -175,74 +195,70 @@ class FuturePosition(BasePosition):
         """
         [int] 买方向挂单量
         """
-        return sum(order.unfilled_quantity for order in self.open_orders if
-                   order.side == OrderSide.BUY and order.position_effect == PositionEffect.OPEN)
+        return self._buy_open_order_quantity
 
     @property
     def sell_open_order_quantity(self):
         """
         [int] 卖方向挂单量
         """
-        return sum(order.unfilled_quantity for order in self.open_orders if
-                   order.side == OrderSide.SELL and order.position_effect == PositionEffect.OPEN)
+        return self._sell_open_order_quantity
 
     @property
     def buy_close_order_quantity(self):
         """
         [int] 买方向挂单量
         """
-        return sum(order.unfilled_quantity for order in self.open_orders if order.side == OrderSide.BUY and
-                   order.position_effect in [PositionEffect.CLOSE, PositionEffect.CLOSE_TODAY])
+        return self._buy_close_order_quantity
 
     @property
     def sell_close_order_quantity(self):
         """
         [int] 卖方向挂单量
         """
-        return sum(order.unfilled_quantity for order in self.open_orders if order.side == OrderSide.SELL and
-                   order.position_effect in [PositionEffect.CLOSE, PositionEffect.CLOSE_TODAY])
+        return self._sell_close_order_quantity
 
     @property
     def buy_old_quantity(self):
         """
         [int] 买方向昨仓
         """
-        return sum(amount for price, amount in self._buy_old_holding_list)
+        return self._buy_old_quantity
 
     @property
     def sell_old_quantity(self):
         """
         [int] 卖方向昨仓
         """
-        return sum(amount for price, amount in self._sell_old_holding_list)
+        return self._sell_old_quantity
 
     @property
     def buy_today_quantity(self):
         """
         [int] 买方向今仓
         """
-        return sum(amount for price, amount in self._buy_today_holding_list)
+        return self._buy_today_quantity
 
     @property
     def sell_today_quantity(self):
         """
         [int] 卖方向今仓
         """
-        return sum(amount for price, amount in self._sell_today_holding_list)
+        return self._sell_today_quantity
 
     @property
     def buy_quantity(self):
         """
         [int] 买方向持仓
         """
-        return self.buy_old_quantity + self.buy_today_quantity
+        return self._buy_old_quantity + self._buy_today_quantity
 
     @property
     def sell_quantity(self):
         """
         [int] 卖方向持仓
         """
-        return self.sell_old_quantity + self.sell_today_quantity
+        return self._sell_old_quantity + self._sell_today_quantity
 
     @property
     def closable_buy_quantity(self):
@@ -297,11 +313,11 @@ class FuturePosition(BasePosition):
 
     @property
     def _buy_holding_cost(self):
-        return sum(p * a * self.contract_multiplier for p, a in self.buy_holding_list)
+        return self._buy_holding_value * self.contract_multiplier
 
     @property
     def _sell_holding_cost(self):
-        return sum(p * a * self.contract_multiplier for p, a in self.sell_holding_list)
+        return self._sell_holding_value * self.contract_multiplier
 
     @property
     def buy_holding_list(self):
@@ -333,6 +349,14 @@ class FuturePosition(BasePosition):
 
     # -- Function
 
+    def columns(self):
+        if self.buy_quantity >= self.sell_quantity:
+            avg_price = self.buy_avg_holding_price
+        else:
+            avg_price = self.sell_avg_holding_price
+        return (self.buy_quantity - self.sell_quantity, avg_price, self.contract_multiplier,
+                self._buy_holding_cost, self._sell_holding_cost, self.margin_rate, self.realized_pnl)
+
     def cal_close_today_amount(self, trade_amount, trade_side):
         if trade_side == OrderSide.SELL:
             close_today_amount = trade_amount - self.buy_old_quantity
@@ -349,25 +373,68 @@ class FuturePosition(BasePosition):
         self._sell_old_holding_list = [(settle_price, self.sell_quantity)]
         self._buy_today_holding_list = []
         self._sell_today_holding_list = []
+        self._reset_holding_aggregates()
 
         self._buy_transaction_cost = 0.
         self._sell_transaction_cost = 0.
         self._buy_realized_pnl = 0.
         self._sell_realized_pnl = 0.
+        # 保证金率可能按交易日调整，下次读取时重新获取
+        self._margin_rate = None
+
+    def _reset_holding_aggregates(self):
+        """根据持仓列表重新计算持仓聚合值，仅在 set_state 与结算时调用"""
+        self._buy_old_quantity = sum(amount for price, amount in self._buy_old_holding_list)
+        self._sell_old_quantity = sum(amount for price, amount in self._sell_old_holding_list)
+        self._buy_today_quantity = sum(amount for price, amount in self._buy_today_holding_list)
+        self._sell_today_quantity = sum(amount for price, amount in self._sell_today_holding_list)
+        self._buy_holding_value = sum(p * a for p, a in self.buy_holding_list)
+        self._sell_holding_value = sum(p * a for p, a in self.sell_holding_list)
+
+    def _update_order_quantity(self, side, position_effect, quantity):
+        if side == OrderSide.BUY:
+            if position_effect == PositionEffect.OPEN:
+                self._buy_open_order_quantity += quantity
+            else:
+                self._buy_close_order_quantity += quantity
+        else:
+            if position_effect == PositionEffect.OPEN:
+                self._sell_open_order_quantity += quantity
+            else:
+                self._sell_close_order_quantity += quantity
+
+    def on_order_pending_new_(self, order):
+        self._update_order_quantity(order.side, order.position_effect, order.quantity)
+
+    def on_order_creation_reject_(self, order):
+        self._update_order_quantity(order.side, order.position_effect, -order.quantity)
+
+    def on_order_cancel_(self, order):
+        self._update_order_quantity(order.side, order.position_effect, -order.unfilled_quantity)
+
+    def reset_open_orders(self, orders):
+        """根据当前活跃订单重置挂单量，用于 fast_forward"""
+        self._buy_open_order_quantity = 0
+        self._sell_open_order_quantity = 0
+        self._buy_close_order_quantity = 0
+        self._sell_close_order_quantity = 0
+        for order in orders:
+            self._update_order_quantity(order.side, order.position_effect, order.unfilled_quantity)
 
     def _margin_of(self, quantity, price):
-        env = Environment.get_instance()
-        instrument = env.data_proxy.instruments(self.order_book_id)
-        return quantity * instrument.contract_multiplier * price * self.margin_rate
+        return quantity * self.contract_multiplier * price * self.margin_rate
 
     def apply_trade(self, trade):
         trade_quantity = trade.last_quantity
+        self._update_order_quantity(trade.side, trade.position_effect, -trade_quantity)
         if trade.side == OrderSide.BUY:
             if trade.position_effect == PositionEffect.OPEN:
                 self._buy_avg_open_price = (self._buy_avg_open_price * self.buy_quantity +
                                             trade_quantity * trade.last_price) / (self.buy_quantity + trade_quantity)
                 self._buy_transaction_cost += trade.transaction_cost
                 self._buy_today_holding_list.insert(0, (trade.last_price, trade_quantity))
+                self._buy_today_quantity += trade_quantity
+                self._buy_holding_value += trade.last_price * trade_quantity
                 return -1 * self._margin_of(trade_quantity, trade.last_price)
             else:
                 old_margin = self.margin
@@ -381,6 +448,8 @@ class FuturePosition(BasePosition):
                                              trade_quantity * trade.last_price) / (self.sell_quantity + trade_quantity)
                 self._sell_transaction_cost += trade.transaction_cost
                 self._sell_today_holding_list.insert(0, (trade.last_price, trade_quantity))
+                self._sell_today_quantity += trade_quantity
+                self._sell_holding_value += trade.last_price * trade_quantity
                 return -1 * self._margin_of(trade_quantity, trade.last_price)
             else:
                 old_margin = self.margin
@@ -403,6 +472,8 @@ class FuturePosition(BasePosition):
                 else:
                     consumed_quantity = old_quantity
                 left_quantity -= consumed_quantity
+                self._sell_old_quantity -= consumed_quantity
+                self._sell_holding_value -= old_price * consumed_quantity
                 delta += self._cal_realized_pnl(old_price, trade.last_price, trade.side, consumed_quantity)
             # 再平进仓
             while True:
@@ -415,6 +486,8 @@ class FuturePosition(BasePosition):
                 else:
                     consumed_quantity = oldest_quantity
                 left_quantity -= consumed_quantity
+                self._sell_today_quantity -= consumed_quantity
+                self._sell_holding_value -= oldest_price * consumed_quantity
                 delta += self._cal_realized_pnl(oldest_price, trade.last_price, trade.side, consumed_quantity)
         else:
             # 先平昨仓
@@ -426,6 +499,8 @@ class FuturePosition(BasePosition):
                 else:
                     consumed_quantity = old_quantity
                 left_quantity -= consumed_quantity
+                self._buy_old_quantity -= consumed_quantity
+                self._buy_holding_value -= old_price * consumed_quantity
                 delta += self._cal_realized_pnl(old_price, trade.last_price, trade.side, consumed_quantity)
             # 再平今仓
             while True:
@@ -439,6 +514,8 @@ class FuturePosition(BasePosition):
                 else:
                     consumed_quantity = oldest_quantity
                 left_quantity -= consumed_quantity
+                self._buy_today_quantity -= consumed_quantity
+                self._buy_holding_value -= oldest_price * consumed_quantity
                 delta += self._cal_realized_pnl(oldest_price, trade.last_price, trade.side, consumed_quantity)
         return delta
 
@@ -69,6 +69,9 @@ class StockPosition(BasePosition):
     def cal_close_today_amount(self, *args):
         return 0
 
+    def columns(self):
+        return self._quantity, self._avg_price, 1, 0, 0, 0, 0
+
     @property
     def type(self):
         return DefaultAccountType.STOCK.name
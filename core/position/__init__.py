@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 from .Stock import StockPosition
 from .Future import FuturePosition
+from .Columnar import ColumnarPositionStore
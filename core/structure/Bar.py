@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import datetime
+
 import numpy as np
 
 from utils.Constants import BarStatus
@@ -10,59 +12,74 @@ NAMES = ['open', 'close', 'low', 'high', 'settlement', 'limit_up', 'limit_down',
 
 NANDict = {i: np.nan for i in NAMES}
 
+# k线数组的字段，datetime 为 %Y%m%d%H%M%S 格式的整数
+BAR_DTYPE = np.dtype([('datetime', np.int64)] + [(name, np.float64) for name in (
+    'open', 'high', 'low', 'close', 'volume', 'total_turnover', 'open_interest', 'settlement', 'prev_settlement',
+    'prev_close', 'limit_up', 'limit_down',
+)])
 
-class BarObject(object):
 
-    def __init__(self, d_data, m_data=None):
-        from utils.Logger import get_logger
-        self.__logger__ = get_logger(self.__class__.__name__, 'model.Bar')
+def int_to_datetime(value: int):
+    """%Y%m%d%H%M%S 格式的整数 -> datetime.datetime"""
+    value = int(value)
+    date, time = divmod(value, 1000000)
+    return datetime.datetime(
+        date // 10000, date // 100 % 100, date % 100, time // 10000, time // 100 % 100, time % 100)
+
+
+def datetime_to_int(dt: datetime.datetime):
+    """datetime.datetime -> %Y%m%d%H%M%S 格式的整数"""
+    return ((dt.year * 10000 + dt.month * 100 + dt.day) * 1000000
+            + dt.hour * 10000 + dt.minute * 100 + dt.second)
 
+
+class BarObject(object):
+    """
+    k线，只引用数据行，不复制数据
+
+    :param d_data: dict/numpy.void 日线数据，可以是 BAR_DTYPE 数组中的一行
+    :param m_data: dict/numpy.void 分钟线数据，不为空时价格、成交量等字段从分钟线读取
+    :param order_book_id: str 合约代码，不传入时从 instrument 获取
+    :param dt: datetime.datetime k线时间，不传入时从数据的 datetime 字段获取
+    :param instrument: Instrument 合约对象
+    """
+    __slots__ = ('_data', '_m_data', '_row', '_order_book_id', '_instrument', '_dt', '_prev_close',
+                 '_prev_settlement')
+
+    def __init__(self, d_data, m_data=None, order_book_id: str=None, dt: datetime.datetime=None, instrument=None):
         self._data = d_data if d_data is not None else NANDict
         self._m_data = m_data
+        self._row = self._data if m_data is None else m_data
+        self._order_book_id = order_book_id
+        self._instrument = instrument
+        self._dt = dt
         self._prev_close = None
         self._prev_settlement = None
-        self._basis_spread = None
-        self._limit_up = None
-        self._limit_down = None
-        self.__internal_limit_up = None
-        self.__internal_limit_down = None
 
     @property
     def open(self):
         """
         [float] 当日开盘价
         """
-        try:
-            return self._m_data["open"]
-        except TypeError:
-            return self._data["open"]
+        return self._row['open']
 
     @property
     def close(self):
-        try:
-            return self._m_data["close"]
-        except TypeError:
-            return self._data["close"]
+        return self._row['close']
 
     @property
     def low(self):
         """
         [float] 截止到当前的最低价
         """
-        try:
-            return self._m_data["low"]
-        except TypeError:
-            return self._data["low"]
+        return self._row['low']
 
     @property
     def high(self):
         """
         [float] 截止到当前的最高价
         """
-        try:
-            return self._m_data["high"]
-        except TypeError:
-            return self._data["high"]
+        return self._row['high']
 
     @property
     def limit_up(self):
@@ -91,7 +108,7 @@ class BarObject(object):
         if self._prev_close is None:
             trading_dt = Environment.get_instance().trading_dt
             data_proxy = Environment.get_instance().data_proxy
-            self._prev_close = data_proxy.get_prev_close(self._instrument.order_book_id, trading_dt)
+            self._prev_close = data_proxy.get_prev_close(self.order_book_id, trading_dt)
         return self._prev_close
 
     @property
@@ -119,41 +136,26 @@ class BarObject(object):
         """
         [float] 截止到当前的成交量
         """
-        try:
-            return self._m_data["volume"]
-        except TypeError:
-            return self._data["volume"]
+        return self._row['volume']
 
     @property
     def total_turnover(self):
         """
         [float] 截止到当前的成交额
         """
-        try:
-            return self._m_data["total_turnover"]
-        except TypeError:
-            return self._data['total_turnover']
+        return self._row['total_turnover']
 
     @property
     def discount_rate(self):
-        try:
-            return self._m_data["discount_rate"]
-        except TypeError:
-            return self._data['discount_rate']
+        return self._row['discount_rate']
 
     @property
     def acc_net_value(self):
-        try:
-            return self._m_data["acc_net_value"]
-        except TypeError:
-            return self._data['acc_net_value']
+        return self._row['acc_net_value']
 
     @property
     def unit_net_value(self):
-        try:
-            return self._m_data["unit_net_value"]
-        except TypeError:
-            return self._data['unit_net_value']
+        return self._row['unit_net_value']
 
     INDEX_MAP = {
         'IF': '000300.SH',
@@ -163,10 +165,7 @@ class BarObject(object):
 
     @property
     def settlement(self):
-        try:
-            return self._m_data["settlement"]
-        except TypeError:
-            return self._data['settlement']
+        return self._row['settlement']
 
     @property
     def prev_settlement(self):
@@ -182,7 +181,7 @@ class BarObject(object):
         if self._prev_settlement is None:
             trading_dt = Environment.get_instance().trading_dt
             data_proxy = Environment.get_instance().data_proxy
-            self._prev_settlement = data_proxy.get_prev_settlement(self._instrument.order_book_id, trading_dt)
+            self._prev_settlement = data_proxy.get_prev_settlement(self.order_book_id, trading_dt)
         return self._prev_settlement
 
     @property
@@ -190,20 +189,13 @@ class BarObject(object):
         """
         [float] 截止到当前的持仓量（期货专用）
         """
-        try:
-            return self._m_data["open_interest"]
-        except TypeError:
-            return self._data['open_interest']
+        return self._row['open_interest']
 
     @property
     def datetime(self):
-        from data.Bars import from_day_bar_index, from_minute_bar_index
-        if self._dt is not None:
-            return self._dt
-        try:
-            return from_minute_bar_index(self._m_data['index'])
-        except TypeError:
-            return from_day_bar_index(self._data['index'])
+        if self._dt is None:
+            self._dt = int_to_datetime(self._row['datetime'])
+        return self._dt
 
     @property
     def instrument(self):
@@ -214,6 +206,8 @@ class BarObject(object):
         """
         [str] 交易标的代码
         """
+        if self._order_book_id is not None:
+            return self._order_book_id
         return self._instrument.order_book_id
 
     @property
@@ -228,17 +222,11 @@ class BarObject(object):
         """
         [datetime.datetime] 时间戳
         """
-        try:
-            return self._m_data["volume"] > 0
-        except TypeError:
-            return self._data['volume'] > 0
+        return self._row['volume'] > 0
 
     @property
     def isnan(self):
-        try:
-            return np.isnan(self._m_data['close'])
-        except TypeError:
-            return np.isnan(self._data['close'])
+        return np.isnan(self._row['close'])
 
     @property
     def suspended(self):
@@ -247,56 +235,34 @@ class BarObject(object):
             return True
 
         return Environment.get_instance().data_proxy.is_suspended(
-            self._instrument.order_book_id, int(self._data['datetime'] // 1000000)
+            self.order_book_id, int(self._data['datetime'] // 1000000)
         )
 
-    def mavg(self, intervals, frequency='1d'):
+    def __history__(self, intervals: int, frequency: str, fields):
+        """截止到本k线的历史数据，分钟k线获取日线时不包含当日"""
         from core.Environment import Environment
         if frequency == 'day':
             frequency = '1d'
         if frequency == 'minute':
             frequency = '1m'
+        return Environment.get_instance().data_proxy.history_bars(
+            self.order_book_id, intervals, frequency, fields, self.datetime, include_now=False)
 
-        # copy form history
-        env = Environment.get_instance()
-        dt = env.calendar_dt
-
-        if (env.config.base.frequency == '1m' and frequency == '1d') or \
-                ExecutionContext.phase() == ExecutionPhase.BEFORE_TRADING:
-            # 在分钟回测获取日线数据, 应该推前一天
-            dt = env.data_proxy.get_previous_trading_date(env.calendar_dt.date())
-        bars = env.data_proxy.fast_history(self._instrument.order_book_id, intervals, frequency, 'close', dt)
-        return bars.mean()
+    def mavg(self, intervals, frequency='1d'):
+        return self.__history__(intervals, frequency, 'close').mean()
 
     def vwap(self, intervals, frequency='1d'):
-        from core.Environment import Environment
-        if frequency == 'day':
-            frequency = '1d'
-        if frequency == 'minute':
-            frequency = '1m'
-
-        # copy form history
-        env = Environment.get_instance()
-        dt = env.calendar_dt
-
-        if (env.config.base.frequency == '1m' and frequency == '1d') or \
-                ExecutionContext.phase() == ExecutionPhase.BEFORE_TRADING:
-            # 在分钟回测获取日线数据, 应该推前一天
-            dt = env.data_proxy.get_previous_trading_date(env.calendar_dt.date())
-        bars = env.data_proxy.fast_history(
-            self._instrument.order_book_id, intervals, frequency, ['close', 'volume'], dt
-        )
+        bars = self.__history__(intervals, frequency, ['close', 'volume'])
         sum_value = bars['volume'].sum()
         if sum_value == 0:
             # 全部停牌
             return 0
 
-        return np.dot(bars['close'], bars['volume']) / sum
+        return np.dot(bars['close'], bars['volume']) / sum_value
 
     def __repr__(self):
         base = [
-            ('symbol', repr(self._instrument.symbol)),
-            ('order_book_id', repr(self._instrument.order_book_id)),
+            ('order_book_id', repr(self.order_book_id)),
             ('datetime', repr(self.datetime)),
         ]
 
@@ -304,15 +270,30 @@ class BarObject(object):
             base.append(('error', repr('DATA UNAVAILABLE')))
             return 'Bar({0})'.format(', '.join('{0}: {1}'.format(k, v) for k, v in base) + ' NaN BAR')
 
-        if isinstance(self._data, dict):
+        if isinstance(self._row, dict):
             # in pt
-            base.extend((k, v) for k, v in self._data.items() if k != 'datetime')
+            base.extend((k, v) for k, v in self._row.items() if k != 'datetime')
         else:
-            base.extend((n, self._data[n]) for n in self._data.dtype.names if n != 'datetime')
+            base.extend((n, self._row[n]) for n in self._row.dtype.names if n != 'datetime')
         return "Bar({0})".format(', '.join('{0}: {1}'.format(k, v) for k, v in base))
 
     def __getitem__(self, key):
-        return self.__dict__[key]
+        return getattr(self, key)
+
+    def record_state(self):
+        """k线字段字典，用于记录和分发，date/time 与 tick 原始字段的格式相同"""
+        dt = self.datetime
+        record = {
+            'order_book_id': self.order_book_id,
+            'date': dt.strftime('%Y%m%d'),
+            'time': dt.strftime('%H%M%S') + '.000',
+        }
+        if isinstance(self._row, dict):
+            items = self._row.items()
+        else:
+            items = ((n, self._row[n]) for n in self._row.dtype.names)
+        record.update((k, float(v)) for k, v in items if k != 'datetime')
+        return record
 
 
 class BarMap(object):
@@ -368,7 +349,7 @@ class BarMap(object):
                 self.__logger__.exception(e)
                 raise KeyError("id_or_symbols {} does not exist".format(key))
             if bar is None:
-                return BarObject(this_ins, NANDict, dt=self._dt)
+                return BarObject(NANDict, order_book_id=order_book_id, dt=self._dt, instrument=this_ins)
             else:
                 self._cache[order_book_id] = bar
                 return bar
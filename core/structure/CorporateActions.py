@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from core.structure.DayFlags import date_to_int
+
+
+class CorporateActionIndex(object):
+    """
+    按日期索引的分红、拆分事件
+
+    合约第一次被查询时读取一次其分红表（按 book_closure_date）和拆分表（按 ex_date），把每条记录登记到
+    日期 -> {order_book_id: 记录} 的字典中；之后按日期查询只需取出当日有事件的合约，与持仓取交集，
+    不再对每个持仓逐一在表上做 searchsorted。同一合约同一日期有多条记录时取第一条，与原有查询一致。
+
+    :param data_proxy: DataProxy 提供 get_dividend/get_split
+    """
+    def __init__(self, data_proxy):
+        self.__data_proxy__ = data_proxy
+        self.__lock__ = threading.Lock()
+        self.__indexed__ = set()
+        self.__dividends__ = dict()     # int %Y%m%d -> {order_book_id: 分红记录}
+        self.__splits__ = dict()        # int %Y%m%d -> {order_book_id: 拆分比例}
+
+    def __load_actions__(self, order_book_id: str):
+        dividends = self.__data_proxy__.get_dividend(order_book_id)
+        if dividends is not None and len(dividends) > 0:
+            for pos, date in enumerate(dividends['book_closure_date']):
+                self.__dividends__.setdefault(int(date), dict()).setdefault(order_book_id, dividends[pos])
+        splits = self.__data_proxy__.get_split(order_book_id)
+        if splits is not None and len(splits) > 0:
+            for date, ratio in zip(splits['ex_date'], splits['split_factor']):
+                self.__splits__.setdefault(int(date), dict()).setdefault(order_book_id, ratio)
+        self.__indexed__.add(order_book_id)
+
+    def ensure(self, order_book_ids):
+        """登记尚未读取的合约"""
+        if self.__indexed__.issuperset(order_book_ids):
+            return
+        with self.__lock__:
+            for order_book_id in set(order_book_ids) - self.__indexed__:
+                self.__load_actions__(order_book_id)
+
+    def __on__(self, events: dict, date, order_book_ids):
+        if date is None:
+            return dict()
+        self.ensure(order_book_ids)
+        today = events.get(date_to_int(date), None)
+        if today is None:
+            return dict()
+        return {order_book_id: item for order_book_id, item in today.items() if order_book_id in order_book_ids}
+
+    def dividends_on(self, date, order_book_ids):
+        """
+        order_book_ids 中股权登记日为 date 的分红
+
+        :param order_book_ids: 支持 in 查询的合约集合，如持仓字典的 keys()
+        :return: dict order_book_id -> 分红记录
+        """
+        return self.__on__(self.__dividends__, date, order_book_ids)
+
+    def splits_on(self, date, order_book_ids):
+        """
+        order_book_ids 中除权日为 date 的拆分
+
+        :return: dict order_book_id -> 拆分比例
+        """
+        return self.__on__(self.__splits__, date, order_book_ids)
+
+    def clear(self):
+        with self.__lock__:
+            self.__indexed__.clear()
+            self.__dividends__.clear()
+            self.__splits__.clear()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+
+import numpy as np
+
+
+def date_to_int(date):
+    """int/date/datetime/pandas.Timestamp -> %Y%m%d 整数"""
+    if isinstance(date, (int, np.integer)):
+        return int(date)
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+class DayFlags(object):
+    """
+    按交易日记录的合约标记（停牌、ST、暂停申购、暂停赎回等）
+
+    每个合约一行位图，第 i 位对应第 i 个交易日，整体保存为 np.packbits 后的 uint8 矩阵 {path}/{name}.bits.npy，
+    以 mmap 方式打开；行对应的合约代码和列对应的交易日分别保存在 {name}.ids.npy 和 {name}.dates.npy（int32 %Y%m%d）。
+    单日查询为一次位运算，N 日查询为对一段字节的 unpackbits，全部合约同一日的查询为一次向量化取列。
+    非交易日和没有记录的合约均视为未标记。
+
+    :param name: str 标记名称，如 suspended/st/non_subscribable/non_redeemable
+    :param path: str 数据目录
+    """
+    def __init__(self, name: str, path: str=os.path.join('data', 'calendar')):
+        from Interface import ROOT_PATH
+        self.__flag_name__ = name
+        self.__path__ = os.path.join(ROOT_PATH, path)
+        self.__lock__ = threading.Lock()
+        self.__loaded__ = False
+        self.__bits__ = np.zeros((0, 0), dtype=np.uint8)
+        self.__dates__ = np.empty(0, dtype=np.int32)
+        self.__rows__ = dict()          # order_book_id -> 行号
+
+    @property
+    def name(self):
+        """
+        [str] 标记名称
+        """
+        return self.__flag_name__
+
+    def __file_path__(self, part: str):
+        return os.path.join(self.__path__, '{}.{}.npy'.format(self.__flag_name__, part))
+
+    def __load__(self):
+        with self.__lock__:
+            if self.__loaded__ is True:
+                return
+            if os.path.exists(self.__file_path__('bits')) is True:
+                ids = np.load(self.__file_path__('ids'))
+                self.__dates__ = np.load(self.__file_path__('dates')).astype(np.int32)
+                self.__bits__ = np.load(self.__file_path__('bits'), mmap_mode='r')
+                self.__rows__ = {str(order_book_id): row for row, order_book_id in enumerate(ids)}
+            self.__loaded__ = True
+
+    def __day_index__(self, date):
+        """日期 -> 交易日序号，非交易日返回 -1"""
+        value = date_to_int(date)
+        pos = int(self.__dates__.searchsorted(value))
+        if pos < len(self.__dates__) and self.__dates__[pos] == value:
+            return pos
+        return -1
+
+    def is_set(self, order_book_id: str, date):
+        """单个合约单日是否被标记 -> bool"""
+        if self.__loaded__ is False:
+            self.__load__()
+        row = self.__rows__.get(order_book_id, None)
+        if row is None:
+            return False
+        index = self.__day_index__(date)
+        if index < 0:
+            return False
+        return bool((self.__bits__[row, index >> 3] >> (7 - (index & 7))) & 1)
+
+    def until(self, order_book_id: str, date, count: int):
+        """
+        截止到 date（含）的最近 count 个交易日是否被标记
+
+        :return: numpy.ndarray of bool 按日期升序，交易日不足 count 个时长度较短
+        """
+        if self.__loaded__ is False:
+            self.__load__()
+        end = int(self.__dates__.searchsorted(date_to_int(date), side='right'))
+        start = max(end - count, 0)
+        row = self.__rows__.get(order_book_id, None)
+        if row is None or end == start:
+            return np.zeros(end - start, dtype=bool)
+        chunk = np.unpackbits(self.__bits__[row, start >> 3:((end - 1) >> 3) + 1])
+        offset = start & ~7
+        return chunk[start - offset:end - offset].astype(bool)
+
+    def on(self, order_book_ids, date):
+        """
+        多个合约单日是否被标记，一次向量化取列
+
+        :param order_book_ids: iterable of str
+        :return: numpy.ndarray of bool 与 order_book_ids 一一对应
+        """
+        if self.__loaded__ is False:
+            self.__load__()
+        rows = np.fromiter((self.__rows__.get(order_book_id, -1) for order_book_id in order_book_ids), dtype=np.int64)
+        result = np.zeros(len(rows), dtype=bool)
+        index = self.__day_index__(date)
+        known = rows >= 0
+        if index < 0 or not known.any():
+            return result
+        result[known] = (self.__bits__[rows[known], index >> 3] >> (7 - (index & 7))) & 1
+        return result
+
+    def contains(self, order_book_id: str, dates):
+        """
+        兼容原有接口：合约在各日期是否被标记
+
+        :return: list of bool
+        """
+        return [self.is_set(order_book_id, date) for date in dates]
+
+    def write(self, flags: dict, trading_dates):
+        """
+        生成并保存位图，覆盖已有数据
+
+        :param flags: dict order_book_id -> iterable of date 被标记的日期，非交易日忽略
+        :param trading_dates: iterable of date 交易日，列的顺序
+        """
+        dates = np.unique(np.fromiter((date_to_int(date) for date in trading_dates), dtype=np.int32))
+        ids = sorted(flags.keys())
+        matrix = np.zeros((len(ids), len(dates)), dtype=bool)
+        for row, order_book_id in enumerate(ids):
+            marked = np.fromiter((date_to_int(date) for date in flags[order_book_id]), dtype=np.int32)
+            positions = dates.searchsorted(marked)
+            valid = positions < len(dates)
+            valid[valid] = dates[positions[valid]] == marked[valid]
+            matrix[row, positions[valid]] = True
+
+        if os.path.exists(self.__path__) is False:
+            os.makedirs(self.__path__)
+        parts = {
+            'ids': np.array(ids, dtype=str), 'dates': dates,
+            'bits': np.packbits(matrix, axis=1).reshape(len(ids), (len(dates) + 7) // 8),
+        }
+        for part, array in parts.items():
+            np.save(self.__file_path__(part) + '.tmp.npy', array)
+        with self.__lock__:
+            # 替换文件前释放旧的映射
+            self.__bits__ = np.zeros((0, 0), dtype=np.uint8)
+            for part in parts:
+                os.replace(self.__file_path__(part) + '.tmp.npy', self.__file_path__(part))
+            self.__loaded__ = False
+
+    def __repr__(self):
+        return '{}({}, instruments={}, days={})'.format(
+            self.__class__.__name__, self.__flag_name__, len(self.__rows__), len(self.__dates__))
@@ -1,74 +1,252 @@
 # -*- coding: utf-8 -*-
 import datetime
+import os
+import pickle
+import sys
+import threading
+
+import numpy as np
 
 
 class Instrument(object):
+    """
+    合约信息
+
+    常用字段保存在 __slots__ 中，其余字段放在 _extra 字典里按属性访问；字符串字段经过 sys.intern，同一品种、
+    类型的合约共用同一个字符串对象。上市、退市、到期日期同时保存为自然日序数，按日期判断时只做整数比较。
+
+    :param dic: dict 合约原始字段
+    :param instrument_id: int 在 InstrumentRegistry 中的序号，单独创建时为 -1
+    """
     DEFAULT_LISTED_DATE = datetime.datetime(1990, 1, 1)
     DEFAULT_DE_LISTED_DATE = datetime.datetime(2999, 12, 31)
+    INTERNED_FIELDS = ('order_book_id', 'symbol', 'type', 'underlying_symbol', 'exchange')
+
+    __slots__ = ('id', 'order_book_id', 'symbol', 'type', 'underlying_symbol', 'exchange',
+                 'listed_date', 'de_listed_date', 'maturity_date', 'listed_ordinal', 'de_listed_ordinal',
+                 'maturity_ordinal', '_extra')
 
     @staticmethod
     def _fix_date(ds, dflt):
-        if ds == '0000-00-00':
+        if ds is None or ds == '0000-00-00':
             return dflt
+        if isinstance(ds, datetime.datetime):
+            return ds
+        if isinstance(ds, datetime.date):
+            return datetime.datetime(ds.year, ds.month, ds.day)
         year, month, day = ds.split('-')
         return datetime.datetime(int(year), int(month), int(day))
 
-    def __init__(self, dic: dict):
-        self.__dict__ = dic
-        if 'listed_date' in self.__dict__:
-            self.listed_date = self._fix_date(self.listed_date, self.DEFAULT_LISTED_DATE)
-        if 'de_listed_date' in self.__dict__:
-            self.de_listed_date = self._fix_date(self.de_listed_date, self.DEFAULT_DE_LISTED_DATE)
-        if 'maturity_date' in self.__dict__:
-            self.maturity_date = self._fix_date(self.maturity_date, self.DEFAULT_DE_LISTED_DATE)
+    def __init__(self, dic: dict, instrument_id: int=-1):
+        extra = dict(dic)
+        self.id = instrument_id
+        for name in self.INTERNED_FIELDS:
+            value = extra.pop(name, None)
+            setattr(self, name, sys.intern(value) if isinstance(value, str) else value)
+        self.listed_date = self._fix_date(extra.pop('listed_date', None), self.DEFAULT_LISTED_DATE)
+        self.de_listed_date = self._fix_date(extra.pop('de_listed_date', None), self.DEFAULT_DE_LISTED_DATE)
+        self.maturity_date = self._fix_date(extra.pop('maturity_date', None), self.DEFAULT_DE_LISTED_DATE)
+        self.listed_ordinal = self.listed_date.toordinal()
+        self.de_listed_ordinal = self.de_listed_date.toordinal()
+        self.maturity_ordinal = self.maturity_date.toordinal()
+        self._extra = extra
+
+    def __getattr__(self, item):
+        # 只有 __slots__ 中没有的字段才会进入这里
+        try:
+            return object.__getattribute__(self, '_extra')[item]
+        except KeyError:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, item))
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def to_dict(self):
+        """-> dict 合约原始字段"""
+        result = {name: getattr(self, name) for name in self.INTERNED_FIELDS if getattr(self, name) is not None}
+        result.update(listed_date=self.listed_date, de_listed_date=self.de_listed_date,
+                      maturity_date=self.maturity_date)
+        result.update(self._extra)
+        return result
 
     def __repr__(self):
         return "{}({})".format(
             type(self).__name__,
-            ", ".join(["{}={}".format(k, repr(v)) for k, v in self.__dict__.items()])
+            ", ".join(["{}={}".format(k, repr(v)) for k, v in self.to_dict().items()])
         )
 
-    @property
-    def listing(self):
-        from core.Environment import Environment
-        now = Environment.get_instance().calendar_dt
-        return self.listed_date <= now <= self.de_listed_date
-
-    def days_from_listed(self):
-        from core.Environment import Environment
-        if self.listed_date == self.DEFAULT_LISTED_DATE:
-            return -1
+    def is_listed(self, date):
+        """date 当日是否在上市期间 -> bool"""
+        return self.listed_ordinal <= date.toordinal() <= self.de_listed_ordinal
 
-        date = Environment.get_instance().trading_dt.date()
-        if self.de_listed_date.date() < date:
-            return -1
+    def listing(self, date):
+        """date 当日是否在上市期间，同 is_listed -> bool"""
+        return self.is_listed(date)
 
-        ipo_days = (date - self.listed_date.date()).days
-        return ipo_days if ipo_days >= 0 else -1
-
-    @property
-    def order_book_id(self):
-        return self.__dict__['order_book_id']
+    def days_from_listed(self, date: datetime.date=None):
+        """
+        上市天数，未上市、已退市或没有上市日期时为 -1
 
-    @property
-    def type(self):  # str
-        return self.__dict__['type']
+        :param date: datetime.date 默认为当前交易日
+        """
+        if self.listed_ordinal == self.DEFAULT_LISTED_DATE.toordinal():
+            return -1
+        if date is None:
+            from core.Environment import Environment
+            date = Environment.get_instance().trading_dt
+        ordinal = date.toordinal()
+        if self.de_listed_ordinal < ordinal:
+            return -1
+        ipo_days = ordinal - self.listed_ordinal
+        return ipo_days if ipo_days >= 0 else -1
 
     @property
     def enum_type(self):
         from utils.Constants import InstrumentType
         return InstrumentType(self.type.upper())
 
-    def days_to_expire(self):
-        from core.Environment import Environment
+    def days_to_expire(self, date: datetime.date=None):
+        """
+        距到期日天数，非期货、主力/指数连续合约或已到期时为 -1
+
+        :param date: datetime.date 默认为当前交易日
+        """
         if self.type != 'Future' or self.order_book_id[-2:] == '88' or self.order_book_id[-2:] == '99':
             return -1
-
-        date = Environment.get_instance().trading_dt.date()
-        days = (self.maturity_date.date() - date).days
+        if date is None:
+            from core.Environment import Environment
+            date = Environment.get_instance().trading_dt
+        days = self.maturity_ordinal - date.toordinal()
         return -1 if days < 0 else days
 
 
+class InstrumentRegistry(object):
+    """
+    合约注册表
+
+    全部合约一次性载入为 Instrument 记录，按序号和 order_book_id 查找均为 O(1)；上市、退市日期另存为
+    int64 自然日序数数组，全部合约某日是否上市为一次向量化比较。同一数据文件在进程内只载入一次，由 get_instance
+    返回共用的对象。
+
+    :param instruments: iterable of dict/Instrument 合约
+    """
+    __instances__ = dict()          # 文件路径 -> InstrumentRegistry
+    __instances_lock__ = threading.Lock()
+
+    def __init__(self, instruments=()):
+        self.__records__ = list()
+        self.__ids__ = dict()               # order_book_id -> 序号
+        self.__by_underlying__ = dict()     # underlying_symbol -> list of Instrument
+        for item in instruments:
+            instrument = Instrument(item.to_dict() if isinstance(item, Instrument) else item, len(self.__records__))
+            if instrument.order_book_id in self.__ids__:
+                continue
+            self.__ids__[instrument.order_book_id] = instrument.id
+            self.__records__.append(instrument)
+            if instrument.underlying_symbol is not None:
+                self.__by_underlying__.setdefault(instrument.underlying_symbol, list()).append(instrument)
+        self.__listed__ = np.fromiter(
+            (instrument.listed_ordinal for instrument in self.__records__), dtype=np.int64, count=len(self))
+        self.__de_listed__ = np.fromiter(
+            (instrument.de_listed_ordinal for instrument in self.__records__), dtype=np.int64, count=len(self))
+
+    @classmethod
+    def get_instance(cls, path: str=os.path.join('data', 'instruments.pk')):
+        """
+        按数据文件（pickle 的 list of dict）返回进程内共用的注册表 -> InstrumentRegistry
+
+        文件不存在时记录警告并返回空注册表，需先通过 write 生成数据文件
+        """
+        from Interface import ROOT_PATH
+        path = os.path.join(ROOT_PATH, path)
+        with cls.__instances_lock__:
+            registry = cls.__instances__.get(path, None)
+            if registry is None:
+                if os.path.exists(path) is True:
+                    with open(path, 'rb') as file:
+                        registry = cls(pickle.load(file))
+                else:
+                    from utils.Logger import get_logger
+                    get_logger(cls.__name__, 'logInstrument').warning(
+                        'instrument file {} not found, using an empty registry'.format(path))
+                    registry = cls()
+                cls.__instances__[path] = registry
+            return registry
+
+    def write(self, path: str=os.path.join('data', 'instruments.pk')):
+        """保存全部合约（pickle 的 list of dict），并作为该文件在进程内共用的注册表"""
+        from Interface import ROOT_PATH
+        path = os.path.join(ROOT_PATH, path)
+        if os.path.exists(os.path.dirname(path)) is False:
+            os.makedirs(os.path.dirname(path))
+        with open(path + '.tmp', 'wb') as file:
+            pickle.dump([instrument.to_dict() for instrument in self.__records__], file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        with self.__instances_lock__:
+            os.replace(path + '.tmp', path)
+            self.__instances__[path] = self
+
+    def __len__(self):
+        return len(self.__records__)
+
+    def __contains__(self, order_book_id: str):
+        return order_book_id in self.__ids__
+
+    def __iter__(self):
+        return iter(self.__records__)
+
+    def __getitem__(self, key):
+        """int 序号 / str order_book_id -> Instrument"""
+        if isinstance(key, str):
+            return self.__records__[self.__ids__[key]]
+        return self.__records__[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+
+    def id_of(self, order_book_id: str):
+        """order_book_id -> int 序号，不存在时为 -1"""
+        return self.__ids__.get(order_book_id, -1)
+
+    def ids_of(self, order_book_ids):
+        """-> numpy.ndarray of int64 序号，不存在的合约为 -1"""
+        return np.fromiter((self.__ids__.get(order_book_id, -1) for order_book_id in order_book_ids), dtype=np.int64)
+
+    def by_underlying(self, underlying_symbol: str):
+        """-> list of Instrument 同一标的的合约"""
+        return list(self.__by_underlying__.get(underlying_symbol, ()))
+
+    def listed_mask(self, date, ids=None):
+        """
+        合约在 date 当日是否在上市期间
+
+        :param ids: numpy.ndarray of int 合约序号（见 ids_of），None 为全部合约；-1 视为未上市
+        :return: numpy.ndarray of bool
+        """
+        ordinal = date.toordinal()
+        if ids is None:
+            return (self.__listed__ <= ordinal) & (ordinal <= self.__de_listed__)
+        ids = np.asarray(ids, dtype=np.int64)
+        known = ids >= 0
+        result = np.zeros(len(ids), dtype=bool)
+        result[known] = (self.__listed__[ids[known]] <= ordinal) & (ordinal <= self.__de_listed__[ids[known]])
+        return result
+
+    def listed_on(self, date):
+        """-> list of Instrument date 当日在上市期间的合约"""
+        return [self.__records__[i] for i in np.flatnonzero(self.listed_mask(date))]
+
+    def __repr__(self):
+        return '{}({} instruments)'.format(self.__class__.__name__, len(self))
+
+
 class SectorCodeItem(object):
     def __init__(self, cn: str, en: str, name: str):
         self.__cn = cn
@@ -1,43 +1,151 @@
 # -*- coding: utf-8 -*-
 import os
+import pickle
+import shutil
+import struct
+import threading
 
-from collections import Mapping, Iterable
+from collections import Mapping, Iterable, deque
+from queue import Queue
 
 from Interface import ROOT_PATH
 from utils import id_generator
-from utils.Persisit import Plist
+
+
+DEFAULT_HISTORY_DEPTH = 1000                    # 每个合约在内存中保留的行情条数
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024         # 落盘分段文件大小上限，单位字节
+
+
+class MarketHistorySpill(object):
+    """
+    行情历史落盘
+
+    滚出环形缓冲区的行情由后台线程追加写入分段文件，每条记录为 4 字节长度 + pickle 数据，
+    文件按合约分目录，超过 segment_size 后切换到下一个分段。
+    """
+    __length__ = struct.Struct('<I')
+
+    def __init__(self, data_path: str, segment_size: int=DEFAULT_SEGMENT_SIZE):
+        from utils.Logger import get_logger
+        self.__logger__ = get_logger(self.__class__.__name__, 'logMarketDict')
+        self.__path__ = data_path
+        self.__segment_size__ = segment_size
+        self.__files__ = dict()         # key -> (segment number, file object)
+        self.__queue__ = Queue()
+        self.__thread__ = threading.Thread(target=self.__run__, name='{} writer'.format(self.__class__.__name__))
+        self.__thread__.daemon = True
+
+        # 清空上次运行遗留的数据
+        if os.path.exists(data_path) is True:
+            shutil.rmtree(data_path)
+        os.makedirs(data_path)
+        self.__thread__.start()
+
+    def __key_path__(self, key: str):
+        return os.path.join(self.__path__, key)
+
+    def __segment_path__(self, key: str, segment: int):
+        return os.path.join(self.__key_path__(key), '{:08d}.seg'.format(segment))
+
+    def __file_of__(self, key: str):
+        segment, f = self.__files__.get(key, (None, None))
+        if f is None:
+            if os.path.exists(self.__key_path__(key)) is False:
+                os.makedirs(self.__key_path__(key))
+            segment = 0
+            f = open(self.__segment_path__(key, segment), 'ab')
+        elif f.tell() >= self.__segment_size__:
+            f.close()
+            segment += 1
+            f = open(self.__segment_path__(key, segment), 'ab')
+        self.__files__[key] = (segment, f)
+        return f
+
+    def __run__(self):
+        while True:
+            item = self.__queue__.get(block=True)
+            try:
+                if item is None:
+                    break
+                key, value = item
+                data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                f = self.__file_of__(key)
+                f.write(self.__length__.pack(len(data)))
+                f.write(data)
+                if self.__queue__.empty():
+                    for segment, f in self.__files__.values():
+                        f.flush()
+            except Exception as e:
+                self.__logger__.exception(e)
+            finally:
+                self.__queue__.task_done()
+        for segment, f in self.__files__.values():
+            f.close()
+        self.__files__.clear()
+
+    def put(self, key: str, value):
+        self.__queue__.put((key, value))
+
+    def flush(self):
+        """等待队列中的数据全部写入文件"""
+        self.__queue__.join()
+
+    def read(self, key: str):
+        """按写入顺序读出已落盘的行情 -> generator"""
+        self.flush()
+        key_path = self.__key_path__(key)
+        if os.path.exists(key_path) is False:
+            return
+        for name in sorted(os.listdir(key_path)):
+            with open(os.path.join(key_path, name), 'rb') as f:
+                while True:
+                    head = f.read(self.__length__.size)
+                    if len(head) < self.__length__.size:
+                        break
+                    yield pickle.loads(f.read(self.__length__.unpack(head)[0]))
+
+    def close(self):
+        if self.__thread__.is_alive():
+            self.__queue__.put(None)
+            self.__thread__.join()
 
 
 class MarketDict(Mapping, Iterable):
+    """
+    行情字典，保存每个合约的最新行情
+
+    每个合约最近 history_depth 条行情保存在内存环形缓冲区中，snapshot 直接从内存读取；
+    spill 为 True 时，滚出缓冲区的行情由后台线程追加写入 data_path 下的分段文件。
+    """
     id_gen = id_generator(1)
 
-    def __init__(self, data_path: str=os.path.join(ROOT_PATH, 'data', 'temp_market')):
+    def __init__(self, data_path: str=os.path.join(ROOT_PATH, 'data', 'temp_market'),
+                 history_depth: int=DEFAULT_HISTORY_DEPTH, spill: bool=False,
+                 segment_size: int=DEFAULT_SEGMENT_SIZE):
         from utils.Logger import get_logger
         self.__logger__ = get_logger(self.__class__.__name__, 'logMarketDict')
         self.__path__ = data_path
 
-        # check path
-        if os.path.exists(data_path) is False:
-            os.makedirs(data_path)
-        else:
-            os.removedirs(data_path)
-            os.makedirs(data_path)
-        self.__path__ = data_path
+        if history_depth < 1:
+            from utils.Exceptions import ParamOutOfRangeError
+            raise ParamOutOfRangeError('history_depth', 'positive int', history_depth)
+        self.__depth__ = history_depth
 
         # private
         self.__data__ = dict()
         self.__hist_dict__ = dict()
-
-    def __pjoin__(self, name: str):
-        return os.path.join(self.__path__, name)
+        self.__lock__ = threading.Lock()
+        self.__spill__ = MarketHistorySpill(data_path, segment_size) if spill is True else None
 
     def __setitem__(self, key: str, value):
-        if self.__data__.__contains__(key):
-            if self.__hist_dict__.__contains__(key) is False:
-                self.__hist_dict__[key] = Plist(self.__pjoin__(key), keep_history=False)
-            self.__hist_dict__[key].append(self.__data__[key])
-            self.__data__[key] = value
-        else:
+        with self.__lock__:
+            hist = self.__hist_dict__.get(key, None)
+            if hist is None:
+                hist = deque(maxlen=self.__depth__)
+                self.__hist_dict__[key] = hist
+            elif len(hist) == self.__depth__ and self.__spill__ is not None:
+                self.__spill__.put(key, hist[0])
+            hist.append(value)
             self.__data__[key] = value
 
     def __getitem__(self, key: str):
@@ -47,7 +155,11 @@ class MarketDict(Mapping, Iterable):
         return len(self.__data__)
 
     def __iter__(self):
-        return self.__data__.keys()
+        return iter(self.__data__)
+
+    @property
+    def history_depth(self):
+        return self.__depth__
 
     def keys(self):
         return self.__data__.keys()
@@ -58,5 +170,32 @@ class MarketDict(Mapping, Iterable):
     def items(self):
         return self.__data__.items()
 
-    def snapshot(self, key: str):
-        raise NotImplementedError
+    def snapshot(self, key: str, count: int=None):
+        """
+        最近的行情，由旧到新排列，最后一条为当前行情，不读取磁盘
+
+        :param key: str 合约代码
+        :param count: int 返回的条数，默认为内存中保留的全部
+        :return: list
+        """
+        with self.__lock__:
+            hist = self.__hist_dict__.get(key, None)
+            if hist is None:
+                raise KeyError(key)
+            if count is None or count >= len(hist):
+                return list(hist)
+            return [hist[i] for i in range(len(hist) - count, len(hist))]
+
+    def history(self, key: str):
+        """
+        全部行情历史，由旧到新排列，包含已落盘的部分 -> generator
+        """
+        if self.__spill__ is not None:
+            for value in self.__spill__.read(key):
+                yield value
+        for value in self.snapshot(key):
+            yield value
+
+    def close(self):
+        if self.__spill__ is not None:
+            self.__spill__.close()
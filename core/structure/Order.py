@@ -58,7 +58,7 @@ class OrderObject(object, Persistable, Recordable):
                 'quantity': self._quantity,
                 'side': self._enum_to_str(self._side),
                 'position_effect': self._enum_to_str(self._offset) if self._offset is not None else None,
-                'message': self._message,
+                'message': self.message,
                 'filled_quantity': self._filled_quantity,
                 'status': self._enum_to_str(self._status),
                 'frozen_price': self._frozen_price,
@@ -162,6 +162,9 @@ class OrderObject(object, Persistable, Recordable):
         """
         [str] 信息。比如拒单时候此处会提示拒单原因
         """
+        if not isinstance(self._message, str):
+            # 拒单/撤单原因可能是延迟格式化的 LazyString，在第一次读取时才生成字符串
+            self._message = str(self._message)
         return self._message
 
     @property
@@ -217,7 +220,6 @@ class OrderObject(object, Persistable, Recordable):
         return self._status not in {
             OrderStatus.PENDING_NEW,
             OrderStatus.ACTIVE,
-            OrderStatus.PENDING_CANCEL
         }
 
     def is_active(self):
@@ -244,13 +246,13 @@ class OrderObject(object, Persistable, Recordable):
         if self.unfilled_quantity == 0:
             self._status = OrderStatus.FILLED
 
-    def mark_rejected(self, reject_reason: str):
+    def mark_rejected(self, reject_reason):
         if not self.is_final():
             self._message = reject_reason
             self._status = OrderStatus.REJECTED
             self.__logger__.debug(reject_reason)
 
-    def mark_cancelled(self, cancelled_reason: str):
+    def mark_cancelled(self, cancelled_reason):
         if not self.is_final():
             self._message = cancelled_reason
             self._status = OrderStatus.CANCELLED
@@ -260,6 +262,25 @@ class OrderObject(object, Persistable, Recordable):
         assert isinstance(value, (type(None), float))
         self._frozen_price = value
 
+    def record_state(self):
+        """订单当前状态的扁平字典，用于记录"""
+        return {
+            'order_id': self._order_id,
+            'order_book_id': self._order_book_id,
+            'datetime': self._calendar_dt,
+            'trading_datetime': self._trading_dt,
+            'side': self._side.name,
+            'position_effect': None if self._offset is None else self._offset.name,
+            'type': self._type.name,
+            'status': self._status.name,
+            'quantity': self._quantity,
+            'filled_quantity': self._filled_quantity,
+            'frozen_price': self._frozen_price,
+            'avg_price': self._avg_price,
+            'transaction_cost': self._transaction_cost,
+            'message': self.message,
+        }
+
     def __simple_object__(self):
         from utils import __properties_dict__
         return __properties_dict__(self)
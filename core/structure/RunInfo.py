@@ -12,6 +12,9 @@ class RunInfo(object):
 
         self.__market_info_type__ = None
         self.__market_info_seperation__ = None      # 单位毫秒
+        self.__bar_frequency__ = None               # k线周期，如 1m/1d
+        self.__matching_type__ = None
+        self.__aggregate_intervals__ = None         # tick 行情合成k线的周期，如 ['1m', '5m']
 
     def subscribe(self, symbol: str):
         self.universe.add(symbol)
@@ -29,3 +32,24 @@ class RunInfo(object):
     @property
     def market_info_seperation(self):
         return self.__market_info_seperation__
+
+    def set_bar_frequency(self, frequency: str):
+        self.__bar_frequency__ = frequency
+
+    @property
+    def bar_frequency(self):
+        return self.__bar_frequency__
+
+    def set_matching_type(self, matching_type: MatchingType):
+        self.__matching_type__ = matching_type
+
+    @property
+    def matching_type(self):
+        return self.__matching_type__
+
+    def set_aggregate_intervals(self, intervals: list):
+        self.__aggregate_intervals__ = list(intervals)
+
+    @property
+    def aggregate_intervals(self):
+        return self.__aggregate_intervals__
@@ -160,3 +160,7 @@ class TickObject(object, Persistable, Recordable):
 
     def __getitem__(self, key: str):
         return getattr(self, key)
+
+    def record_state(self):
+        """行情原始字段字典，用于记录"""
+        return dict(self._tick)
@@ -87,6 +87,24 @@ class TradeObject(object):
     def close_today_amount(self):
         return self._close_today_amount
 
+    def record_state(self):
+        """成交的扁平字典，用于记录"""
+        return {
+            'exec_id': self._trade_id,
+            'order_id': self._order_id,
+            'order_book_id': self._order_book_id,
+            'datetime': self._match_dt,
+            'trading_datetime': self._trading_dt,
+            'side': self._side.name,
+            'position_effect': None if self._offset is None else self._offset.name,
+            'price': self._price,
+            'quantity': self._amount,
+            'commission': self._commission,
+            'tax': self._tax,
+            'close_today_amount': self._close_today_amount,
+            'frozen_price': self._frozen_price,
+        }
+
     def __simple_object__(self):
         from utils import __properties_dict__
         return __properties_dict__(self)
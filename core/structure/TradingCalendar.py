@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import threading
+
+import numpy as np
+
+from core.structure.DayFlags import date_to_int
+
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def date_to_ordinal(date):
+    """int(%Y%m%d)/date/datetime/pandas.Timestamp -> 自然日序数 (date.toordinal)"""
+    if isinstance(date, (int, np.integer)):
+        date = int(date)
+        return datetime.date(date // 10000, date // 100 % 100, date % 100).toordinal()
+    return datetime.date(date.year, date.month, date.day).toordinal()
+
+
+class TradingCalendar(object):
+    """
+    交易日历
+
+    交易日保存为升序的 int32 数组（%Y%m%d），另有一张覆盖首个到最后一个交易日的稠密表：自然日序数 -> 不晚于该日的最后
+    一个交易日的序号，前一/后一/前后 N 个交易日的查询为一次查表，区间查询为两次查表加切片。
+    日历只读，同一数据文件在进程内只载入一次，由 get_instance 返回共用的对象。
+
+    :param dates: iterable of int/date 交易日，无需排序
+    """
+    __instances__ = dict()          # 文件路径 -> TradingCalendar
+    __instances_lock__ = threading.Lock()
+
+    def __init__(self, dates):
+        self.__dates__ = np.unique(np.fromiter((date_to_int(date) for date in dates), dtype=np.int32))
+        ordinals = np.fromiter((date_to_ordinal(date) for date in self.__dates__), dtype=np.int64,
+                               count=len(self.__dates__))
+        self.__datetimes__ = (ordinals - EPOCH_ORDINAL).astype('datetime64[D]')
+        if len(ordinals) > 0:
+            self.__first__ = int(ordinals[0])
+            self.__floor__ = (ordinals.searchsorted(
+                np.arange(self.__first__, int(ordinals[-1]) + 1), side='right') - 1).astype(np.int32)
+        else:
+            self.__first__ = 0
+            self.__floor__ = np.empty(0, dtype=np.int32)
+
+    @classmethod
+    def get_instance(cls, path: str=os.path.join('data', 'calendar', 'trading_dates.npy')):
+        """
+        按数据文件返回进程内共用的交易日历 -> TradingCalendar
+
+        文件不存在时记录警告并返回空日历，此时所有日期都不是交易日，需先通过 write 生成数据文件
+        """
+        from Interface import ROOT_PATH
+        path = os.path.join(ROOT_PATH, path)
+        with cls.__instances_lock__:
+            calendar = cls.__instances__.get(path, None)
+            if calendar is None:
+                if os.path.exists(path) is True:
+                    calendar = cls(np.load(path))
+                else:
+                    from utils.Logger import get_logger
+                    get_logger(cls.__name__, 'logTradingCalendar').warning(
+                        'trading calendar file {} not found, using an empty calendar'.format(path))
+                    calendar = cls(list())
+                cls.__instances__[path] = calendar
+            return calendar
+
+    def write(self, path: str=os.path.join('data', 'calendar', 'trading_dates.npy')):
+        """保存交易日，并作为该文件在进程内共用的日历"""
+        from Interface import ROOT_PATH
+        path = os.path.join(ROOT_PATH, path)
+        if os.path.exists(os.path.dirname(path)) is False:
+            os.makedirs(os.path.dirname(path))
+        np.save(path + '.tmp.npy', self.__dates__)
+        with self.__instances_lock__:
+            os.replace(path + '.tmp.npy', path)
+            self.__instances__[path] = self
+
+    @property
+    def dates(self):
+        """
+        [numpy.ndarray] 全部交易日，int32 %Y%m%d
+        """
+        return self.__dates__
+
+    @property
+    def datetimes(self):
+        """
+        [numpy.ndarray] 全部交易日，datetime64[D]
+        """
+        return self.__datetimes__
+
+    def __len__(self):
+        return len(self.__dates__)
+
+    def floor_index(self, date):
+        """不晚于 date 的最后一个交易日的序号，早于首个交易日时为 -1 -> int"""
+        offset = date_to_ordinal(date) - self.__first__
+        if offset < 0 or len(self.__dates__) == 0:
+            return -1
+        if offset >= len(self.__floor__):
+            return len(self.__dates__) - 1
+        return int(self.__floor__[offset])
+
+    def index(self, date):
+        """交易日的序号，非交易日为 -1 -> int"""
+        pos = self.floor_index(date)
+        if pos >= 0 and self.__dates__[pos] == date_to_int(date):
+            return pos
+        return -1
+
+    def is_trading_date(self, date):
+        return self.index(date) >= 0
+
+    def __date_at__(self, pos: int):
+        if 0 <= pos < len(self.__dates__):
+            return int(self.__dates__[pos])
+        return None
+
+    def previous(self, date, n: int=1):
+        """date 之前（不含）的第 n 个交易日，超出日历范围为 None -> int"""
+        pos = self.floor_index(date)
+        if pos >= 0 and self.__dates__[pos] != date_to_int(date):
+            # date 不是交易日，pos 即为前一个交易日
+            pos += 1
+        return self.__date_at__(pos - n)
+
+    def next(self, date, n: int=1):
+        """date 之后（不含）的第 n 个交易日，超出日历范围为 None -> int"""
+        return self.__date_at__(self.floor_index(date) + n)
+
+    def offset(self, date, n: int):
+        """n 为正时同 next，为负时同 previous，为 0 时为不晚于 date 的最后一个交易日 -> int"""
+        if n > 0:
+            return self.next(date, n)
+        if n < 0:
+            return self.previous(date, -n)
+        return self.__date_at__(self.floor_index(date))
+
+    def range_slice(self, start_date, end_date):
+        """[start_date, end_date] 内的交易日在 dates 中的切片 -> slice"""
+        start = self.floor_index(start_date)
+        if start < 0 or self.__dates__[start] != date_to_int(start_date):
+            start += 1
+        end = self.floor_index(end_date) + 1
+        return slice(start, max(start, end))
+
+    def range(self, start_date, end_date):
+        """[start_date, end_date] 内的交易日 -> numpy.ndarray int32，为 dates 的视图"""
+        return self.__dates__[self.range_slice(start_date, end_date)]
+
+    def until_slice(self, date, n: int):
+        """截止到 date（含）的最近 n 个交易日在 dates 中的切片 -> slice"""
+        end = self.floor_index(date) + 1
+        return slice(max(end - n, 0), end)
+
+    def __repr__(self):
+        if len(self.__dates__) == 0:
+            return '{}(empty)'.format(self.__class__.__name__)
+        return '{}({} ~ {}, {} days)'.format(
+            self.__class__.__name__, self.__dates__[0], self.__dates__[-1], len(self.__dates__))
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import os
 
+import numpy as np
 import pandas as pd
 
 from collections import Iterable, Mapping
@@ -108,9 +109,33 @@ class UniverseUnit(Mapping, Iterable):
         abs_path = os.path.join(self.__path__, key)
         return pd.read_csv(abs_path, encoding='utf-8')
 
+    def read_chunks(self, key: str, chunk_size: int, dtype: dict=None):
+        """按块读入文件，每块为一个 DataFrame，内存中只保留当前块 -> generator"""
+        abs_path = os.path.join(self.__path__, key)
+        for frame in pd.read_csv(abs_path, encoding='utf-8', chunksize=chunk_size, dtype=dtype):
+            yield frame
+
     def keys(self):
         return self.__list_file__()
 
+    def bars(self, frequency: str='1m'):
+        """
+        整个文件一次载入的k线数据，文件名为 bar_{frequency}，datetime 列为 %Y%m%d%H%M%S 格式的整数，
+        缺少的字段填充为 nan -> numpy structured array (BAR_DTYPE)，按 datetime 升序排列
+        """
+        from core.structure.Bar import BAR_DTYPE
+        frame = self.__getitem__('bar_{}'.format(frequency))
+        bars = np.empty(len(frame), dtype=BAR_DTYPE)
+        for name in BAR_DTYPE.names:
+            if name in frame.columns:
+                bars[name] = frame[name].values
+            elif name == 'datetime':
+                from utils.Exceptions import ParamOutOfRangeError
+                raise ParamOutOfRangeError('bar columns', 'containing datetime', list(frame.columns))
+            else:
+                bars[name] = np.nan
+        return bars[np.argsort(bars['datetime'], kind='mergesort')]
+
     def values(self):
         for key in self.keys():
             yield self.__getitem__(key)
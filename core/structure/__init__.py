@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 from .Bar import BarObject
-from .Instrument import Instrument
+from .CorporateActions import CorporateActionIndex
+from .DayFlags import DayFlags
+from .Instrument import Instrument, InstrumentRegistry
 from .MarketDict import MarketDict
 from .Order import OrderObject, LimitOrder, MarketOrder
 from .RunInfo import RunInfo
 from .Tick import TickObject
 from .Trade import TradeObject
+from .TradingCalendar import TradingCalendar
 from .Universe import Universe, UniverseUnit
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import threading
+
+import numpy as np
+
+from Interface import AbstractDataSource, ROOT_PATH
+from core.structure.Bar import BAR_DTYPE, datetime_to_int, int_to_datetime
+
+
+def _order_book_id_of(instrument):
+    return getattr(instrument, 'order_book_id', instrument)
+
+
+class ColumnarBarSource(AbstractDataSource):
+    """
+    列式k线数据源
+
+    每个合约每个周期的k线保存为一个 numpy 结构化数组文件 {path}/{frequency}/{order_book_id}.npy（BAR_DTYPE，
+    按 datetime 升序），读取时以 mmap 方式打开，只有被访问的页会载入内存。datetime 列即时间索引，
+    history_bars 为一次 searchsorted 加切片，返回的是映射数组的视图，get_bar 返回数组中的一行。
+    """
+    def __init__(self, path: str=os.path.join('data', 'bars')):
+        from utils.Logger import get_logger
+        self.__logger__ = get_logger(self.__class__.__name__, 'logBarSource')
+        self.__path__ = os.path.join(ROOT_PATH, path)
+        self.__arrays__ = dict()        # (order_book_id, frequency) -> numpy.memmap
+        self.__trading__ = dict()       # order_book_id -> 日线中成交量大于 0 的行号
+        self.__lock__ = threading.Lock()
+
+    def __file_path__(self, order_book_id: str, frequency: str):
+        return os.path.join(self.__path__, frequency, '{}.npy'.format(order_book_id))
+
+    def bars(self, order_book_id: str, frequency: str):
+        """合约全部k线 -> numpy.ndarray (只读 mmap)，没有数据时返回空数组"""
+        key = (order_book_id, frequency)
+        array = self.__arrays__.get(key, None)
+        if array is None:
+            with self.__lock__:
+                array = self.__arrays__.get(key, None)
+                if array is None:
+                    file_path = self.__file_path__(order_book_id, frequency)
+                    if os.path.exists(file_path) is True:
+                        array = np.load(file_path, mmap_mode='r')
+                    else:
+                        array = np.empty(0, dtype=BAR_DTYPE)
+                    self.__arrays__[key] = array
+        return array
+
+    def trading_positions(self, order_book_id: str):
+        """日线中成交量大于 0（未停牌）的行号，每个数组只计算一次 -> numpy.ndarray int64 升序"""
+        positions = self.__trading__.get(order_book_id, None)
+        if positions is None:
+            positions = np.flatnonzero(self.bars(order_book_id, '1d')['volume'] > 0)
+            self.__trading__[order_book_id] = positions
+        return positions
+
+    def write(self, order_book_id: str, frequency: str, bars: np.ndarray):
+        """
+        保存合约k线，覆盖已有数据
+
+        :param bars: numpy structured array 包含 datetime 字段，缺少的 BAR_DTYPE 字段填充为 nan
+        """
+        array = np.empty(len(bars), dtype=BAR_DTYPE)
+        for name in BAR_DTYPE.names:
+            if name in bars.dtype.names:
+                array[name] = bars[name]
+            elif name == 'datetime':
+                from utils.Exceptions import ParamOutOfRangeError
+                raise ParamOutOfRangeError('bars fields', 'containing datetime', bars.dtype.names)
+            else:
+                array[name] = np.nan
+        array = array[np.argsort(array['datetime'], kind='mergesort')]
+
+        file_path = self.__file_path__(order_book_id, frequency)
+        if os.path.exists(os.path.dirname(file_path)) is False:
+            os.makedirs(os.path.dirname(file_path))
+        temp_path = file_path + '.tmp.npy'
+        np.save(temp_path, array)
+        with self.__lock__:
+            # 替换文件前释放旧的映射
+            self.__arrays__.pop((order_book_id, frequency), None)
+            if frequency == '1d':
+                self.__trading__.pop(order_book_id, None)
+            os.replace(temp_path, file_path)
+
+    def import_universe(self, universe, frequency: str='1m', symbols=None):
+        """
+        从 Universe 的 bar_{frequency} 文件导入k线
+
+        :param universe: Universe
+        :param symbols: iterable of str 导入的合约，默认为全部
+        """
+        for symbol in (universe.keys() if symbols is None else symbols):
+            unit = universe[symbol]
+            if 'bar_{}'.format(frequency) in unit:
+                self.write(symbol, frequency, unit.bars(frequency))
+
+    # -- AbstractDataSource
+    def get_bar(self, instrument, dt, frequency):
+        """
+        :return: numpy.void 日线行，分钟线时为 (日线行, 分钟线行)，没有数据时为 None
+        """
+        order_book_id = _order_book_id_of(instrument)
+        day_bar = self.__bar_at__(order_book_id, '1d', (dt.year * 10000 + dt.month * 100 + dt.day) * 1000000)
+        if frequency == '1d':
+            return day_bar
+        minute_bar = self.__bar_at__(order_book_id, frequency, datetime_to_int(dt))
+        if minute_bar is None:
+            return None, None
+        return day_bar, minute_bar
+
+    def __bar_at__(self, order_book_id: str, frequency: str, dt_int: int):
+        bars = self.bars(order_book_id, frequency)
+        pos = int(bars['datetime'].searchsorted(dt_int))
+        if pos < len(bars) and bars['datetime'][pos] == dt_int:
+            return bars[pos]
+        return None
+
+    def get_settle_price(self, instrument, date):
+        bar = self.__bar_at__(
+            _order_book_id_of(instrument), '1d', (date.year * 10000 + date.month * 100 + date.day) * 1000000)
+        return np.nan if bar is None else bar['settlement']
+
+    def history_bars(self, instrument, bar_count, frequency, fields, dt, skip_suspended=True,
+                     include_now=False, adjust_type='pre', adjust_orig=None):
+        """
+        截止到 dt 的最近 bar_count 根k线
+
+        日线的 datetime 为当日 0 点，dt 为日内时间且 include_now 为 False 时不包含当日日线；
+        保存的数据即为回放使用的价格，不做复权处理，adjust_type/adjust_orig 仅为兼容接口保留。
+        skip_suspended 为 True 时日线跳过成交量为 0 的k线，在预先计算的未停牌行号上切片，结果中间有停牌时返回副本，
+        其余情况返回映射数组的视图。
+
+        :param fields: str/list of str/None 字段，None 为全部字段
+        :return: numpy.ndarray
+        """
+        order_book_id = _order_book_id_of(instrument)
+        bars = self.bars(order_book_id, frequency)
+        index = bars['datetime']
+        if frequency == '1d':
+            day_key = (dt.year * 10000 + dt.month * 100 + dt.day) * 1000000
+            intraday = isinstance(dt, datetime.datetime) and dt.time() != datetime.time(0)
+            end = int(index.searchsorted(day_key, side='left' if intraday and not include_now else 'right'))
+        else:
+            end = int(index.searchsorted(datetime_to_int(dt), side='right'))
+
+        if skip_suspended is True and frequency == '1d':
+            trading = self.trading_positions(order_book_id)
+            stop = int(trading.searchsorted(end))
+            positions = trading[max(stop - bar_count, 0):stop]
+            if len(positions) == 0 or positions[-1] - positions[0] == len(positions) - 1:
+                # 区间内没有停牌，连续的行直接切片
+                start = int(positions[0]) if len(positions) > 0 else end
+                result = bars[start:start + len(positions)]
+            else:
+                result = bars[positions]
+        else:
+            result = bars[max(end - bar_count, 0):end]
+        if fields is None:
+            return result
+        return result[fields]
+
+    def available_data_range(self, frequency):
+        """
+        :return: (datetime.date, datetime.date) 已保存数据的最早和最晚日期
+        """
+        frequency_path = os.path.join(self.__path__, frequency)
+        earliest, latest = None, None
+        if os.path.exists(frequency_path) is True:
+            for name in os.listdir(frequency_path):
+                if not name.endswith('.npy') or name.endswith('.tmp.npy'):
+                    continue
+                index = self.bars(name[:-len('.npy')], frequency)['datetime']
+                if len(index) == 0:
+                    continue
+                earliest = index[0] if earliest is None else min(earliest, index[0])
+                latest = index[-1] if latest is None else max(latest, index[-1])
+        if earliest is None:
+            return None, None
+        return int_to_datetime(earliest).date(), int_to_datetime(latest).date()
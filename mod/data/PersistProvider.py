@@ -1,20 +1,23 @@
 # -*- coding: utf-8 -*-
 import datetime
 import hashlib
-import pickle
 import os
+import threading
 
 from collections import OrderedDict
+from queue import Queue
 
 from Interface import AbstractStoreProvider, ROOT_PATH
+from utils.Codec import codec_from_config
 from utils.Constants import PersistMode, EVENT
 
 
 class BaseStoreProvider(AbstractStoreProvider):
-    def __init__(self, path: str=os.path.join('data', 'persist')):
+    def __init__(self, path: str=os.path.join('data', 'persist'), codec: str=None, compress: bool=None):
         from utils.Logger import get_logger
         self.__logger__ = get_logger(self.__class__.__name__, 'logStoreProvider')
         self.__path__ = os.path.join(ROOT_PATH, path)
+        self.__codec__ = codec_from_config(codec, compress)     # 保存对象时使用的序列化方案
         if os.path.exists(self.__path__) is False:
             os.makedirs(self.__path__)
 
@@ -42,81 +45,288 @@ class TextStoreProvider(BaseStoreProvider):
 
 
 class BytesStoreProvider(BaseStoreProvider):
-    def __init__(self, path: str=os.path.join('data', 'bytes_persist')):
-        super(BytesStoreProvider, self).__init__(path)
+    """
+    每个 key 保存为一个文件，写入经 BatchWriter 缓存，
+    累计 batch_size 条或超过 flush_interval 毫秒后批量写入，fsync 为 none/batch/every-write
+    """
+    def __init__(self, path: str=os.path.join('data', 'bytes_persist'), batch_size: int=1, flush_interval: int=0,
+                 fsync: str='none', codec: str=None, compress: bool=None):
+        from utils.Persisit import BatchWriter, FileBackend
+        super(BytesStoreProvider, self).__init__(path, codec, compress)
+        self.__writer__ = BatchWriter(FileBackend(self.__path__, True), batch_size, flush_interval, fsync)
 
     def store(self, key: str, value: bytes):
         # assert isinstance(value, bytes), "value must be bytes"
-        with open(os.path.join(self.__path__, key), "wb") as f:
-            f.write(value)
+        self.__writer__.write(key, value)
 
     def load(self, key: str, large_file=False):
         try:
-            with open(os.path.join(self.__path__, key), "rb") as f:
-                return f.read()
+            return self.__writer__.read(key)
         except IOError:
             return None
 
+    def remove(self, key: str):
+        try:
+            self.__writer__.remove(key)
+        except FileNotFoundError:
+            pass
+
+    def flush(self):
+        self.__writer__.flush()
 
-class ObjectStoreProvider(BaseStoreProvider):
-    def __init__(self, path: str=os.path.join('data', 'object_persist')):
-        super(ObjectStoreProvider, self).__init__(path)
+    def close(self):
+        self.__writer__.close()
+
+
+class ObjectStoreProvider(BytesStoreProvider):
+    """对象经 codec（pickle/binary）序列化后保存，codec 为 None 时使用 Config.yaml 中 Persist 设置"""
+    def __init__(self, path: str=os.path.join('data', 'object_persist'), batch_size: int=1, flush_interval: int=0,
+                 fsync: str='none', codec: str=None, compress: bool=None):
+        super(ObjectStoreProvider, self).__init__(path, batch_size, flush_interval, fsync, codec, compress)
 
     def store(self, key: str, value):
-        pickle.dump(value, open(os.path.join(self.__path__, key), 'wb'))
+        super(ObjectStoreProvider, self).store(key, self.__codec__.dumps(value))
 
     def load(self, key: str):
-        try:
-            return pickle.load(open(os.path.join(self.__path__, key)), 'rb')
-        except IOError:
+        data = super(ObjectStoreProvider, self).load(key)
+        if data is None:
             return None
+        return self.__codec__.loads(data)
 
 
 class ShelveStoreProvider(BaseStoreProvider):
     def __init__(self, path: str='data', file_name: str=datetime.datetime.now().strftime('%Y%m%d %H%M%S'),
-                 new: bool=False):
+                 new: bool=False, codec: str=None, compress: bool=None):
         from utils.ShelveWrapper import ShelveWrapper
-        super(ShelveStoreProvider, self).__init__(path)
+        super(ShelveStoreProvider, self).__init__(path, codec, compress)
         if new is True:
             self.db = ShelveWrapper.init_from(dict(), os.path.join(self.__path__, file_name))
         else:
             self.db = ShelveWrapper(os.path.join(self.__path__, file_name))
 
     def store(self, key: str, value):
-        self.db[key] = value
+        self.db[key] = self.__codec__.dumps(value)
 
     def load(self, key: str):
-        return self.db.get(key, None)
+        data = self.db.get(key, None)
+        if data is None:
+            return None
+        return self.__codec__.loads(data)
+
+
+class SqliteStoreProvider(BaseStoreProvider):
+    """
+    sqlite3 存储，状态按 key 保存，订单和成交按 (session, symbol, time) 建索引追加保存，可按合约和时间范围查询
+    """
+    __time_format__ = '%Y-%m-%d %H:%M:%S.%f'
+
+    def __init__(self, path: str='data', file_name: str='persist.sqlite', session: str=None, batch_size: int=100,
+                 codec: str=None, compress: bool=None):
+        from utils.SqliteWrapper import SqliteStore
+        super(SqliteStoreProvider, self).__init__(path, codec, compress)
+        if session is None:
+            session = datetime.datetime.now().strftime('%Y%m%d %H%M%S')
+        self.db = SqliteStore(os.path.join(self.__path__, file_name), session, batch_size)
+
+    def store(self, key: str, value):
+        self.db.put(key, self.__codec__.dumps(value))
+
+    def load(self, key: str):
+        data = self.db.get(key)
+        if data is None:
+            return None
+        return self.__codec__.loads(data)
+
+    def remove(self, key: str):
+        self.db.delete(key)
+
+    def __time_str__(self, dt):
+        return '' if dt is None else dt.strftime(self.__time_format__)
+
+    def record_order(self, order):
+        state = order.record_state()
+        self.db.record(
+            'order', state['order_book_id'], self.__time_str__(state['datetime']),
+            self.__codec__.dumps(state), state['order_id'],
+        )
+
+    def record_trade(self, trade):
+        self.db.record(
+            'trade', trade.order_book_id, self.__time_str__(trade.datetime),
+            self.__codec__.dumps(trade), trade.exec_id,
+        )
+
+    def __query__(self, kind: str, order_book_id: str, start, end):
+        rows = self.db.query(
+            kind, order_book_id,
+            None if start is None else self.__time_str__(start), None if end is None else self.__time_str__(end),
+        )
+        return [self.__codec__.loads(value) for symbol, time, ref_id, value in rows]
+
+    def query_orders(self, order_book_id: str=None, start: datetime.datetime=None, end: datetime.datetime=None):
+        """按时间顺序返回订单记录，即 OrderObject.record_state 的结果 -> list of dict"""
+        return self.__query__('order', order_book_id, start, end)
+
+    def query_trades(self, order_book_id: str=None, start: datetime.datetime=None, end: datetime.datetime=None):
+        """按时间顺序返回成交 -> list of TradeObject"""
+        return self.__query__('trade', order_book_id, start, end)
+
+    def flush(self):
+        self.db.flush()
+
+    def close(self):
+        self.db.close()
 
 
 class CoreObjectsPersistProxy(object):
-    def __init__(self, scheduler):
+    """codec 为 None 时使用 jsonpickle，否则使用 utils.Codec 中对应的序列化方案"""
+    def __init__(self, scheduler, codec: str=None, compress: bool=False):
+        from utils.Logger import get_logger
+        self.__logger__ = get_logger(self.__class__.__name__, 'logStoreProvider')
         self._objects = {'scheduler': scheduler}
+        self._codec = None if codec is None else codec_from_config(codec, compress)
 
     def get_state(self):
-        import jsonpickle
         result = dict()
         for key, obj in self._objects.items():
             state = obj.get_state()
             if state is not None:
                 result[key] = state
 
+        if self._codec is not None:
+            return self._codec.dumps(result)
+        import jsonpickle
         return jsonpickle.dumps(result).encode('utf-8')
 
     def set_state(self, state: bytes):
-        import jsonpickle
-        for key, value in jsonpickle.loads(state.decode('utf-8')).items():
+        if self._codec is not None:
+            value = self._codec.loads(state)
+        else:
+            import jsonpickle
+            value = jsonpickle.loads(state.decode('utf-8'))
+        for key, value in value.items():
             try:
                 self._objects[key].set_state(value)
             except KeyError:
-                system_log.warn('core object state for {} ignored'.format(key))
+                self.__logger__.warning('core object state for {} ignored'.format(key))
+
+
+class PersistWorker(object):
+    """
+    后台持久化线程
+
+    总线线程只提交状态快照，序列化、MD5 比较和写入存储都在后台线程中完成。
+    队列有界，队列满时提交方阻塞；同一 key 只保留最新提交的快照并按最新一次提交的顺序写入，
+    先前排队的同 key 快照直接丢弃，因此每个 key 至多有一次写入在进行中。
+    background 为 False 时不启动线程，submit 直接在调用线程中写入。
+    """
+    DEFAULT_QUEUE_SIZE = 64
+
+    def __init__(self, persist_provider, queue_size: int=DEFAULT_QUEUE_SIZE, background: bool=True):
+        from utils.Logger import get_logger
+        self.__logger__ = get_logger(self.__class__.__name__, 'logStoreProvider')
+        self.__provider__ = persist_provider
+        self.__queue__ = Queue(maxsize=queue_size)
+        self.__pending__ = dict()       # key -> (token, snapshot, encoder, on_fail, on_done)
+        self.__token__ = 0
+        self.__last_state__ = dict()    # key -> md5
+        self.__lock__ = threading.Lock()
+        if background is True:
+            self.__thread__ = threading.Thread(target=self.__run__, name=self.__class__.__name__)
+            self.__thread__.daemon = True
+            self.__thread__.start()
+        else:
+            self.__thread__ = None
+
+    def submit(self, key: str, snapshot, encoder=None, on_fail=None, on_done=None):
+        """
+        :param key: str 持久化 key
+        :param snapshot: 状态快照，encoder 为 None 时应为 bytes
+        :param encoder: callable snapshot -> bytes，在后台线程中调用
+        :param on_fail: callable 写入失败后的回调，在后台线程中调用
+        :param on_done: callable 写入成功后的回调，在后台线程中调用
+        """
+        if self.__thread__ is None:
+            self.__execute__(key, snapshot, encoder, on_fail, on_done)
+            return
+        with self.__lock__:
+            self.__token__ += 1
+            token = self.__token__
+            self.__pending__[key] = (token, snapshot, encoder, on_fail, on_done)
+        self.__queue__.put((key, token))
+
+    def __run__(self):
+        while True:
+            item = self.__queue__.get(block=True)
+            try:
+                if item is None:
+                    break
+                key, token = item
+                with self.__lock__:
+                    if self.__pending__[key][0] != token:
+                        # 已有更新的快照排在后面
+                        continue
+                    token, snapshot, encoder, on_fail, on_done = self.__pending__.pop(key)
+                self.__execute__(key, snapshot, encoder, on_fail, on_done)
+            finally:
+                self.__queue__.task_done()
+
+    def __execute__(self, key: str, snapshot, encoder, on_fail, on_done):
+        try:
+            self.__persist__(key, snapshot, encoder)
+        except Exception as e:
+            self.__logger__.exception('persist {} fail: {}'.format(key, e))
+            if on_fail is not None:
+                on_fail()
+        else:
+            if on_done is not None:
+                on_done()
+
+    def __persist__(self, key: str, snapshot, encoder):
+        state = snapshot if encoder is None else encoder(snapshot)
+        if not state:
+            return
+        md5 = hashlib.md5(state).hexdigest()
+        if self.__last_state__.get(key) == md5:
+            return
+        self.__provider__.store(key, state)
+        self.__last_state__[key] = md5
+
+    def flush(self):
+        """等待已提交的快照全部写入"""
+        self.__queue__.join()
+
+    def close(self):
+        if self.__thread__ is not None and self.__thread__.is_alive():
+            self.__queue__.put(None)
+            self.__thread__.join()
 
 
 class PersistHelper(object):
-    def __init__(self, persist_provider, event_bus, persist_mode):
+    """
+    持久化调度
+
+    对象提供 version 属性时，版本号未变化则跳过快照；
+    对象提供 snapshot_state / encode_state 时，总线线程只调用 snapshot_state 取得独立的状态副本，
+    序列化由 encode_state 在后台线程完成，否则在总线线程调用 get_state。
+
+    对象还提供 get_delta_state / apply_delta_state / clear_delta 时采用增量持久化：
+    完整快照保存在 key 下，之后每次只追加变化部分到 {key}.delta.{序号}，{key}.delta 中记录快照对应的序号；
+    每 compact_every 个增量重新保存一次完整快照并删除旧增量。restore 时先恢复快照，再按序号重放增量。
+    """
+    DEFAULT_COMPACT_EVERY = 100
+
+    def __init__(self, persist_provider, event_bus, persist_mode, background: bool=True,
+                 queue_size: int=PersistWorker.DEFAULT_QUEUE_SIZE, compact_every: int=DEFAULT_COMPACT_EVERY):
+        from utils.Logger import get_logger
+        self.__logger__ = get_logger(self.__class__.__name__, 'logStoreProvider')
         self._objects = OrderedDict()
-        self._last_state = {}
+        self._last_version = {}
+        self._delta_seq = {}        # key -> [快照序号, 最新增量序号, 下次是否保存完整快照]
+        self._pruned_seq = {}       # key -> 已删除的增量序号上限
+        self._compact_every = compact_every
         self._persist_provider = persist_provider
+        self._worker = PersistWorker(persist_provider, queue_size, background)
         if persist_mode == PersistMode.REAL_TIME:
             event_bus.add_listener(EVENT.POST_BEFORE_TRADING, self.persist)
             event_bus.add_listener(EVENT.POST_AFTER_TRADING, self.persist)
@@ -124,20 +334,88 @@ class PersistHelper(object):
             event_bus.add_listener(EVENT.DO_PERSIST, self.persist)
             event_bus.add_listener(EVENT.POST_SETTLEMENT, self.persist)
 
+    @staticmethod
+    def _meta_key(key: str):
+        return '{}.delta'.format(key)
+
+    @staticmethod
+    def _delta_key(key: str, seq: int):
+        return '{}.delta.{:08d}'.format(key, seq)
+
     def persist(self, *args):
         for key, obj in self._objects.items():
             try:
-                state = obj.get_state()
-                if not state:
+                version = getattr(obj, 'version', None)
+                if version is not None and self._last_version.get(key) == version:
                     continue
-                md5 = hashlib.md5(state).hexdigest()
-                if self._last_state.get(key) == md5:
+                self._last_version[key] = version
+                if hasattr(obj, 'get_delta_state'):
+                    self.__persist_delta__(key, obj)
                     continue
-                self._persist_provider.store(key, state)
+                if hasattr(obj, 'snapshot_state'):
+                    snapshot, encoder = obj.snapshot_state(), obj.encode_state
+                else:
+                    snapshot, encoder = obj.get_state(), None
+                self._worker.submit(key, snapshot, encoder, on_fail=self.__forget_version__(key))
             except Exception as e:
-                system_log.exception("PersistHelper.persist fail")
-            else:
-                self._last_state[key] = md5
+                self._last_version.pop(key, None)
+                self.__logger__.exception('PersistHelper.persist fail: {}'.format(e))
+
+    def __persist_delta__(self, key: str, obj):
+        seq_info = self._delta_seq.setdefault(key, [0, 0, True])
+        base, seq, full = seq_info
+        if full is True or seq - base >= self._compact_every:
+            snapshot = obj.snapshot_state()
+            obj.clear_delta()
+            seq_info[:] = [seq, seq, False]
+            self._worker.submit(
+                key, snapshot, obj.encode_state,
+                on_fail=self.__force_full__(key), on_done=self.__commit_snapshot__(key, seq),
+            )
+        else:
+            seq_info[1] = seq + 1
+            self._worker.submit(
+                self._delta_key(key, seq + 1), obj.get_delta_state(), obj.encode_state,
+                on_fail=self.__force_full__(key),
+            )
+
+    def __forget_version__(self, key: str):
+        def on_fail():
+            self._last_version.pop(key, None)
+        return on_fail
+
+    def __force_full__(self, key: str):
+        # 增量写入失败后，已清除的变化记录无法找回，下次持久化时保存完整快照
+        def on_fail():
+            self._last_version.pop(key, None)
+            self._delta_seq[key][2] = True
+        return on_fail
+
+    def __commit_snapshot__(self, key: str, seq: int):
+        # 快照写入成功后才在后台线程中更新 {key}.delta 并删除旧增量；快照写入失败时旧快照和增量仍是完整的
+        force_full = self.__force_full__(key)
+
+        def on_done():
+            try:
+                self._persist_provider.store(self._meta_key(key), str(seq).encode('utf-8'))
+            except Exception as e:
+                self.__logger__.exception('persist {} fail: {}'.format(self._meta_key(key), e))
+                force_full()
+                return
+            remove = getattr(self._persist_provider, 'remove', None)
+            if remove is None:
+                return
+            for i in range(self._pruned_seq.get(key, 0) + 1, seq + 1):
+                remove(self._delta_key(key, i))
+            self._pruned_seq[key] = seq
+        return on_done
+
+    def flush(self):
+        """等待后台线程写完已提交的快照"""
+        self._worker.flush()
+
+    def close(self):
+        self._worker.close()
 
     def register(self, key, obj):
         if key in self._objects:
@@ -145,12 +423,33 @@ class PersistHelper(object):
         self._objects[key] = obj
 
     def restore(self):
+        self.flush()
         for key, obj in self._objects.items():
             state = self._persist_provider.load(key)
-            system_log.debug('restore {} with state = {}', key, state)
-            if not state:
+            self.__logger__.debug('restore {} with state = {}'.format(key, state))
+            if state:
+                obj.set_state(state)
+                self._last_version.pop(key, None)
+            if not hasattr(obj, 'apply_delta_state'):
                 continue
-            obj.set_state(state)
+            meta = self._persist_provider.load(self._meta_key(key))
+            base = int(meta.decode('utf-8')) if meta else 0
+            seq = base
+            while True:
+                delta = self._persist_provider.load(self._delta_key(key, seq + 1))
+                if not delta:
+                    break
+                if state:
+                    obj.apply_delta_state(delta)
+                seq += 1
+            if state:
+                self.__logger__.debug('restore {} replayed {} deltas'.format(key, seq - base))
+            else:
+                # 没有快照时残留的增量无法重放，新的增量从其后编号，保存快照后一并删除
+                self.__logger__.debug('restore {} skipped {} stale deltas'.format(key, seq - base))
+            # 恢复后的第一次持久化保存完整快照
+            self._delta_seq[key] = [base, seq, True]
+            self._pruned_seq[key] = base
 
 
 if __name__ == '__main__':
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import threading
+import time
+
+from collections import deque
+
+import numpy as np
+
+from Interface import ROOT_PATH
+from utils.Constants import EVENT
+
+
+class RecordSegmentWriter(object):
+    """
+    列式分段文件
+
+    同一类记录按列缓存，每次写出为一个 numpy .npz 文件，路径为 {path}/{session}/{交易日}/{kind}-{序号}.npz，
+    数值列保存为 float64，时间列保存为 datetime64[us]，其余保存为字符串。交易日变化时先写出前一日的缓存。
+    """
+    def __init__(self, path: str, kind: str):
+        self.__path__ = path
+        self.__kind__ = kind
+        self.__day__ = None
+        self.__columns__ = dict()       # 列名 -> list
+        self.__size__ = 0
+        self.__seq__ = dict()           # 交易日 -> 已写出的分段数
+
+    def __len__(self):
+        return self.__size__
+
+    def append(self, day: str, record: dict):
+        if day != self.__day__:
+            self.flush()
+            self.__day__ = day
+        columns = self.__columns__
+        for key in record:
+            if key not in columns:
+                columns[key] = [None] * self.__size__
+        for key, column in columns.items():
+            column.append(record.get(key, None))
+        self.__size__ += 1
+
+    @staticmethod
+    def __to_array__(values: list):
+        sample = next((v for v in values if v is not None), None)
+        if isinstance(sample, datetime.datetime):
+            return np.array(['NaT' if v is None else v for v in values], dtype='datetime64[us]')
+        elif isinstance(sample, (int, float)) and not isinstance(sample, bool):
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        return np.array(['' if v is None else str(v) for v in values])
+
+    def flush(self):
+        if self.__size__ == 0:
+            return
+        day_path = os.path.join(self.__path__, self.__day__)
+        if os.path.exists(day_path) is False:
+            os.makedirs(day_path)
+        seq = self.__seq__.get(self.__day__, 0)
+        while True:
+            file_path = os.path.join(day_path, '{}-{:06d}.npz'.format(self.__kind__, seq))
+            if os.path.exists(file_path) is False:
+                break
+            seq += 1
+        np.savez(file_path, **{key: self.__to_array__(values) for key, values in self.__columns__.items()})
+        self.__seq__[self.__day__] = seq + 1
+        self.__columns__ = dict()
+        self.__size__ = 0
+
+
+class SessionRecorder(object):
+    """
+    运行记录
+
+    订阅 MARKET_SEND、ORDER、TRADE 事件，事件线程只把记录放入 deque（append/popleft 线程安全，无需加锁），
+    后台线程每 flush_interval 毫秒取出记录，按类型列式缓存，累计 batch_size 条后写出为分段文件；
+    收到 DO_RECORD 事件时立即写出全部缓存。文件按运行会话和交易日分目录保存，可用 load 读出做分析或回放。
+    """
+    KINDS = ('tick', 'order', 'trade')
+
+    def __init__(self, event_bus, path: str=os.path.join('data', 'record'), session: str=None,
+                 batch_size: int=4096, flush_interval: int=200):
+        from utils.Logger import get_logger
+        self.__logger__ = get_logger(self.__class__.__name__, 'logRecorder')
+        if session is None:
+            session = datetime.datetime.now().strftime('%Y%m%d %H%M%S')
+        self.__path__ = os.path.join(ROOT_PATH, path, session)
+        self.__batch_size__ = max(int(batch_size), 1)
+        self.__flush_interval__ = flush_interval / 1000
+        self.__records__ = deque()
+        self.__flush_request__ = False
+        self.__writers__ = {kind: RecordSegmentWriter(self.__path__, kind) for kind in self.KINDS}
+
+        self.__active__ = True
+        self.__thread__ = threading.Thread(target=self.__run__, name=self.__class__.__name__)
+        self.__thread__.daemon = True
+        self.__thread__.start()
+
+        event_bus.add_listener(EVENT.MARKET_SEND, self._on_market)
+        event_bus.add_listener(EVENT.ORDER, self._on_order)
+        event_bus.add_listener(EVENT.TRADE, self._on_trade)
+        event_bus.add_listener(EVENT.DO_RECORD, self._on_do_record)
+
+    @property
+    def path(self):
+        return self.__path__
+
+    # -- 事件线程
+    def _on_market(self, event):
+        market = getattr(event, 'market', None)
+        if market is not None:
+            # 行情对象不会再被修改，转换留给后台线程
+            self.__records__.append(('tick', getattr(event, 'broker_id', None), market))
+
+    def _on_order(self, event):
+        order = getattr(event, 'order', None)
+        if order is not None:
+            # 订单状态会继续变化，在事件线程中取快照
+            self.__records__.append(('order', None, order.record_state()))
+
+    def _on_trade(self, event):
+        trade = getattr(event, 'trade', None)
+        if trade is not None:
+            self.__records__.append(('trade', None, trade))
+
+    def _on_do_record(self, event):
+        self.__flush_request__ = True
+
+    # -- 后台线程
+    @staticmethod
+    def __trading_day__(kind: str, record: dict):
+        if kind == 'tick':
+            return str(record.get('date', 'unknown'))
+        dt = record.get('trading_datetime', None) or record.get('datetime', None)
+        return 'unknown' if dt is None else dt.strftime('%Y%m%d')
+
+    def __drain__(self):
+        records = self.__records__
+        while True:
+            try:
+                kind, broker_id, item = records.popleft()
+            except IndexError:
+                break
+            record = item if isinstance(item, dict) else item.record_state()
+            if kind == 'tick':
+                record['broker_id'] = broker_id
+            writer = self.__writers__[kind]
+            writer.append(self.__trading_day__(kind, record), record)
+            if len(writer) >= self.__batch_size__:
+                writer.flush()
+
+    def __run__(self):
+        while self.__active__ is True:
+            time.sleep(self.__flush_interval__)
+            try:
+                self.__drain__()
+                if self.__flush_request__ is True:
+                    self.__flush_request__ = False
+                    for writer in self.__writers__.values():
+                        writer.flush()
+            except Exception as e:
+                self.__logger__.exception('record failed: {}'.format(e))
+        self.__drain__()
+        for writer in self.__writers__.values():
+            writer.flush()
+
+    def flush(self):
+        """请求后台线程写出全部缓存"""
+        self.__flush_request__ = True
+
+    def close(self):
+        self.__active__ = False
+        self.__thread__.join()
+
+    @staticmethod
+    def __blank__(array: np.ndarray):
+        """全部为空值的字符串列，即写出时整列为 None"""
+        return array.dtype.kind == 'U' and not array.astype(bool).any()
+
+    @staticmethod
+    def __concatenate__(arrays: list, sizes: list):
+        """
+        拼接各分段的同一列，分段中缺少的列和整列为空的分段按列的类型补空值：
+        时间列为 NaT，数值列为 nan，其余为空字符串；同一列在不同分段中类型不一致时转为字符串
+        """
+        known = [array for array in arrays if array is not None and not SessionRecorder.__blank__(array)]
+        kinds = {array.dtype.kind for array in known}
+        if kinds == {'M'}:
+            dtype, empty = np.dtype('datetime64[us]'), 'NaT'
+        elif kinds == {'f'}:
+            dtype, empty = np.dtype(np.float64), np.nan
+        else:
+            dtype, empty = np.dtype(str), ''
+        parts = list()
+        for array, size in zip(arrays, sizes):
+            if array is None or SessionRecorder.__blank__(array):
+                parts.append(np.full(size, empty, dtype=dtype))
+            else:
+                parts.append(array.astype(dtype, copy=False))
+        return np.concatenate(parts)
+
+    @staticmethod
+    def load(session_path: str, kind: str, day: str=None):
+        """
+        读出一个会话中某类记录的全部列，按写入顺序拼接，只在部分分段中出现的列在其余分段中补空值
+
+        :param session_path: str 会话目录，即 SessionRecorder.path
+        :param kind: str tick/order/trade
+        :param day: str 交易日 %Y%m%d，默认为全部交易日
+        :return: dict 列名 -> numpy.ndarray
+        """
+        days = [day] if day is not None else sorted(os.listdir(session_path))
+        segments, sizes, keys = list(), list(), dict()
+        for this_day in days:
+            day_path = os.path.join(session_path, this_day)
+            if os.path.isdir(day_path) is False:
+                continue
+            for name in sorted(os.listdir(day_path)):
+                if not (name.startswith(kind + '-') and name.endswith('.npz')):
+                    continue
+                with np.load(os.path.join(day_path, name)) as segment:
+                    columns = {key: segment[key] for key in segment.files}
+                segments.append(columns)
+                sizes.append(max((len(array) for array in columns.values()), default=0))
+                keys.update(dict.fromkeys(columns))
+        return {
+            key: SessionRecorder.__concatenate__([columns.get(key, None) for columns in segments], sizes)
+            for key in keys
+        }
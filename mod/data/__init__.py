@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
+from .BarSource import ColumnarBarSource
 from .PersistProvider import BytesStoreProvider
 from .PersistProvider import ObjectStoreProvider
 from .PersistProvider import ShelveStoreProvider
+from .PersistProvider import SqliteStoreProvider
 from .PersistProvider import TextStoreProvider
+from .Recorder import SessionRecorder
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from Interface import AbstractCommission, AbstractTax, AbstractMatcher
 from core.structure import *
+from utils import lazy_format
 from utils.Constants import OrderType, OrderSide, MatchingType
 
 
@@ -50,13 +51,14 @@ class BaseMatcher(AbstractMatcher):
                 if listed_date == self._trading_dt.date():
                     msg = "Order Cancelled: current security [{order_book_id}] " \
                           "can not be traded in listed date [{listed_date}]"
-                    reason = msg.format(
+                    reason = lazy_format(
+                        msg,
                         order_book_id=order.order_book_id,
                         listed_date=listed_date,
                     )
                 else:
-                    reason = "Order Cancelled: current bar [{order_book_id}] miss market data.".format(
-                        order_book_id=order.order_book_id)
+                    reason = lazy_format("Order Cancelled: current bar [{order_book_id}] miss market data.",
+                                         order_book_id=order.order_book_id)
                 order.mark_rejected(reason)
                 continue
 
@@ -80,24 +82,26 @@ class BaseMatcher(AbstractMatcher):
             else:
                 if self.__updown_price_limit__:
                     if order.side == OrderSide.BUY and deal_price >= price_board.get_limit_up(order_book_id):
-                        reason = "Order Cancelled: current bar [{order_book_id}] reach the limit_up price.".format(
+                        reason = lazy_format(
+                            "Order Cancelled: current bar [{order_book_id}] reach the limit_up price.",
                             order_book_id=order.order_book_id)
                         order.mark_rejected(reason)
                         continue
                     if order.side == OrderSide.SELL and deal_price <= price_board.get_limit_down(order_book_id):
-                        reason = "Order Cancelled: current bar [{order_book_id}] reach the limit_down price.".format(
+                        reason = lazy_format(
+                            "Order Cancelled: current bar [{order_book_id}] reach the limit_down price.",
                             order_book_id=order.order_book_id)
                         order.mark_rejected(reason)
                         continue
                 if self.__liquidity_limit__:
                     if order.side == OrderSide.BUY and price_board.get_a1(order_book_id) == 0:
-                        reason = "Order Cancelled: [{order_book_id}] has no liquidity.".format(
-                            order_book_id=order.order_book_id)
+                        reason = lazy_format("Order Cancelled: [{order_book_id}] has no liquidity.",
+                                             order_book_id=order.order_book_id)
                         order.mark_rejected(reason)
                         continue
                     if order.side == OrderSide.SELL and price_board.get_b1(order_book_id) == 0:
-                        reason = "Order Cancelled: [{order_book_id}] has no liquidity.".format(
-                            order_book_id=order.order_book_id)
+                        reason = lazy_format("Order Cancelled: [{order_book_id}] has no liquidity.",
+                                             order_book_id=order.order_book_id)
                         order.mark_rejected(reason)
                         continue
 
@@ -109,7 +113,8 @@ class BaseMatcher(AbstractMatcher):
                 if volume_limit <= 0:
                     if order.type == OrderType.MARKET:
                         msg = "Order Cancelled: market order {order_book_id} volume {order_volume} due to volume limit"
-                        reason = msg.format(
+                        reason = lazy_format(
+                            msg,
                             order_book_id=order.order_book_id,
                             order_volume=order.quantity
                         )
@@ -143,7 +148,8 @@ class BaseMatcher(AbstractMatcher):
             if order.type == OrderType.MARKET and order.unfilled_quantity != 0:
                 msg = "Order Cancelled: market order {order_book_id} volume {order_volume} is larger than " \
                       "{volume_percent_limit} percent of current bar volume, fill {filled_volume} actually"
-                reason = msg.format(
+                reason = lazy_format(
+                    msg,
                     order_book_id=order.order_book_id,
                     order_volume=order.quantity,
                     filled_volume=order.filled_quantity,
@@ -1 +1,275 @@
-# -*- coding: utf-8 -*-
\ No newline at end of file
+# -*- coding: utf-8 -*-
+"""
+Redis 行情分发
+
+每个运行会话使用独立的频道前缀，外部客户端订阅以下频道：
+    {prefix}:{session}:market:{broker_id}   broker 发出的行情，数据为 BinaryCodec 编码的 TickObject，
+                                            k线行情为 BarObject.record_state 的字典
+    {prefix}:{session}:trade                成交回报，数据为 BinaryCodec 编码的 TradeObject
+"""
+import threading
+
+from collections import defaultdict, deque
+
+from utils.Constants import EVENT
+
+
+class LocalRedis(object):
+    """
+    进程内 Redis 替身，只实现发布订阅相关的 publish/pipeline/pubsub，用于没有 redis-server 的环境
+    """
+    def __init__(self):
+        self.__channels__ = defaultdict(set)
+        self.__lock__ = threading.Lock()
+
+    def publish(self, channel, message):
+        if isinstance(channel, str):
+            channel = channel.encode('utf-8')
+        with self.__lock__:
+            subscribers = tuple(self.__channels__.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.__deliver__(channel, message)
+        return len(subscribers)
+
+    def pipeline(self, transaction: bool=False):
+        return LocalPipeline(self)
+
+    def pubsub(self, **kwargs):
+        return LocalPubSub(self)
+
+    def __subscribe__(self, channel: bytes, subscriber):
+        with self.__lock__:
+            self.__channels__[channel].add(subscriber)
+
+    def __unsubscribe__(self, channel: bytes, subscriber):
+        with self.__lock__:
+            self.__channels__[channel].discard(subscriber)
+
+
+class LocalPipeline(object):
+    def __init__(self, client: LocalRedis):
+        self.__client__ = client
+        self.__commands__ = list()
+
+    def __len__(self):
+        return len(self.__commands__)
+
+    def publish(self, channel, message):
+        self.__commands__.append((channel, message))
+        return self
+
+    def execute(self):
+        commands, self.__commands__ = self.__commands__, list()
+        return [self.__client__.publish(channel, message) for channel, message in commands]
+
+    def reset(self):
+        self.__commands__ = list()
+
+
+class LocalPubSub(object):
+    def __init__(self, client: LocalRedis):
+        self.__client__ = client
+        self.__channels__ = set()
+        self.__messages__ = deque()
+
+    def __deliver__(self, channel: bytes, message):
+        self.__messages__.append({'type': 'message', 'pattern': None, 'channel': channel, 'data': message})
+
+    def subscribe(self, *channels):
+        for channel in channels:
+            if isinstance(channel, str):
+                channel = channel.encode('utf-8')
+            self.__channels__.add(channel)
+            self.__client__.__subscribe__(channel, self)
+
+    def unsubscribe(self, *channels):
+        for channel in (channels or tuple(self.__channels__)):
+            if isinstance(channel, str):
+                channel = channel.encode('utf-8')
+            self.__channels__.discard(channel)
+            self.__client__.__unsubscribe__(channel, self)
+
+    def get_message(self, ignore_subscribe_messages: bool=False, timeout: float=0.0):
+        try:
+            return self.__messages__.popleft()
+        except IndexError:
+            return None
+
+    def close(self):
+        self.unsubscribe()
+
+
+class RedisMarketServer(object):
+    """
+    通过 Redis 发布订阅向外部客户端分发行情和成交回报
+
+    同一行情时间戳内的所有消息（各 broker 的行情及其撮合产生的成交）写入同一个 pipeline，
+    时间戳变化、消息数达到 batch_size、系统计时器事件或系统结束时一次性发送，减少网络往返。
+
+    :param event_bus: EventBus
+    :param session: str 会话名称，用于频道前缀，默认为当前时间
+    :param client: redis 客户端，默认按 Config.yaml 的 Redis 配置从共用连接池创建，可传入 LocalRedis
+    :param batch_size: int 单个 pipeline 的最大消息数
+    :param prefix: str 频道前缀
+    """
+    def __init__(self, event_bus, session: str=None, client=None, batch_size: int=1024,
+                 prefix: str='MockExchange'):
+        import datetime
+        from core.structure.Tick import TickObject
+        from utils.Codec import BinaryCodec
+        from utils.Logger import get_logger
+        from utils.RedisWrapper import RedisWrapper
+        self.__logger__ = get_logger(self.__class__.__name__, 'logRedisServer')
+        if batch_size < 1:
+            from utils.Exceptions import ParamOutOfRangeError
+            raise ParamOutOfRangeError('batch_size', 'positive int', batch_size)
+        if session is None:
+            session = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+        self.__channel_prefix__ = '{}:{}'.format(prefix, session)
+        self.__trade_channel__ = '{}:trade'.format(self.__channel_prefix__)
+        self.__market_channels__ = dict()       # broker_id -> channel
+        self.__redis__ = RedisWrapper(client=client)
+        self.__codec__ = BinaryCodec()
+        self.__tick_type__ = TickObject
+        self.__batch_size__ = batch_size
+
+        self.__lock__ = threading.Lock()
+        self.__pipeline__ = self.__redis__.pipeline()
+        self.__pending__ = 0
+        self.__timestamp__ = None
+        self.__published__ = 0
+        self.__last_market__, self.__last_data__ = None, None      # 多个 broker 发出同一行情时只编码一次
+
+        event_bus.add_listener(EVENT.MARKET_SEND, self._on_market)
+        event_bus.add_listener(EVENT.TRADE, self._on_trade)
+        event_bus.add_listener(EVENT.SYS_TIMER, self._on_flush)
+        event_bus.add_listener(EVENT.SYS_STOP, self._on_flush)
+
+    @property
+    def channel_prefix(self):
+        """
+        [str] 本会话的频道前缀
+        """
+        return self.__channel_prefix__
+
+    @property
+    def trade_channel(self):
+        """
+        [str] 成交回报频道
+        """
+        return self.__trade_channel__
+
+    @property
+    def published(self):
+        """
+        [int] 已发送的消息数
+        """
+        return self.__published__
+
+    def market_channel(self, broker_id):
+        """broker 行情频道 -> str"""
+        channel = self.__market_channels__.get(broker_id, None)
+        if channel is None:
+            channel = '{}:market:{}'.format(self.__channel_prefix__, broker_id)
+            self.__market_channels__[broker_id] = channel
+        return channel
+
+    def __execute__(self):
+        if self.__pending__ == 0:
+            return
+        count = self.__pending__
+        self.__pending__ = 0
+        try:
+            self.__pipeline__.execute()
+            self.__published__ += count
+        except Exception as e:
+            self.__logger__.exception('publish {} messages failed: {}'.format(count, e))
+            self.__pipeline__.reset()
+
+    def __publish__(self, channel: str, data: bytes):
+        self.__pipeline__.publish(channel, data)
+        self.__pending__ += 1
+        if self.__pending__ >= self.__batch_size__:
+            self.__execute__()
+
+    def _on_market(self, event):
+        market = getattr(event, 'market', None)
+        if market is None:
+            return
+        is_tick = type(market) is self.__tick_type__
+        if is_tick is True:
+            tick = market._tick
+            timestamp = (tick.get('date'), tick.get('time'))
+        else:
+            timestamp = market.datetime
+        with self.__lock__:
+            if market is self.__last_market__:
+                data = self.__last_data__
+            else:
+                data = self.__codec__.dumps(market if is_tick is True else market.record_state())
+                self.__last_market__, self.__last_data__ = market, data
+            if timestamp != self.__timestamp__:
+                self.__execute__()
+                self.__timestamp__ = timestamp
+            self.__publish__(self.market_channel(getattr(event, 'broker_id', None)), data)
+
+    def _on_trade(self, event):
+        trade = getattr(event, 'trade', None)
+        if trade is None:
+            return
+        data = self.__codec__.dumps(trade)
+        with self.__lock__:
+            self.__publish__(self.__trade_channel__, data)
+
+    def _on_flush(self, event):
+        self.flush()
+
+    def flush(self):
+        """立即发送缓存的消息"""
+        with self.__lock__:
+            self.__execute__()
+
+    def decode(self, data: bytes):
+        """解码频道消息 -> TickObject/TradeObject/dict k线"""
+        return self.__codec__.loads(data)
+
+
+if __name__ == '__main__':
+    # 分发吞吐量测试：python -m mod.server.Redis [host] [port]，不指定 host 时使用 LocalRedis
+    import sys
+    import time
+
+    from core.EventBus import EventObject
+    from core.structure.Tick import TickObject
+
+    class _Bus(object):
+        def __init__(self):
+            self.listeners = defaultdict(list)
+
+        def add_listener(self, event, listener):
+            self.listeners[event].append(listener)
+
+    if len(sys.argv) > 1:
+        from redis import StrictRedis
+        from utils.RedisWrapper import RedisWrapper
+        bench_client = StrictRedis(connection_pool=RedisWrapper.get_pool(
+            sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 6379))
+    else:
+        bench_client = LocalRedis()
+    bench_bus = _Bus()
+    bench_brokers, bench_steps = 8, 20000
+    for bench_batch in (1, 64, 1024):
+        bench_server = RedisMarketServer(bench_bus, session='bench', client=bench_client, batch_size=bench_batch)
+        bench_listener = bench_bus.listeners.pop(EVENT.MARKET_SEND)[0]
+        bench_bus.listeners.clear()
+        start = time.perf_counter()
+        for step in range(bench_steps):
+            bench_tick = TickObject({
+                'order_book_id': '000001.XSHE', 'date': '20180102', 'time': '{:06d}.000'.format(step),
+                'last': 10.0 + step * 0.01, 'volume': step * 100,
+            })
+            for broker_id in range(bench_brokers):
+                bench_listener(EventObject(EVENT.MARKET_SEND, broker_id=broker_id, market=bench_tick))
+        bench_server.flush()
+        elapsed = time.perf_counter() - start
+        print('batch_size {:>5d}: {:>10.0f} msg/s'.format(bench_batch, bench_server.published / elapsed))
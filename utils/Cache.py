@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+带统计的有界缓存
+
+每个缓存有容量上限（LRU 淘汰）和可选的过期时间，记录命中、未命中、淘汰、过期次数，
+所有缓存登记在 CACHES 中，可通过 cache_stats 查看，通过 clear_all 在会话结束时统一清空。
+"""
+import functools
+import threading
+import time
+
+from collections import OrderedDict
+
+
+CACHES = OrderedDict()          # name -> InstrumentedCache
+__caches_lock__ = threading.Lock()
+__missing__ = object()
+
+
+class InstrumentedCache(object):
+    """
+    :param name: str 缓存名称
+    :param maxsize: int 最大条数，超过时淘汰最久未使用的条目
+    :param ttl: float 条目有效期，单位秒，None 为不过期
+    """
+    def __init__(self, name: str, maxsize: int=1024, ttl: float=None):
+        if maxsize < 1:
+            from utils.Exceptions import ParamOutOfRangeError
+            raise ParamOutOfRangeError('maxsize', 'positive int', maxsize)
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__data__ = OrderedDict()       # key -> (value, 过期时间)
+        self.__lock__ = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.__data__)
+
+    def get(self, key, default=None):
+        with self.__lock__:
+            item = self.__data__.get(key, __missing__)
+            if item is __missing__:
+                self.misses += 1
+                return default
+            value, expire_at = item
+            if expire_at is not None and expire_at <= time.monotonic():
+                del self.__data__[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.__data__.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        expire_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.__lock__:
+            self.__data__[key] = (value, expire_at)
+            self.__data__.move_to_end(key)
+            while len(self.__data__) > self.maxsize:
+                self.__data__.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, reset_stats: bool=False):
+        with self.__lock__:
+            self.__data__.clear()
+            if reset_stats is True:
+                self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self):
+        """-> dict"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self.__data__), 'maxsize': self.maxsize, 'ttl': self.ttl,
+            'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'expirations': self.expirations,
+            'hit_rate': self.hits / total if total > 0 else 0.0,
+        }
+
+
+def register_cache(cache: InstrumentedCache):
+    """登记缓存，同名缓存（如 importlib.reload 后重新定义的函数）替换旧的登记"""
+    with __caches_lock__:
+        CACHES.pop(cache.name, None)
+        CACHES[cache.name] = cache
+    return cache
+
+
+def cached(maxsize: int=1024, ttl: float=None, key=None, name: str=None):
+    """
+    缓存装饰器
+
+    :param maxsize: int 最大条数
+    :param ttl: float 有效期，单位秒，None 为不过期
+    :param key: function 与被装饰函数参数相同，返回可哈希的缓存键，用于把 datetime、合约对象等参数归一为
+        整数日期、合约代码等轻量的键；默认为全部位置参数加关键字参数
+    :param name: str 缓存名称，默认为函数的 __qualname__
+    """
+    def decorator(func):
+        cache = register_cache(InstrumentedCache(
+            name or '{}.{}'.format(func.__module__, func.__qualname__), maxsize=maxsize, ttl=ttl))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if key is None:
+                cache_key = args if len(kwargs) == 0 else args + tuple(sorted(kwargs.items()))
+            else:
+                cache_key = key(*args, **kwargs)
+            value = cache.get(cache_key, __missing__)
+            if value is __missing__:
+                value = func(*args, **kwargs)
+                cache.put(cache_key, value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.stats
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+def date_key(dt):
+    """date/datetime -> %Y%m%d 整数"""
+    return dt.year * 10000 + dt.month * 100 + dt.day
+
+
+def cache_stats():
+    """全部缓存的统计 -> dict name -> dict"""
+    with __caches_lock__:
+        caches = list(CACHES.values())
+    return {cache.name: cache.stats() for cache in caches}
+
+
+def clear_all(reset_stats: bool=False):
+    """清空全部缓存，会话结束时调用"""
+    with __caches_lock__:
+        caches = list(CACHES.values())
+    for cache in caches:
+        cache.clear(reset_stats)
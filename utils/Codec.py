@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+持久化序列化方案
+
+pickle  通用序列化，兼容任意对象
+binary  基于 schema 的紧凑二进制编码，持仓、订单状态字典以及 TickObject/TradeObject 按固定字段打包，
+        字段名不写入数据，字符串写入字符串表只保存一次，枚举保存为序号；其余对象递归编码，无法编码的对象退回 pickle
+"""
+import datetime
+import pickle
+import struct
+import zlib
+
+from enum import Enum
+
+from utils.Constants import OffSet, OrderSide, OrderStatus, OrderType
+
+
+class PickleCodec(object):
+    name = 'pickle'
+
+    def __init__(self, compress: bool=False, level: int=6):
+        self.__compress__ = compress
+        self.__level__ = level
+
+    def dumps(self, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.__compress__ is True:
+            return zlib.compress(data, self.__level__)
+        return data
+
+    @staticmethod
+    def loads(data: bytes):
+        if data[:1] == b'\x78':
+            # zlib 数据头
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+
+class Schema(object):
+    """
+    固定字段结构
+
+    :param name: str schema 名称
+    :param schema_id: int 编码中使用的编号，0-255
+    :param fields: list of (字段名, 类型)，类型为
+        n 数值（int/float，8 字节）  s 字符串（字符串表序号）  e 枚举（enum_values 中的序号）  v 任意对象（变长编码）
+    :param enum_values: dict 字段名 -> 枚举可取的字符串列表
+    """
+    def __init__(self, name: str, schema_id: int, fields: list, enum_values: dict=None):
+        self.name = name
+        self.schema_id = schema_id
+        self.fields = tuple(fields)
+        self.keys = frozenset(name for name, kind in fields)
+        self.enum_values = dict() if enum_values is None else enum_values
+        self.enum_index = {key: {v: i for i, v in enumerate(values)} for key, values in self.enum_values.items()}
+        if len(fields) > 64:
+            raise ValueError('schema {} has more than 64 fields'.format(name))
+
+        fmt = ['<QQ']     # 空值掩码，整数掩码
+        for field_name, kind in fields:
+            if kind == 'n':
+                fmt.append('8s')
+            elif kind == 's':
+                fmt.append('I')
+            elif kind == 'e':
+                fmt.append('B')
+        self.struct = struct.Struct(''.join(fmt))
+
+
+def _enum_names(enum_class):
+    return [var.name for var in enum_class]
+
+
+SCHEMAS = [
+    Schema('stock_position', 1, [
+        ('order_book_id', 's'), ('quantity', 'n'), ('avg_price', 'n'), ('non_closable', 'n'), ('frozen', 'n'),
+        ('transaction_cost', 'n'),
+    ]),
+    Schema('future_position', 2, [
+        ('order_book_id', 's'),
+        ('buy_old_holding_list', 'v'), ('sell_old_holding_list', 'v'),
+        ('buy_today_holding_list', 'v'), ('sell_today_holding_list', 'v'),
+        ('buy_transaction_cost', 'n'), ('sell_transaction_cost', 'n'),
+        ('buy_realized_pnl', 'n'), ('sell_realized_pnl', 'n'),
+        ('buy_avg_open_price', 'n'), ('sell_avg_open_price', 'n'),
+        ('margin_rate', 'n'),
+    ]),
+    Schema('order', 3, [
+        ('order_id', 'n'), ('secondary_order_id', 'v'), ('calendar_dt', 'v'), ('trading_dt', 'v'),
+        ('order_book_id', 's'), ('quantity', 'n'), ('side', 'e'), ('position_effect', 'e'), ('message', 's'),
+        ('filled_quantity', 'n'), ('status', 'e'), ('frozen_price', 'n'), ('type', 'e'),
+        ('transaction_cost', 'n'), ('avg_price', 'n'),
+    ], enum_values={
+        'side': _enum_names(OrderSide), 'position_effect': _enum_names(OffSet),
+        'status': _enum_names(OrderStatus), 'type': _enum_names(OrderType),
+    }),
+    Schema('tick', 4, [('order_book_id', 's'), ('date', 's'), ('time', 's')] + [
+        (name, 'n') for name in (
+            'open', 'last', 'high', 'low', 'prev_close', 'volume', 'total_turnover', 'open_interest',
+            'prev_settlement', 'limit_up', 'limit_down',
+            'b1', 'b2', 'b3', 'b4', 'b5', 'b1_v', 'b2_v', 'b3_v', 'b4_v', 'b5_v',
+            'a1', 'a2', 'a3', 'a4', 'a5', 'a1_v', 'a2_v', 'a3_v', 'a4_v', 'a5_v',
+        )
+    ]),
+    Schema('trade', 5, [
+        ('_order_id', 'n'), ('_order_book_id', 's'), ('_match_dt', 'v'), ('_trading_dt', 'v'), ('_price', 'n'),
+        ('_amount', 'n'), ('_side', 'v'), ('_offset', 'v'), ('_commission', 'n'), ('_tax', 'n'),
+        ('_close_today_amount', 'n'), ('_frozen_price', 'n'), ('_trade_id', 'n'),
+    ]),
+]
+
+
+class BinaryCodec(object):
+    """
+    紧凑二进制编码
+
+    数据格式：魔数(1) 标志(1) [字符串表] [数据]，字符串表为 数量(4) + 每个字符串 长度(4) utf-8 数据。
+    compress 为 True 时字符串表和数据整体使用 zlib 压缩。
+    """
+    name = 'binary'
+    MAGIC = 0xB1
+    FLAG_COMPRESSED = 0x01
+
+    T_NONE, T_TRUE, T_FALSE, T_INT, T_FLOAT, T_STR, T_BYTES, T_LIST, T_TUPLE, T_DICT, T_SCHEMA, T_PICKLE, \
+        T_DATETIME, T_DATE, T_TICK, T_TRADE, T_ENUM = range(17)
+
+    __u8__ = struct.Struct('<B')
+    __u32__ = struct.Struct('<I')
+    __i64__ = struct.Struct('<q')
+    __f64__ = struct.Struct('<d')
+    __epoch__ = datetime.datetime(1970, 1, 1)
+
+    def __init__(self, compress: bool=False, level: int=6, schemas: list=None):
+        self.__compress__ = compress
+        self.__level__ = level
+        schemas = SCHEMAS if schemas is None else schemas
+        self.__schema_by_id__ = {schema.schema_id: schema for schema in schemas}
+        self.__schema_by_keys__ = {schema.keys: schema for schema in schemas}
+
+        from core.structure.Tick import TickObject
+        from core.structure.Trade import TradeObject
+        self.__tick_type__ = TickObject
+        self.__trade_type__ = TradeObject
+
+    # -- 编码
+    def dumps(self, value):
+        strings, string_index, body = list(), dict(), list()
+        self.__encode__(value, body, strings, string_index)
+        head = [self.__u32__.pack(len(strings))]
+        for s in strings:
+            data = s.encode('utf-8')
+            head.append(self.__u32__.pack(len(data)))
+            head.append(data)
+        payload = b''.join(head) + b''.join(body)
+        flags = 0
+        if self.__compress__ is True:
+            payload = zlib.compress(payload, self.__level__)
+            flags |= self.FLAG_COMPRESSED
+        return bytes((self.MAGIC, flags)) + payload
+
+    def __string__(self, s: str, strings: list, string_index: dict):
+        i = string_index.get(s, None)
+        if i is None:
+            i = len(strings)
+            strings.append(s)
+            string_index[s] = i
+        return i
+
+    def __encode__(self, value, out: list, strings: list, string_index: dict):
+        if value is None:
+            out.append(self.__u8__.pack(self.T_NONE))
+        elif value is True:
+            out.append(self.__u8__.pack(self.T_TRUE))
+        elif value is False:
+            out.append(self.__u8__.pack(self.T_FALSE))
+        elif type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            out.append(self.__u8__.pack(self.T_INT))
+            out.append(self.__i64__.pack(value))
+        elif type(value) is float:
+            out.append(self.__u8__.pack(self.T_FLOAT))
+            out.append(self.__f64__.pack(value))
+        elif type(value) is str:
+            out.append(self.__u8__.pack(self.T_STR))
+            out.append(self.__u32__.pack(self.__string__(value, strings, string_index)))
+        elif type(value) is bytes:
+            out.append(self.__u8__.pack(self.T_BYTES))
+            out.append(self.__u32__.pack(len(value)))
+            out.append(value)
+        elif type(value) in (list, tuple):
+            out.append(self.__u8__.pack(self.T_LIST if type(value) is list else self.T_TUPLE))
+            out.append(self.__u32__.pack(len(value)))
+            for item in value:
+                self.__encode__(item, out, strings, string_index)
+        elif type(value) is dict:
+            schema = self.__schema_by_keys__.get(frozenset(value.keys()), None)
+            if schema is None or not self.__encode_schema__(schema, value, out, strings, string_index):
+                self.__encode_dict__(value, out, strings, string_index)
+        elif type(value) is datetime.datetime and value.tzinfo is None:
+            out.append(self.__u8__.pack(self.T_DATETIME))
+            out.append(self.__i64__.pack((value - self.__epoch__) // datetime.timedelta(microseconds=1)))
+        elif type(value) is datetime.date:
+            out.append(self.__u8__.pack(self.T_DATE))
+            out.append(self.__u32__.pack(value.toordinal()))
+        elif isinstance(value, Enum) and type(value).__module__ == 'utils.Constants':
+            out.append(self.__u8__.pack(self.T_ENUM))
+            out.append(self.__u32__.pack(self.__string__(type(value).__name__, strings, string_index)))
+            out.append(self.__u32__.pack(self.__string__(value.name, strings, string_index)))
+        elif type(value) is self.__tick_type__:
+            out.append(self.__u8__.pack(self.T_TICK))
+            self.__encode__(value._tick, out, strings, string_index)
+        elif type(value) is self.__trade_type__:
+            out.append(self.__u8__.pack(self.T_TRADE))
+            self.__encode__(dict(vars(value)), out, strings, string_index)
+        else:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            out.append(self.__u8__.pack(self.T_PICKLE))
+            out.append(self.__u32__.pack(len(data)))
+            out.append(data)
+
+    def __encode_dict__(self, value: dict, out: list, strings: list, string_index: dict):
+        out.append(self.__u8__.pack(self.T_DICT))
+        out.append(self.__u32__.pack(len(value)))
+        for k, v in value.items():
+            self.__encode__(k, out, strings, string_index)
+            self.__encode__(v, out, strings, string_index)
+
+    def __encode_schema__(self, schema: Schema, value: dict, out: list, strings: list, string_index: dict):
+        """按 schema 打包，字段类型不符时返回 False"""
+        null_mask, int_mask, fixed, variable = 0, 0, list(), list()
+        for i, (name, kind) in enumerate(schema.fields):
+            v = value[name]
+            if kind == 'v':
+                self.__encode__(v, variable, strings, string_index)
+            elif v is None:
+                null_mask |= 1 << i
+                if kind == 'n':
+                    fixed.append(b'\x00' * 8)
+                elif kind in ('s', 'e'):
+                    fixed.append(0)
+            elif kind == 'n':
+                if type(v) is float:
+                    fixed.append(self.__f64__.pack(v))
+                elif type(v) is int and -2 ** 63 <= v < 2 ** 63:
+                    int_mask |= 1 << i
+                    fixed.append(self.__i64__.pack(v))
+                else:
+                    return False
+            elif kind == 's':
+                if type(v) is not str:
+                    return False
+                fixed.append(self.__string__(v, strings, string_index))
+            elif kind == 'e':
+                index = schema.enum_index[name].get(v, None)
+                if index is None:
+                    return False
+                fixed.append(index)
+        out.append(self.__u8__.pack(self.T_SCHEMA))
+        out.append(self.__u8__.pack(schema.schema_id))
+        out.append(schema.struct.pack(null_mask, int_mask, *fixed))
+        out.extend(variable)
+        return True
+
+    # -- 解码
+    def loads(self, data: bytes):
+        if len(data) < 2 or data[0] != self.MAGIC:
+            # 兼容 pickle 保存的历史数据，包括压缩过的
+            return PickleCodec.loads(data)
+        payload = data[2:]
+        if data[1] & self.FLAG_COMPRESSED:
+            payload = zlib.decompress(payload)
+        view = memoryview(payload)
+        count, = self.__u32__.unpack_from(view, 0)
+        offset = self.__u32__.size
+        strings = list()
+        for i in range(count):
+            length, = self.__u32__.unpack_from(view, offset)
+            offset += self.__u32__.size
+            strings.append(str(view[offset: offset + length], 'utf-8'))
+            offset += length
+        value, offset = self.__decode__(view, offset, strings)
+        return value
+
+    def __decode__(self, view, offset: int, strings: list):
+        tag = view[offset]
+        offset += 1
+        if tag == self.T_NONE:
+            return None, offset
+        elif tag == self.T_TRUE:
+            return True, offset
+        elif tag == self.T_FALSE:
+            return False, offset
+        elif tag == self.T_INT:
+            return self.__i64__.unpack_from(view, offset)[0], offset + 8
+        elif tag == self.T_FLOAT:
+            return self.__f64__.unpack_from(view, offset)[0], offset + 8
+        elif tag == self.T_STR:
+            return strings[self.__u32__.unpack_from(view, offset)[0]], offset + 4
+        elif tag == self.T_BYTES or tag == self.T_PICKLE:
+            length, = self.__u32__.unpack_from(view, offset)
+            offset += 4
+            data = bytes(view[offset: offset + length])
+            return (data if tag == self.T_BYTES else pickle.loads(data)), offset + length
+        elif tag == self.T_LIST or tag == self.T_TUPLE:
+            length, = self.__u32__.unpack_from(view, offset)
+            offset += 4
+            result = list()
+            for i in range(length):
+                item, offset = self.__decode__(view, offset, strings)
+                result.append(item)
+            return (result if tag == self.T_LIST else tuple(result)), offset
+        elif tag == self.T_DICT:
+            length, = self.__u32__.unpack_from(view, offset)
+            offset += 4
+            result = dict()
+            for i in range(length):
+                k, offset = self.__decode__(view, offset, strings)
+                v, offset = self.__decode__(view, offset, strings)
+                result[k] = v
+            return result, offset
+        elif tag == self.T_SCHEMA:
+            return self.__decode_schema__(view, offset, strings)
+        elif tag == self.T_DATETIME:
+            microseconds, = self.__i64__.unpack_from(view, offset)
+            return self.__epoch__ + datetime.timedelta(microseconds=microseconds), offset + 8
+        elif tag == self.T_DATE:
+            return datetime.date.fromordinal(self.__u32__.unpack_from(view, offset)[0]), offset + 4
+        elif tag == self.T_ENUM:
+            import utils.Constants
+            class_name, name = struct.unpack_from('<II', view, offset)
+            return getattr(utils.Constants, strings[class_name])[strings[name]], offset + 8
+        elif tag == self.T_TICK:
+            tick_dict, offset = self.__decode__(view, offset, strings)
+            return self.__tick_type__(tick_dict), offset
+        elif tag == self.T_TRADE:
+            attributes, offset = self.__decode__(view, offset, strings)
+            trade = self.__trade_type__.__new__(self.__trade_type__)
+            trade.__dict__.update(attributes)
+            return trade, offset
+        else:
+            raise ValueError('unknown binary codec tag {}'.format(tag))
+
+    def __decode_schema__(self, view, offset: int, strings: list):
+        schema = self.__schema_by_id__[view[offset]]
+        offset += 1
+        fixed = schema.struct.unpack_from(view, offset)
+        offset += schema.struct.size
+        null_mask, int_mask = fixed[0], fixed[1]
+        fixed_iter = iter(fixed[2:])
+        result = dict()
+        for i, (name, kind) in enumerate(schema.fields):
+            if kind == 'v':
+                result[name], offset = self.__decode__(view, offset, strings)
+                continue
+            raw = next(fixed_iter)
+            if null_mask >> i & 1:
+                result[name] = None
+            elif kind == 'n':
+                result[name] = (self.__i64__ if int_mask >> i & 1 else self.__f64__).unpack(raw)[0]
+            elif kind == 's':
+                result[name] = strings[raw]
+            else:
+                result[name] = schema.enum_values[name][raw]
+        return result, offset
+
+
+CODECS = {
+    PickleCodec.name: PickleCodec,
+    BinaryCodec.name: BinaryCodec,
+}
+
+
+def get_codec(name: str='pickle', compress: bool=False):
+    """
+    :param name: str pickle/binary
+    :param compress: bool 是否使用 zlib 压缩
+    """
+    try:
+        return CODECS[name](compress=compress)
+    except KeyError:
+        from utils.Exceptions import ParamOutOfRangeError
+        raise ParamOutOfRangeError('codec', '/'.join(CODECS.keys()), name)
+
+
+def codec_from_config(codec: str=None, compress: bool=None):
+    """
+    按参数或 Config.yaml 中 Persist 设置创建序列化方案，参数为 None 时使用配置，未配置时为不压缩的 pickle
+    """
+    try:
+        from core.Environment import Environment
+        config = Environment.get_instance().config.get('Persist', dict()) or dict()
+    except RuntimeError:
+        config = dict()
+    return get_codec(
+        config.get('codec', 'pickle') if codec is None else codec,
+        config.get('compress', False) if compress is None else compress,
+    )
@@ -12,6 +12,7 @@ __all__ = [
     'OffSet',
     'InstrumentType',
     'PersistMode',
+    'FsyncPolicy',
     'MarginType',
     'MatchingType',
     'MarketInfoType',
@@ -40,6 +41,7 @@ class EVENT(BaseEnum):
     # -------- [market] -------- #
     MARKET_CHECK = 'market_check'           # 检查 market info 是否可以发出
     MARKET_SEND = 'market_send'             # market info 发送事件
+    MARKET_BAR_SEND = 'market_bar_send'     # 由 tick 合成的k线发送事件
 
     # -------- [matching] -------- #
     ORDER = 'order'                         # 订单事件
@@ -165,6 +167,13 @@ class PersistMode(BaseEnum):
     ON_NORMAL_EXIT = "ON_NORMAL_EXIT"
 
 
+class FsyncPolicy(BaseEnum):
+    """持久化落盘策略"""
+    NONE = "none"                   # 不调用 fsync，由操作系统决定何时落盘
+    BATCH = "batch"                 # 每批写入完成后 fsync 一次
+    EVERY_WRITE = "every-write"     # 每次写入都立即 fsync
+
+
 class MarginType(BaseEnum):
     BY_MONEY = "BY_MONEY"
     BY_VOLUME = "BY_VOLUME"
@@ -1,6 +1,12 @@
 # -*- encoding: UTF-8 -*-
+import atexit
 import logging
+import logging.handlers
 import os
+import threading
+import time
+
+from queue import Queue
 
 from Interface import ROOT_PATH
 from utils import load_yaml
@@ -19,6 +25,7 @@ LOG_LEVEL_CHOICE = {
 log_config = load_yaml(os.path.join(ROOT_PATH, 'Config.yaml')).get('Log', dict())
 DEFAULT_LOG_DIR = log_config.get('path', 'log')
 DEFAULT_LOG_CONSOLE_ENABLED = log_config.get('console_print', False)
+DEFAULT_LOG_FILE_ENABLED = log_config.get('file_print', False)
 DEFAULT_LOG_LEVEL = LOG_LEVEL_CHOICE.get(log_config.get('level', 'info'), logging.INFO)
 if os.path.exists(DEFAULT_LOG_DIR) is False:
     os.makedirs(DEFAULT_LOG_DIR)
@@ -27,6 +34,90 @@ if log_config.get('keep_history', False) is False:
     os.makedirs(DEFAULT_LOG_DIR)
 
 
+__log_queue__ = Queue(-1)                # 所有 logger 共用的日志队列，由后台线程统一写入
+__logger_cache__ = dict()                 # (log_name, file_name, console_print) -> LogWrapper
+__logger_cache_lock__ = threading.Lock()
+__log_listener__ = None
+
+
+class LogRouter(logging.Handler):
+    """
+    日志分发，运行在后台写日志线程中
+
+    根据日志记录上的 log_file / console_print 标记写入对应的文件或控制台。写文件默认关闭（Log.file_print），
+    开启后文件 handler 在首次使用时才创建，每个日志文件名只保留当天的 handler，日期变化时关闭前一天的文件
+    """
+
+    def __init__(self, log_path: str, file_print: bool=DEFAULT_LOG_FILE_ENABLED):
+        super(LogRouter, self).__init__()
+        self.__log_path__ = log_path
+        self.__file_print__ = file_print is True
+        self.__file_handlers__ = dict()     # file_name -> (日期, FileHandler)
+        self.__screen_handler__ = logging.StreamHandler()
+        self.__screen_handler__.setFormatter(LOG_FORMATTER)
+
+    def __file_handler__(self, file_name: str):
+        today = time.strftime("%Y%m%d")
+        date, handler = self.__file_handlers__.get(file_name, (None, None))
+        if date != today:
+            if handler is not None:
+                handler.close()
+            if not os.path.exists(self.__log_path__):
+                os.makedirs(self.__log_path__)
+            handler = logging.FileHandler(os.path.join(self.__log_path__, file_name + today + ".log"))
+            handler.setFormatter(LOG_FORMATTER)
+            self.__file_handlers__[file_name] = (today, handler)
+        return handler
+
+    def emit(self, record):
+        if self.__file_print__ is True:
+            self.__file_handler__(record.log_file).handle(record)
+        if record.console_print is True:
+            self.__screen_handler__.handle(record)
+
+    def close(self):
+        for date, handler in self.__file_handlers__.values():
+            handler.close()
+        self.__file_handlers__.clear()
+        super(LogRouter, self).close()
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """将日志记录连同目标文件信息放入共用队列"""
+
+    def __init__(self, file_name: str, console_print: bool):
+        super(LogQueueHandler, self).__init__(__log_queue__)
+        self.file_name = file_name
+        self.console_print = console_print
+
+    def prepare(self, record):
+        record = super(LogQueueHandler, self).prepare(record)
+        record.log_file = self.file_name
+        record.console_print = self.console_print
+        return record
+
+
+def __start_log_listener__():
+    global __log_listener__
+    if __log_listener__ is None:
+        __log_listener__ = logging.handlers.QueueListener(
+            __log_queue__, LogRouter(os.path.join(ROOT_PATH, DEFAULT_LOG_DIR))
+        )
+        __log_listener__.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """写完队列中剩余的日志并停止后台写日志线程"""
+    global __log_listener__
+    with __logger_cache_lock__:
+        if __log_listener__ is not None:
+            __log_listener__.stop()
+            for handler in __log_listener__.handlers:
+                handler.close()
+            __log_listener__ = None
+
+
 class LogWrapper(logging.Logger):
 
     def __init__(self, name: str, level=logging.NOTSET):
@@ -50,19 +141,13 @@ class LogWrapper(logging.Logger):
 
 def get_logger(module_name, file_name: str, console_print=DEFAULT_LOG_CONSOLE_ENABLED):
     """
+    同一 (module_name, file_name, console_print) 只创建一次 logger，日志记录经队列交由后台线程写入文件或控制台
 
     :param module_name: str / object(instance of a class)
     :param file_name: the name of log filename
     :param console_print: whether show logging info in console
     :return: :class:`~logging.Logger`
     """
-    import time
-
-    log_path = os.path.join(ROOT_PATH, DEFAULT_LOG_DIR)
-
-    if not os.path.exists(log_path):
-        os.makedirs(log_path)
-
     if isinstance(module_name, str):
         log_name = module_name
     elif isinstance(module_name, object):
@@ -71,19 +156,17 @@ def get_logger(module_name, file_name: str, console_print=DEFAULT_LOG_CONSOLE_EN
         from utils.Exceptions import ParamTypeError
         raise ParamTypeError('module_name', 'str/object', module_name)
 
-    # logger = logging.getLogger(log_name)
-    logger = LogWrapper(log_name)
-    logger.setLevel(DEFAULT_LOG_LEVEL)
-
-    log_file_name = file_name + time.strftime("%Y%m%d") + ".log"
-    file_handler = logging.FileHandler(os.path.join(log_path, log_file_name))  # 本地测试
-    file_handler.setFormatter(LOG_FORMATTER)
-    # logger.addHandler(file_handler)
-
-    if console_print is True:
-        screen_handler = logging.StreamHandler()
-        screen_handler.setFormatter(LOG_FORMATTER)
-        logger.addHandler(screen_handler)
-
-    # return LogWrapper(logger)
-    return logger
+    key = (log_name, file_name, console_print)
+    try:
+        return __logger_cache__[key]
+    except KeyError:
+        pass
+
+    with __logger_cache_lock__:
+        if key not in __logger_cache__:
+            __start_log_listener__()
+            logger = LogWrapper(log_name)
+            logger.setLevel(DEFAULT_LOG_LEVEL)
+            logger.addHandler(LogQueueHandler(file_name, console_print is True))
+            __logger_cache__[key] = logger
+        return __logger_cache__[key]
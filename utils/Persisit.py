@@ -1,30 +1,462 @@
 # -*- encoding: UTF-8 -*-
 import pickle
 import os
+import struct
+import threading
 import time
 
 from collections import Iterable, Mapping, Sized
 
 
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024     # 分段文件大小上限，单位字节
+DEFAULT_COMPACT_RATIO = 0.5                 # 有效数据占比低于该比例时压缩
+DEFAULT_COMPACT_MIN_SIZE = 4 * 1024 * 1024  # 分段文件总大小低于该值时不压缩
+
+
+class FileBackend(object):
+    """每个元素保存为一个 pickle 文件，文件名即元素名"""
+    __ignore_prefix__ = ('.', '_', '$')
+
+    def __init__(self, data_path: str, keep_history: bool):
+        self.__path__ = data_path
+        if keep_history is False:
+            self.clear()
+
+    def __pjoin__(self, name: str):
+        return os.path.join(self.__path__, name)
+
+    def names(self):
+        for file in os.listdir(self.__path__):
+            if file[0] not in self.__ignore_prefix__:
+                yield file
+
+    def count(self):
+        return len(list(self.names()))
+
+    def exists(self, name: str):
+        return os.path.exists(self.__pjoin__(name))
+
+    def read(self, name: str):
+        with open(self.__pjoin__(name), 'rb') as f:
+            return f.read()
+
+    def write(self, name: str, data: bytes):
+        with open(self.__pjoin__(name), 'wb') as f:
+            f.write(data)
+
+    def write_many(self, items, sync: bool=False):
+        for name, data in items:
+            with open(self.__pjoin__(name), 'wb') as f:
+                f.write(data)
+                if sync is True:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def rename(self, from_name: str, to_name: str):
+        os.rename(self.__pjoin__(from_name), self.__pjoin__(to_name))
+
+    def remove(self, name: str):
+        os.remove(self.__pjoin__(name))
+
+    def clear(self):
+        for file in self.names():
+            if os.path.isfile(self.__pjoin__(file)):
+                os.remove(self.__pjoin__(file))
+
+    def close(self):
+        pass
+
+
+class SegmentBackend(object):
+    """
+    分段追加日志存储
+
+    写入、删除、重命名都以记录的形式追加到 _NNNNNNNN.seg 分段文件末尾，内存中维护 名称 -> (分段, 偏移, 长度) 索引，
+    因此计数为 O(1)，读取只需一次 seek，写入只需一次缓冲写。失效数据超过一定比例时，将有效数据重写到新分段并删除旧分段。
+    启动时按分段顺序重放记录恢复索引，末尾不完整的记录会被截断。
+    """
+    __header__ = struct.Struct('<BII')      # 操作类型, 名称长度, 数据长度
+    __suffix__ = '.seg'
+    OP_WRITE, OP_REMOVE, OP_RENAME = 1, 2, 3
+
+    def __init__(self, data_path: str, keep_history: bool, segment_size: int=DEFAULT_SEGMENT_SIZE,
+                 compact_ratio: float=DEFAULT_COMPACT_RATIO, compact_min_size: int=DEFAULT_COMPACT_MIN_SIZE):
+        self.__path__ = data_path
+        self.__segment_size__ = segment_size
+        self.__compact_ratio__ = compact_ratio
+        self.__compact_min_size__ = compact_min_size
+
+        self.__index__ = dict()         # name -> (segment, payload offset, payload length)
+        self.__readers__ = dict()       # segment -> file object
+        self.__live_bytes__ = 0
+        self.__total_bytes__ = 0
+
+        segments = self.__list_segments__()
+        if keep_history is True:
+            for segment in segments:
+                self.__replay__(segment)
+        else:
+            for segment in segments:
+                os.remove(self.__segment_path__(segment))
+            segments = list()
+        self.__segment__ = segments[-1] if len(segments) > 0 else 0
+        self.__segments__ = segments if len(segments) > 0 else [self.__segment__]
+        self.__writer__ = open(self.__segment_path__(self.__segment__), 'ab')
+
+    # -- 分段文件
+    def __segment_path__(self, segment: int):
+        return os.path.join(self.__path__, '_{:08d}{}'.format(segment, self.__suffix__))
+
+    def __list_segments__(self):
+        segments = list()
+        for file in os.listdir(self.__path__):
+            if file.startswith('_') and file.endswith(self.__suffix__):
+                segments.append(int(file[1:-len(self.__suffix__)]))
+        return sorted(segments)
+
+    def __record_size__(self, name: str, length: int):
+        return self.__header__.size + len(name.encode('utf-8')) + length
+
+    def __replay__(self, segment: int):
+        path = self.__segment_path__(segment)
+        with open(path, 'rb') as f:
+            good = 0
+            while True:
+                head = f.read(self.__header__.size)
+                if len(head) < self.__header__.size:
+                    break
+                op, name_length, length = self.__header__.unpack(head)
+                name = f.read(name_length)
+                offset = f.tell()
+                f.seek(length, os.SEEK_CUR)
+                if len(name) < name_length or f.tell() > os.fstat(f.fileno()).st_size:
+                    break
+                good = f.tell()
+                self.__apply__(op, name.decode('utf-8'), segment, offset, length, f)
+        if good < os.path.getsize(path):
+            # 截断未写完整的记录
+            with open(path, 'r+b') as f:
+                f.truncate(good)
+
+    def __apply__(self, op: int, name: str, segment: int, offset: int, length: int, f=None):
+        self.__total_bytes__ += self.__record_size__(name, length)
+        if op == self.OP_WRITE:
+            self.__drop__(name)
+            self.__index__[name] = (segment, offset, length)
+            self.__live_bytes__ += self.__record_size__(name, length)
+        elif op == self.OP_REMOVE:
+            self.__drop__(name)
+        elif op == self.OP_RENAME:
+            f.seek(offset)
+            to_name = f.read(length).decode('utf-8')
+            f.seek(offset + length)
+            if name in self.__index__:
+                self.__drop__(to_name)
+                location = self.__index__.pop(name)
+                self.__index__[to_name] = location
+        else:
+            raise ValueError('unknown segment record type {}'.format(op))
+
+    def __drop__(self, name: str):
+        location = self.__index__.pop(name, None)
+        if location is not None:
+            self.__live_bytes__ -= self.__record_size__(name, location[2])
+
+    def __append__(self, op: int, name: str, payload: bytes=b''):
+        if self.__writer__.tell() >= self.__segment_size__:
+            self.__rotate__()
+        encoded = name.encode('utf-8')
+        self.__writer__.write(self.__header__.pack(op, len(encoded), len(payload)))
+        self.__writer__.write(encoded)
+        offset = self.__writer__.tell()
+        self.__writer__.write(payload)
+        return self.__segment__, offset, len(payload)
+
+    def __rotate__(self):
+        self.__writer__.close()
+        self.__segment__ += 1
+        self.__segments__.append(self.__segment__)
+        self.__writer__ = open(self.__segment_path__(self.__segment__), 'ab')
+
+    def __reader__(self, segment: int):
+        if segment == self.__segment__:
+            self.__writer__.flush()
+        reader = self.__readers__.get(segment, None)
+        if reader is None:
+            reader = open(self.__segment_path__(segment), 'rb')
+            self.__readers__[segment] = reader
+        return reader
+
+    def __close_readers__(self):
+        for reader in self.__readers__.values():
+            reader.close()
+        self.__readers__.clear()
+
+    def __maybe_compact__(self):
+        if self.__total_bytes__ >= self.__compact_min_size__ and \
+                self.__live_bytes__ < self.__total_bytes__ * self.__compact_ratio__:
+            self.compact()
+
+    # -- 存储接口
+    def names(self):
+        return iter(list(self.__index__.keys()))
+
+    def count(self):
+        return len(self.__index__)
+
+    def exists(self, name: str):
+        return name in self.__index__
+
+    def read(self, name: str):
+        try:
+            segment, offset, length = self.__index__[name]
+        except KeyError:
+            raise FileNotFoundError(name)
+        reader = self.__reader__(segment)
+        reader.seek(offset)
+        return reader.read(length)
+
+    def write(self, name: str, data: bytes):
+        self.__drop__(name)
+        self.__index__[name] = self.__append__(self.OP_WRITE, name, data)
+        size = self.__record_size__(name, len(data))
+        self.__live_bytes__ += size
+        self.__total_bytes__ += size
+        self.__maybe_compact__()
+
+    def write_many(self, items, sync: bool=False):
+        for name, data in items:
+            self.write(name, data)
+        if sync is True:
+            self.__writer__.flush()
+            os.fsync(self.__writer__.fileno())
+
+    def rename(self, from_name: str, to_name: str):
+        if from_name not in self.__index__:
+            raise FileNotFoundError(from_name)
+        payload = to_name.encode('utf-8')
+        self.__append__(self.OP_RENAME, from_name, payload)
+        self.__total_bytes__ += self.__record_size__(from_name, len(payload))
+        self.__drop__(to_name)
+        self.__index__[to_name] = self.__index__.pop(from_name)
+        self.__maybe_compact__()
+
+    def remove(self, name: str):
+        if name not in self.__index__:
+            raise FileNotFoundError(name)
+        self.__append__(self.OP_REMOVE, name)
+        self.__total_bytes__ += self.__record_size__(name, 0)
+        self.__drop__(name)
+        self.__maybe_compact__()
+
+    def clear(self):
+        self.__writer__.close()
+        self.__close_readers__()
+        for segment in self.__segments__:
+            if os.path.exists(self.__segment_path__(segment)):
+                os.remove(self.__segment_path__(segment))
+        self.__index__.clear()
+        self.__live_bytes__ = 0
+        self.__total_bytes__ = 0
+        self.__segment__ = 0
+        self.__segments__ = [self.__segment__]
+        self.__writer__ = open(self.__segment_path__(self.__segment__), 'ab')
+
+    def compact(self):
+        """将有效数据重写到新的分段中，并删除旧分段"""
+        old_segments = list(self.__segments__)
+        self.__rotate__()
+        self.__segments__ = [self.__segment__]
+        self.__live_bytes__ = 0
+        self.__total_bytes__ = 0
+        for name in list(self.__index__.keys()):
+            data = self.read(name)
+            self.__index__[name] = self.__append__(self.OP_WRITE, name, data)
+            size = self.__record_size__(name, len(data))
+            self.__live_bytes__ += size
+            self.__total_bytes__ += size
+        self.__writer__.flush()
+        self.__close_readers__()
+        for segment in old_segments:
+            os.remove(self.__segment_path__(segment))
+
+    def flush(self):
+        self.__writer__.flush()
+
+    def close(self):
+        self.__writer__.close()
+        self.__close_readers__()
+
+
+class BatchWriter(object):
+    """
+    批量写入层
+
+    写入先缓存在内存中，累计 batch_size 条或距第一条缓存写入超过 flush_interval 毫秒后一次性写入底层存储，
+    读取时优先返回缓存中的数据。fsync 策略：
+        none        不调用 fsync
+        batch       每批写入后 fsync 一次
+        every-write 每次写入立即写入底层存储并 fsync
+    未设置 flush_interval 时，缓存中不足 batch_size 条的数据在 flush/close 时写入。
+    """
+    __removed__ = object()
+
+    def __init__(self, backend, batch_size: int=1, flush_interval: int=0, fsync: str='none'):
+        from utils.Constants import FsyncPolicy
+        from utils.Exceptions import ParamOutOfRangeError
+        try:
+            self.__fsync__ = FsyncPolicy(fsync)
+        except ValueError:
+            raise ParamOutOfRangeError('fsync', '/'.join([var.value for var in FsyncPolicy]), fsync)
+        if not isinstance(batch_size, int) or batch_size < 1:
+            raise ParamOutOfRangeError('batch_size', 'positive int', batch_size)
+        if flush_interval < 0:
+            raise ParamOutOfRangeError('flush_interval', 'non-negative number', flush_interval)
+
+        self.__backend__ = backend
+        self.__batch_size__ = 1 if self.__fsync__ == FsyncPolicy.EVERY_WRITE else batch_size
+        self.__flush_interval__ = flush_interval / 1000
+        self.__pending__ = dict()       # name -> bytes / __removed__
+        self.__count_delta__ = 0        # 缓存中的写入/删除对元素个数的影响
+        self.__lock__ = threading.RLock()
+        self.__timer__ = None
+
+    @property
+    def backend(self):
+        return self.__backend__
+
+    def __schedule__(self):
+        if self.__flush_interval__ > 0 and self.__timer__ is None:
+            self.__timer__ = threading.Timer(self.__flush_interval__, self.flush)
+            self.__timer__.start()
+
+    def __backend_exists__(self, name: str):
+        return self.__backend__.exists(name)
+
+    def names(self):
+        self.flush()
+        return self.__backend__.names()
+
+    def count(self):
+        with self.__lock__:
+            return self.__backend__.count() + self.__count_delta__
+
+    def exists(self, name: str):
+        with self.__lock__:
+            value = self.__pending__.get(name, None)
+            if value is None:
+                return self.__backend__.exists(name)
+            return value is not self.__removed__
+
+    def read(self, name: str):
+        with self.__lock__:
+            value = self.__pending__.get(name, None)
+            if value is None:
+                return self.__backend__.read(name)
+            elif value is self.__removed__:
+                raise FileNotFoundError(name)
+            return value
+
+    def write(self, name: str, data: bytes):
+        with self.__lock__:
+            value = self.__pending__.get(name, None)
+            if value is self.__removed__ or (value is None and not self.__backend_exists__(name)):
+                self.__count_delta__ += 1
+            self.__pending__[name] = data
+            if len(self.__pending__) >= self.__batch_size__:
+                self.flush()
+            else:
+                self.__schedule__()
+
+    def remove(self, name: str):
+        with self.__lock__:
+            value = self.__pending__.get(name, None)
+            if value is self.__removed__ or (value is None and not self.__backend_exists__(name)):
+                raise FileNotFoundError(name)
+            self.__count_delta__ -= 1
+            self.__pending__[name] = self.__removed__
+            if len(self.__pending__) >= self.__batch_size__:
+                self.flush()
+            else:
+                self.__schedule__()
+
+    def rename(self, from_name: str, to_name: str):
+        with self.__lock__:
+            self.flush()
+            self.__backend__.rename(from_name, to_name)
+
+    def clear(self):
+        with self.__lock__:
+            self.__discard__()
+            self.__backend__.clear()
+
+    def compact(self):
+        with self.__lock__:
+            self.flush()
+            if hasattr(self.__backend__, 'compact'):
+                self.__backend__.compact()
+
+    def __discard__(self):
+        if self.__timer__ is not None:
+            self.__timer__.cancel()
+            self.__timer__ = None
+        self.__pending__.clear()
+        self.__count_delta__ = 0
+
+    def flush(self):
+        """将缓存中的写入和删除一次性写入底层存储"""
+        from utils.Constants import FsyncPolicy
+        with self.__lock__:
+            pending = list(self.__pending__.items())
+            self.__discard__()
+            if len(pending) == 0:
+                return
+            for name, value in pending:
+                if value is self.__removed__:
+                    try:
+                        self.__backend__.remove(name)
+                    except FileNotFoundError:
+                        pass
+            self.__backend__.write_many(
+                [(name, value) for name, value in pending if value is not self.__removed__],
+                sync=self.__fsync__ != FsyncPolicy.NONE,
+            )
+
+    def close(self):
+        self.flush()
+        self.__backend__.close()
+
+
+PERSIST_BACKENDS = {
+    'file': FileBackend,
+    'segment': SegmentBackend,
+}
+
+
 class BasePersisit(object):
     __ptype__ = 'None'
     __ignore_prefix__ = ('.', '_', '$')
 
-    def __init__(self, data_path=None, keep_history=False):
+    def __init__(self, data_path=None, keep_history=False, backend: str='file', batch_size: int=1,
+                 flush_interval: int=0, fsync: str='none', codec: str='pickle'):
         from utils.Logger import get_logger
         self.__logger__ = get_logger(self.__class__.__name__, 'Persist')
         
         if data_path is None:
-            self.__logger__.debug('initiating {} into path {}'.format(self.__class__.__name__, os.getcwd()))
+            self.__logger__.debug('initiating %s into path %s', self.__class__.__name__, os.getcwd())
             self.__path__ = os.path.join(os.getcwd(), self.__time_index__)
         elif isinstance(data_path, str):
-            self.__logger__.debug('initiating {} from path {}'.format(self.__class__.__name__, data_path))
+            self.__logger__.debug('initiating %s from path %s', self.__class__.__name__, data_path)
             self.__path__ = data_path
         else:
             raise TypeError
 
-        __ptype_path__ = os.path.join(data_path, '__ptype__')
-        if os.path.exists(data_path):
+        if backend not in PERSIST_BACKENDS:
+            from utils.Exceptions import ParamOutOfRangeError
+            raise ParamOutOfRangeError('backend', '/'.join(PERSIST_BACKENDS.keys()), backend)
+
+        __ptype_path__ = os.path.join(self.__path__, '__ptype__')
+        if os.path.exists(self.__path__):
             try:
                 hist_ptype = pickle.load(open(__ptype_path__, 'rb'))
                 if hist_ptype == self.__ptype__:
@@ -33,13 +465,14 @@ class BasePersisit(object):
                     assert keep_history is False, repr(FileExistsError)
             except FileNotFoundError:
                 pass
-            if keep_history is True:
-                pass
-            else:
-                self.clear()
         else:
-            os.makedirs(data_path)
+            os.makedirs(self.__path__)
         pickle.dump(self.__ptype__, open(__ptype_path__, 'wb'))
+        self.__backend__ = BatchWriter(
+            PERSIST_BACKENDS[backend](self.__path__, keep_history is True), batch_size, flush_interval, fsync,
+        )
+        from utils.Codec import get_codec
+        self.__codec__ = get_codec(codec)
 
     @classmethod
     def init_from(cls, *args, **kwargs):
@@ -64,7 +497,7 @@ class BasePersisit(object):
             yield self.__read__(tag)
 
     def __len__(self):
-        return len(list(self.__file_list__()))
+        return self.__backend__.count()
 
     @property
     def __time_index__(self):
@@ -81,38 +514,42 @@ class BasePersisit(object):
 
     def __fexists__(self, name: str):
         assert name[0] not in self.__ignore_prefix__
-        return os.path.exists(self.__pjoin__(name))
+        return self.__backend__.exists(name)
 
     def __file_list__(self):
-        for file in os.listdir(self.__path__):
-            if self.__fcheck__(file):
-                yield file
+        return self.__backend__.names()
 
     def __read__(self, name: str):
         assert name[0] not in self.__ignore_prefix__, str(ValueError)
-        return pickle.load(open(self.__pjoin__(name), 'rb'))
+        return self.__codec__.loads(self.__backend__.read(name))
 
     def __write__(self, name: str, obj):
         assert name[0] not in self.__ignore_prefix__, repr(ValueError)
-        pickle.dump(obj, open(self.__pjoin__(name), 'wb'))
+        self.__backend__.write(name, self.__codec__.dumps(obj))
 
     def __rename__(self, from_name: str, to_name: str):
-        os.rename(self.__pjoin__(from_name), self.__pjoin__(to_name))
+        self.__backend__.rename(from_name, to_name)
 
     def __remove__(self, name: str):
-        os.remove(self.__pjoin__(name))
+        self.__backend__.remove(name)
 
     def clear(self):
         """ obj.clear() -> None -- remove all items from obj """
-        for file in self.__file_list__():
-            if os.path.isfile(self.__pjoin__(file)):
-                os.remove(self.__pjoin__(file))
-            elif os.path.isdir(self.__pjoin__(file)):
-                pass
-            else:
-                continue
+        self.__backend__.clear()
+
+    def compact(self):
+        """ 压缩分段存储，文件存储时无效果 """
+        self.__backend__.compact()
+
+    def flush(self):
+        """ 将缓存中的写入写入磁盘 """
+        self.__backend__.flush()
+
+    def close(self):
+        self.__backend__.close()
 
     def clean(self):
+        self.__backend__.close()
         for file in os.listdir(self.__path__):
             os.remove(self.__pjoin__(file))
         os.rmdir(self.__path__)
@@ -121,14 +558,16 @@ class BasePersisit(object):
 class Plist(BasePersisit, Iterable, Sized):
     __ptype__ = 'plist'
 
-    def __init__(self, data_path=None, keep_history=False):
-        BasePersisit.__init__(self, data_path, keep_history)
+    def __init__(self, data_path=None, keep_history=False, backend: str='file', batch_size: int=1,
+                 flush_interval: int=0, fsync: str='none', codec: str='pickle'):
+        BasePersisit.__init__(self, data_path, keep_history, backend, batch_size, flush_interval, fsync, codec)
 
     @classmethod
-    def init_from(cls, inst, data_path=None, keep_history=False):
+    def init_from(cls, inst, data_path=None, keep_history=False, backend: str='file', batch_size: int=1,
+                  flush_interval: int=0, fsync: str='none', codec: str='pickle'):
         from collections import Iterable
         if isinstance(inst, Iterable):
-            new_cls = cls(data_path, keep_history)
+            new_cls = cls(data_path, keep_history, backend, batch_size, flush_interval, fsync, codec)
             new_cls.extend(inst)
             return new_cls
         else:
@@ -140,7 +579,7 @@ class Plist(BasePersisit, Iterable, Sized):
 
     def copy(self):
         """ L.copy() -> list -- a shallow copy of L """
-        return [self.__read__(file) for file in self.__file_list__()]
+        return [self.__read__(str(i)) for i in range(self.__len__())]
 
     def count(self, value):
         """ L.count(value) -> integer -- return number of occurrences of value """
@@ -272,6 +711,11 @@ class Plist(BasePersisit, Iterable, Sized):
         except FileNotFoundError:
             raise IndexError
 
+    def __iter__(self):
+        """ Implement iter(self). """
+        for i in range(self.__len__()):
+            yield self.__read__(str(i))
+
     def __reversed__(self):
         """ L.__reversed__() -- return a reverse iterator over the list """
         for i in range(0, self.__len__(), -1):
@@ -289,14 +733,16 @@ class Plist(BasePersisit, Iterable, Sized):
 class Pdict(BasePersisit, Mapping, Sized):
     __ptype__ = 'pdict'
 
-    def __init__(self, data_path=None, keep_history=True):
-        BasePersisit.__init__(self, data_path, keep_history)
+    def __init__(self, data_path=None, keep_history=True, backend: str='file', batch_size: int=1,
+                 flush_interval: int=0, fsync: str='none', codec: str='pickle'):
+        BasePersisit.__init__(self, data_path, keep_history, backend, batch_size, flush_interval, fsync, codec)
 
     @classmethod
-    def init_from(cls, inst, data_path=None, keep_history=False):
+    def init_from(cls, inst, data_path=None, keep_history=False, backend: str='file', batch_size: int=1,
+                  flush_interval: int=0, fsync: str='none', codec: str='pickle'):
         from collections import Mapping
         if isinstance(inst, Mapping):
-            new_cls = cls(data_path, keep_history)
+            new_cls = cls(data_path, keep_history, backend, batch_size, flush_interval, fsync, codec)
             for key in inst:
                 new_cls.__setitem__(key, inst[key])
             return new_cls
@@ -395,14 +841,16 @@ class Pdict(BasePersisit, Mapping, Sized):
 class Pset(BasePersisit, Iterable, Sized):
     __ptype__ = 'pset'
 
-    def __init__(self, data_path=None, keep_history=False):
-        BasePersisit.__init__(self, data_path, keep_history)
+    def __init__(self, data_path=None, keep_history=False, backend: str='file', batch_size: int=1,
+                 flush_interval: int=0, fsync: str='none', codec: str='pickle'):
+        BasePersisit.__init__(self, data_path, keep_history, backend, batch_size, flush_interval, fsync, codec)
 
     @classmethod
-    def init_from(cls, inst, data_path=None, keep_history=False):
+    def init_from(cls, inst, data_path=None, keep_history=False, backend: str='file', batch_size: int=1,
+                  flush_interval: int=0, fsync: str='none', codec: str='pickle'):
         from collections import Iterable
         if isinstance(inst, Iterable):
-            new_cls = cls(data_path, keep_history)
+            new_cls = cls(data_path, keep_history, backend, batch_size, flush_interval, fsync, codec)
             for item in inst:
                 new_cls.add(item)
             return new_cls
@@ -467,8 +915,10 @@ class PqueueFIFO(BasePersisit, Sized):
     """FIFO Queue"""
     __ptype__ = 'deque'
 
-    def __init__(self, data_path=None, keep_history=False, max_length=None):
-        BasePersisit.__init__(self, data_path, keep_history=keep_history)
+    def __init__(self, data_path=None, keep_history=False, max_length=None, backend: str='file', batch_size: int=1,
+                 flush_interval: int=0, fsync: str='none', codec: str='pickle'):
+        BasePersisit.__init__(self, data_path, keep_history=keep_history, backend=backend, batch_size=batch_size,
+                              flush_interval=flush_interval, fsync=fsync, codec=codec)
 
         if isinstance(max_length, (type(None), int)):
             self.__max_length__ = max_length
@@ -476,10 +926,12 @@ class PqueueFIFO(BasePersisit, Sized):
             raise TypeError
 
     @classmethod
-    def init_from(cls, inst, data_path=None, keep_history=False, max_length=None):
+    def init_from(cls, inst, data_path=None, keep_history=False, max_length=None, backend: str='file',
+                  batch_size: int=1, flush_interval: int=0, fsync: str='none', codec: str='pickle'):
         from collections import Iterable
         assert isinstance(inst, Iterable)
-        new_q = cls(data_path, keep_history=keep_history, max_length=max_length)
+        new_q = cls(data_path, keep_history=keep_history, max_length=max_length, backend=backend,
+                    batch_size=batch_size, flush_interval=flush_interval, fsync=fsync, codec=codec)
         for item in inst:
             new_q.put(item)
         return new_q
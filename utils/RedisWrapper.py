@@ -1,20 +1,60 @@
 # -*- coding: utf-8 -*-
-from redis import StrictRedis
+import threading
 
 
 class RedisWrapper(object):
-    def __init__(self):
-        from core.Environment import Environment
-        env = Environment.get_instance()
-        assert isinstance(env, Environment)
-        redis_config = env.config.get('Redis', dict())
-        self.__db__ = StrictRedis(
-            host=redis_config.get('host'), port=redis_config.get('port', 6379),
-            db=redis_config.get('db', 0), password=redis_config.get('password', None),
-            decode_responses=False, encoding='utf-8'
-        )
+    """
+    Redis 连接
+
+    同一组连接参数共用一个连接池，client 不为空时直接使用传入的连接（redis-py 客户端或进程内替身），
+    此时不需要安装 redis。
+    """
+    __pools__ = dict()
+    __pools_lock__ = threading.Lock()
+
+    def __init__(self, client=None, max_connections: int=None):
+        if client is None:
+            from redis import StrictRedis
+            from core.Environment import Environment
+            env = Environment.get_instance()
+            assert isinstance(env, Environment)
+            redis_config = env.config.get('Redis', dict())
+            client = StrictRedis(connection_pool=self.get_pool(
+                host=redis_config.get('host'), port=redis_config.get('port', 6379),
+                db=redis_config.get('db', 0), password=redis_config.get('password', None),
+                max_connections=redis_config.get('max_connections', max_connections),
+            ))
+        self.__db__ = client
+
+    @classmethod
+    def get_pool(cls, host: str, port: int=6379, db: int=0, password: str=None, max_connections: int=None):
+        """按连接参数返回共用的连接池 -> ConnectionPool"""
+        from redis import ConnectionPool
+        key = (host, port, db, password)
+        with cls.__pools_lock__:
+            pool = cls.__pools__.get(key, None)
+            if pool is None:
+                pool = ConnectionPool(
+                    host=host, port=port, db=db, password=password, max_connections=max_connections,
+                    decode_responses=False, encoding='utf-8',
+                )
+                cls.__pools__[key] = pool
+            return pool
+
+    @property
+    def client(self):
+        return self.__db__
 
     def pubsub(self, **kwargs):
         return self.__db__.pubsub(**kwargs)
 
+    def publish(self, channel: str, message: bytes):
+        return self.__db__.publish(channel, message)
+
+    def pipeline(self, transaction: bool=False):
+        """
+        批量发送命令，默认不使用 MULTI/EXEC 事务，只合并网络往返
+        """
+        return self.__db__.pipeline(transaction=transaction)
+
     # ------------ [dict operation] ------------ #
@@ -57,7 +57,7 @@ class ShelveWrapper(Mapping):
         self.__closed__ = False
 
     def __len__(self):
-        self.__db__.__len__()
+        return self.__db__.__len__()
 
     def __del__(self):
         if self.__closed__ is False:
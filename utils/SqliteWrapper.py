@@ -1,11 +1,337 @@
 # -*- encoding: UTF-8 -*-
+import sqlite3
+import threading
+
+
+DEFAULT_STATEMENT_CACHE = 128       # 每个连接缓存的预编译语句数量
+
+
+def connect_sqlite(db_path: str, read_only: bool=False, synchronous: str='NORMAL',
+                   statement_cache: int=DEFAULT_STATEMENT_CACHE):
+    """
+    打开 sqlite3 连接，使用 WAL 日志模式，读写可以并发进行
+
+    :param db_path: str 数据库文件路径
+    :param read_only: bool 是否以只读方式打开
+    :param synchronous: str OFF/NORMAL/FULL，WAL 模式下 NORMAL 只在检查点时 fsync
+    :param statement_cache: int 预编译语句缓存数量
+    :return: sqlite3.Connection 自动提交模式，事务需要显式 BEGIN/COMMIT
+    """
+    if read_only is True:
+        conn = sqlite3.connect(
+            'file:{}?mode=ro'.format(db_path), uri=True, check_same_thread=False, isolation_level=None,
+            cached_statements=statement_cache,
+        )
+    else:
+        conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None, cached_statements=statement_cache,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous={}'.format(synchronous))
+    return conn
+
+
+class SqliteStore(object):
+    """
+    基于 sqlite3 的键值与记录存储
+
+    kv 表按 (session, key) 保存最新状态；records 表按时间追加订单、成交等记录，
+    在 (session, symbol, time) 上建有索引，可以按合约和时间范围查询而不必载入全部记录。
+    写入先缓存，累计 batch_size 条后在一个事务中批量写入；读取前会先写入缓存中的数据。
+    """
+    __schema__ = (
+        'CREATE TABLE IF NOT EXISTS kv ('
+        'session TEXT NOT NULL, key TEXT NOT NULL, value BLOB, PRIMARY KEY (session, key))',
+        'CREATE TABLE IF NOT EXISTS records ('
+        'id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT NOT NULL, kind TEXT NOT NULL, symbol TEXT NOT NULL, '
+        'time TEXT NOT NULL, ref_id INTEGER, value BLOB)',
+        'CREATE INDEX IF NOT EXISTS idx_records_session_symbol_time ON records (session, symbol, time)',
+        'CREATE INDEX IF NOT EXISTS idx_records_session_kind_time ON records (session, kind, time)',
+    )
+    __put_sql__ = 'INSERT OR REPLACE INTO kv (session, key, value) VALUES (?, ?, ?)'
+    __delete_sql__ = 'DELETE FROM kv WHERE session = ? AND key = ?'
+    __record_sql__ = 'INSERT INTO records (session, kind, symbol, time, ref_id, value) VALUES (?, ?, ?, ?, ?, ?)'
+
+    def __init__(self, db_path: str, session: str, batch_size: int=100,
+                 statement_cache: int=DEFAULT_STATEMENT_CACHE, synchronous: str='NORMAL'):
+        from utils.Logger import get_logger
+        self.__logger__ = get_logger(self.__class__.__name__, 'logSqlite')
+        self.__path__ = db_path
+        self.__session__ = session
+        self.__batch_size__ = max(int(batch_size), 1)
+        self.__conn__ = connect_sqlite(db_path, synchronous=synchronous, statement_cache=statement_cache)
+        self.__lock__ = threading.RLock()
+        self.__pending__ = list()       # [(sql, params), ...] 按写入顺序排列
+        for sql in self.__schema__:
+            self.__conn__.execute(sql)
+        self.__logger__.info('Connected to sqlite database {} session {}'.format(db_path, session))
+
+    @property
+    def session(self):
+        return self.__session__
+
+    def __append__(self, sql: str, params: tuple):
+        with self.__lock__:
+            self.__pending__.append((sql, params))
+            if len(self.__pending__) >= self.__batch_size__:
+                self.flush()
+
+    def flush(self):
+        """在一个事务中写入全部缓存，相邻的同类语句合并为一次 executemany"""
+        with self.__lock__:
+            if len(self.__pending__) == 0:
+                return
+            pending, self.__pending__ = self.__pending__, list()
+            conn = self.__conn__
+            conn.execute('BEGIN')
+            try:
+                start = 0
+                for i in range(1, len(pending) + 1):
+                    if i == len(pending) or pending[i][0] != pending[start][0]:
+                        conn.executemany(pending[start][0], [params for sql, params in pending[start:i]])
+                        start = i
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    # -- 键值
+    def put(self, key: str, value: bytes):
+        self.__append__(self.__put_sql__, (self.__session__, key, value))
+
+    def get(self, key: str, default=None):
+        with self.__lock__:
+            self.flush()
+            row = self.__conn__.execute(
+                'SELECT value FROM kv WHERE session = ? AND key = ?', (self.__session__, key)
+            ).fetchone()
+        return default if row is None else row[0]
+
+    def delete(self, key: str):
+        self.__append__(self.__delete_sql__, (self.__session__, key))
+
+    def keys(self):
+        with self.__lock__:
+            self.flush()
+            rows = self.__conn__.execute('SELECT key FROM kv WHERE session = ?', (self.__session__, )).fetchall()
+        return [row[0] for row in rows]
+
+    # -- 记录
+    def record(self, kind: str, symbol: str, time: str, value: bytes, ref_id: int=None):
+        """
+        :param kind: str 记录类型，如 order/trade
+        :param symbol: str 合约代码
+        :param time: str 可按字典序排序的时间，如 2018-01-02 09:30:00.000000
+        """
+        self.__append__(self.__record_sql__, (self.__session__, kind, symbol, time, ref_id, value))
+
+    def query(self, kind: str, symbol: str=None, start: str=None, end: str=None):
+        """
+        按时间顺序查询 [start, end] 范围内的记录 -> list of (symbol, time, ref_id, value)
+        """
+        sql = ['SELECT symbol, time, ref_id, value FROM records WHERE session = ?']
+        params = [self.__session__]
+        if symbol is not None:
+            sql.append('AND symbol = ?')
+            params.append(symbol)
+        sql.append('AND kind = ?')
+        params.append(kind)
+        if start is not None:
+            sql.append('AND time >= ?')
+            params.append(start)
+        if end is not None:
+            sql.append('AND time <= ?')
+            params.append(end)
+        sql.append('ORDER BY time, id')
+        with self.__lock__:
+            self.flush()
+            return self.__conn__.execute(' '.join(sql), params).fetchall()
+
+    def close(self):
+        with self.__lock__:
+            self.flush()
+            self.__conn__.close()
+
+
+def _enum_name(value):
+    return None if value is None else getattr(value, 'name', value)
+
+
+def _dt_str(value):
+    return None if value is None else value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+class SqliteRecorder(object):
+    """
+    订单、成交、行情的批量记录
+
+    记录不经过 ORM，先按表缓存为元组，累计 batch_size 条或距第一条缓存记录超过 flush_interval 毫秒后，
+    在一个事务中对每张表执行一次 executemany。写连接使用 WAL 日志，查询使用只读连接池，写入时也可以并发查询。
+    """
+    __tick_fields__ = (
+        'open', 'last', 'high', 'low', 'prev_close', 'volume', 'total_turnover', 'open_interest',
+        'b1', 'b2', 'b3', 'b4', 'b5', 'b1_v', 'b2_v', 'b3_v', 'b4_v', 'b5_v',
+        'a1', 'a2', 'a3', 'a4', 'a5', 'a1_v', 'a2_v', 'a3_v', 'a4_v', 'a5_v',
+    )
+    __tables__ = {
+        'trades': (
+            'trade_id INTEGER, order_id INTEGER, order_book_id TEXT, datetime TEXT, trading_datetime TEXT, '
+            'side TEXT, position_effect TEXT, price REAL, quantity REAL, commission REAL, tax REAL, '
+            'close_today_amount REAL, frozen_price REAL',
+            13,
+        ),
+        'orders': (
+            'order_id INTEGER, order_book_id TEXT, datetime TEXT, trading_datetime TEXT, side TEXT, '
+            'position_effect TEXT, type TEXT, status TEXT, quantity REAL, filled_quantity REAL, price REAL, '
+            'avg_price REAL, transaction_cost REAL, message TEXT',
+            14,
+        ),
+        'ticks': (
+            'order_book_id TEXT, date TEXT, time TEXT, ' + ', '.join(
+                '{} REAL'.format(name) for name in __tick_fields__),
+            3 + len(__tick_fields__),
+        ),
+    }
+    __indexes__ = (
+        'CREATE INDEX IF NOT EXISTS idx_trades_symbol_time ON trades (order_book_id, datetime)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_symbol_time ON orders (order_book_id, datetime)',
+        'CREATE INDEX IF NOT EXISTS idx_ticks_symbol_time ON ticks (order_book_id, date, time)',
+    )
+
+    def __init__(self, db_path: str, batch_size: int=500, flush_interval: int=200, synchronous: str='NORMAL',
+                 pool_size: int=2, statement_cache: int=DEFAULT_STATEMENT_CACHE):
+        """
+        :param batch_size: int 缓存记录数上限
+        :param flush_interval: int 缓存最长保留时间，单位毫秒，0 表示只按条数写入
+        :param synchronous: str OFF/NORMAL/FULL
+        :param pool_size: int 只读连接池大小
+        """
+        from queue import Queue
+        from utils.Logger import get_logger
+        self.__logger__ = get_logger(self.__class__.__name__, 'logSqlite')
+        self.__path__ = db_path
+        self.__batch_size__ = max(int(batch_size), 1)
+        self.__flush_interval__ = flush_interval / 1000
+        self.__statement_cache__ = statement_cache
+        self.__conn__ = connect_sqlite(db_path, synchronous=synchronous, statement_cache=statement_cache)
+        for table, (columns, count) in self.__tables__.items():
+            self.__conn__.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(table, columns))
+        for sql in self.__indexes__:
+            self.__conn__.execute(sql)
+        self.__insert_sql__ = {
+            table: 'INSERT INTO {} VALUES ({})'.format(table, ', '.join(['?'] * count))
+            for table, (columns, count) in self.__tables__.items()
+        }
+
+        self.__buffers__ = {table: list() for table in self.__tables__}
+        self.__count__ = 0
+        self.__lock__ = threading.Lock()
+        self.__timer__ = None
+        self.__pool__ = Queue(maxsize=max(int(pool_size), 1))
+        self.__pool_size__ = self.__pool__.maxsize
+        self.__pool_created__ = 0
+
+    # -- 写入
+    def __append__(self, table: str, row: tuple):
+        with self.__lock__:
+            self.__buffers__[table].append(row)
+            self.__count__ += 1
+            if self.__count__ >= self.__batch_size__:
+                self.__flush__()
+            elif self.__flush_interval__ > 0 and self.__timer__ is None:
+                self.__timer__ = threading.Timer(self.__flush_interval__, self.flush)
+                self.__timer__.daemon = True
+                self.__timer__.start()
+
+    def record_trade(self, trade):
+        self.__append__('trades', (
+            trade.exec_id, trade.order_id, trade.order_book_id, _dt_str(trade.datetime),
+            _dt_str(trade.trading_datetime), _enum_name(trade.side), _enum_name(trade.position_effect),
+            trade.last_price, trade.last_quantity, trade.commission, trade.tax, trade.close_today_amount,
+            trade.frozen_price,
+        ))
+
+    def record_order(self, order):
+        self.__append__('orders', (
+            order.order_id, order.order_book_id, _dt_str(order.datetime), _dt_str(order.trading_datetime),
+            _enum_name(order.side), _enum_name(order.position_effect), _enum_name(order.type),
+            _enum_name(order.status), order.quantity, order.filled_quantity, order.frozen_price, order.avg_price,
+            order.transaction_cost, order.message,
+        ))
+
+    def record_tick(self, tick):
+        tick_dict = tick._tick
+        self.__append__('ticks', (tick_dict['order_book_id'], tick_dict.get('date'), tick_dict.get('time')) + tuple(
+            tick_dict.get(name) for name in self.__tick_fields__
+        ))
+
+    def flush(self):
+        with self.__lock__:
+            self.__flush__()
+
+    def __flush__(self):
+        if self.__timer__ is not None:
+            self.__timer__.cancel()
+            self.__timer__ = None
+        if self.__count__ == 0:
+            return
+        buffers = self.__buffers__
+        self.__buffers__ = {table: list() for table in self.__tables__}
+        self.__count__ = 0
+        conn = self.__conn__
+        conn.execute('BEGIN')
+        try:
+            for table, rows in buffers.items():
+                if len(rows) > 0:
+                    conn.executemany(self.__insert_sql__[table], rows)
+            conn.execute('COMMIT')
+        except Exception as e:
+            conn.execute('ROLLBACK')
+            self.__logger__.exception('sqlite bulk insert into {} failed: {}'.format(self.__path__, e))
+            raise
+
+    # -- 查询
+    def __acquire__(self):
+        from queue import Empty
+        try:
+            return self.__pool__.get_nowait()
+        except Empty:
+            with self.__lock__:
+                create = self.__pool_created__ < self.__pool_size__
+                if create:
+                    self.__pool_created__ += 1
+            if create:
+                return connect_sqlite(self.__path__, read_only=True, statement_cache=self.__statement_cache__)
+            return self.__pool__.get(block=True)
+
+    def query(self, sql: str, params=()):
+        """使用只读连接池中的连接执行查询，不等待写入完成 -> list"""
+        conn = self.__acquire__()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            self.__pool__.put(conn)
+
+    def close(self):
+        self.flush()
+        self.__conn__.close()
+        while not self.__pool__.empty():
+            self.__pool__.get_nowait().close()
 
 
 class SqliteWrapper(object):
-    def __init__(self, db_path: str, clear_db=False):
-        from sqlalchemy import create_engine, MetaData
+    def __init__(self, db_path: str, clear_db=False, synchronous: str='NORMAL'):
+        from sqlalchemy import create_engine, event, MetaData
         from sqlalchemy.orm import sessionmaker
         self.engine = create_engine('sqlite:///{host}'.format(host=db_path), echo=False)
+
+        @event.listens_for(self.engine, 'connect')
+        def __set_pragma__(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous={}'.format(synchronous))
+            cursor.close()
+
         self.metadata = MetaData(bind=self.engine)
         self.__table_definition__()
         if clear_db is True:
@@ -35,6 +361,16 @@ class SqliteWrapper(object):
         self.session.add(obj)
         self.session.commit()
 
+    def bulk_insert(self, table, rows: list):
+        """
+        不经过 ORM 批量插入，rows 为 dict 列表，整批在一个事务中通过 executemany 写入
+
+        :param table: sqlalchemy.Table
+        """
+        if len(rows) > 0:
+            with self.engine.begin() as conn:
+                conn.execute(table.insert(), rows)
+
     def drop_tables(self, table):
         from sqlalchemy import Table
         assert isinstance(table, Table), str(TypeError('table should be of type sqlalchemy.Table'))
@@ -6,10 +6,11 @@ import yaml
 cached_functions = list()
 
 
-def lru_cache(*args, **kwargs):
+def lru_cache(maxsize: int=128, ttl: float=None, key=None):
+    """带统计和容量上限的缓存装饰器，见 utils.Cache.cached"""
     def decorator(func):
-        from functools import lru_cache as origin_lru_cache
-        func = origin_lru_cache(*args, **kwargs)(func)
+        from utils.Cache import cached
+        func = cached(maxsize=maxsize, ttl=ttl, key=key)(func)
         cached_functions.append(func)
         return func
     return decorator
@@ -39,8 +40,41 @@ def id_generator(start=1):
         i += 1
 
 
+class LazyString(object):
+    """
+    延迟格式化的字符串，只有在 str() 时才调用 str.format 并缓存结果
+
+    可直接作为 logging 的 msg 传入，日志级别未开启时不会产生任何格式化开销
+    """
+    __slots__ = ('__fmt__', '__args__', '__kwargs__', '__value__')
+
+    def __init__(self, fmt: str, *args, **kwargs):
+        self.__fmt__ = fmt
+        self.__args__ = args
+        self.__kwargs__ = kwargs
+        self.__value__ = None
+
+    def __str__(self):
+        if self.__value__ is None:
+            self.__value__ = self.__fmt__.format(*self.__args__, **self.__kwargs__)
+        return self.__value__
+
+    def __repr__(self):
+        return repr(self.__str__())
+
+    def __eq__(self, other):
+        return self.__str__() == str(other)
+
+    def __hash__(self):
+        return hash(self.__str__())
+
+
+def lazy_format(fmt: str, *args, **kwargs):
+    """fmt.format(*args, **kwargs) 的延迟版本 -> LazyString"""
+    return LazyString(fmt, *args, **kwargs)
+
+
 def property_repr(inst: object):
-    "%s(%s)" % (inst.__class__.__name__, __properties_dict__(inst))
     return '{}({})'.format(inst.__class__.__name__, str(__properties_dict__(inst)))
 
 
@@ -55,20 +89,34 @@ def dict_repr(inst: object):
     )
 
 
+__class_properties_cache__ = dict()
+
+
+def __class_properties__(cls):
+    """按 MRO 顺序列出类的公开 property 名称，每个类只计算一次 -> tuple"""
+    try:
+        return __class_properties_cache__[cls]
+    except KeyError:
+        names = list()
+        for base in cls.mro():
+            for varname in __iter_properties_of_class__(base):
+                if varname[0] == "_" or varname in names:
+                    continue
+                names.append(varname)
+        __class_properties_cache__[cls] = tuple(names)
+        return __class_properties_cache__[cls]
+
+
 def __properties_dict__(inst):
     result = dict()
-    for cls in inst.__class__.mro():
-        for varname in __iter_properties_of_class__(cls):
-            if varname[0] == "_":
-                continue
-            # FIXME: 这里getattr在iter_properties_of_class中掉用过了，性能比较差，可以优化
-            tmp = getattr(inst, varname)
-            if varname == "positions":
-                tmp = list(tmp.keys())
-            if hasattr(tmp, '__simple_object__'):
-                result[varname] = tmp.__simple_object__()
-            else:
-                result[varname] = tmp
+    for varname in __class_properties__(inst.__class__):
+        tmp = getattr(inst, varname)
+        if varname == "positions":
+            tmp = list(tmp.keys())
+        if hasattr(tmp, '__simple_object__'):
+            result[varname] = tmp.__simple_object__()
+        else:
+            result[varname] = tmp
     return result
 
 
@@ -80,7 +128,6 @@ def __slots_dict__(inst):
 
 
 def __iter_properties_of_class__(cls):
-    for varname in vars(cls):
-        value = getattr(cls, varname)
+    for varname, value in vars(cls).items():
         if isinstance(value, property):
             yield varname